@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+bench_e2e - 端到端基准：在本地替身 javdb / 115 服务器上跑真实的命令路径
+
+场景（每个请求都经过 HTTP、限速器、解析和缓存，和线上一致，只是服务器在本机）:
+  - search:        search_javdb（缓存未命中）
+  - search_cached: search_javdb（缓存命中）
+  - lookup:        lookup_code（搜索 + 详情页磁链）
+  - add_magnet:    offline_add_magnet
+  - list_tasks:    iter_tasks 翻完所有预置的任务页
+  - batch:         jav115 batch 的解析 → 查重 → 提交流程，统计每分钟处理的番号数
+
+每个场景输出 p50/p90/p99/平均/最小/最大（毫秒），--output 保存为JSON，--compare 与之前的结果对比
+
+用法:
+    python benchmarks/bench_e2e.py [-n 30] [--codes 60] [--latency 0.05] [--output result.json] [--compare old.json]
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = Path(__file__).parent
+REPO_DIR = BENCH_DIR.parent
+
+# 各模块在导入时根据 HOME 计算 ~/.115cli 下的路径，必须先切换到临时目录，避免读写真实的cookie/缓存
+_home = tempfile.TemporaryDirectory(prefix='bench115-')
+os.environ['HOME'] = _home.name
+# 退出时删除；atexit 后注册先执行，在导入模块之前注册，保证各模块退出时的保存（如镜像状态）先完成
+atexit.register(_home.cleanup)
+os.environ['CLI115_NO_DAEMON'] = '1'
+sys.path.insert(0, str(REPO_DIR / "scripts"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import cli  # noqa: E402
+import javdb  # noqa: E402
+import jav115  # noqa: E402
+import ratelimit  # noqa: E402
+from fakes import FakeJavdb, Fake115, Fake115Client  # noqa: E402
+
+def percentile(samples: list, pct: float) -> float:
+    """最近秩法百分位数"""
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+def summarize(samples: list) -> dict:
+    """秒 → 毫秒统计"""
+    ms = [s * 1000 for s in samples]
+    return {
+        'count': len(ms),
+        'p50': round(percentile(ms, 50), 2),
+        'p90': round(percentile(ms, 90), 2),
+        'p99': round(percentile(ms, 99), 2),
+        'mean': round(sum(ms) / len(ms), 2),
+        'min': round(min(ms), 2),
+        'max': round(max(ms), 2),
+    }
+
+def timed(func, inputs) -> list:
+    samples = []
+    for value in inputs:
+        start = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def run_batch(codes: list, workers: int, chunk_size: int) -> dict:
+    """与 jav115 batch 相同的流程：并发解析 → 查重 → 分块提交"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        reports = list(pool.map(jav115.resolve_code, codes))
+    jav115.mark_duplicates(reports, workers)
+    jav115.submit_resolved(reports, 0, chunk_size)
+    elapsed = time.perf_counter() - start
+
+    statuses = {}
+    for report in reports:
+        statuses[report['status']] = statuses.get(report['status'], 0) + 1
+    return {'seconds': elapsed, 'statuses': statuses}
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench(args) -> dict:
+    fake_javdb = FakeJavdb(args.latency, args.jitter).start()
+    fake_115 = Fake115(args.latency, args.jitter, prefill_tasks=args.prefill_tasks).start()
+    javdb.BASE_URL = fake_javdb.url
+    client = Fake115Client(fake_115.url)
+    cli._client = ratelimit.LimitedClient(client)
+    if not args.paced:
+        # 默认测量代码本身的开销，不让令牌桶的等待淹没结果
+        for name in ratelimit.DEFAULT_LIMITS:
+            ratelimit.configure(name, rate=10000, burst=10000)
+
+    scenarios = {}
+    try:
+        keywords = [f"SRCH-{i:04d}" for i in range(args.rounds)]
+        scenarios['search'] = summarize(timed(javdb.search_javdb, keywords))
+        scenarios['search_cached'] = summarize(timed(javdb.search_javdb, keywords))
+        scenarios['lookup'] = summarize(timed(javdb.lookup_code, [f"LOOK-{i:04d}" for i in range(args.rounds)]))
+
+        magnets = [f"magnet:?xt=urn:btih:{i:040x}&dn=ADD-{i:04d}" for i in range(10 ** 6, 10 ** 6 + args.rounds)]
+        scenarios['add_magnet'] = summarize(timed(lambda m: cli.offline_add_magnet(cli._client, m), magnets))
+        scenarios['list_tasks'] = summarize(timed(lambda _: sum(1 for _ in cli.iter_tasks(cli._client)),
+                                                  range(max(1, args.rounds // 5))))
+
+        batches = []
+        for round_index in range(args.batch_rounds):
+            codes = [f"BAT{round_index}-{i:04d}" for i in range(args.codes)]
+            batches.append(run_batch(codes, args.workers, args.chunk_size))
+        seconds = [b['seconds'] for b in batches]
+        scenarios['batch'] = dict(
+            summarize(seconds),
+            codes=args.codes,
+            codes_per_minute=round(args.codes * len(seconds) / sum(seconds) * 60, 1),
+            statuses=batches[-1]['statuses'],
+        )
+    finally:
+        client.close()
+        fake_javdb.stop()
+        fake_115.stop()
+
+    return {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'paced': args.paced,
+            'rounds': args.rounds,
+            'workers': args.workers,
+            'requests': {'javdb': fake_javdb.requests, '115': fake_115.requests},
+        },
+        'scenarios': scenarios,
+    }
+
+def print_report(result: dict, baseline: dict | None = None):
+    meta = result['meta']
+    print(f"commit {meta['commit']}  python {meta['python']}  延迟 {meta['latency'] * 1000:.0f}ms"
+          f"+{meta['jitter'] * 1000:.0f}ms抖动  {'按默认限速' if meta['paced'] else '不限速'}")
+    print(f"{'场景':<14} {'p50':>9} {'p90':>9} {'p99':>9} {'平均':>9} {'次数':>6}  对比p50")
+    for name, stats in result['scenarios'].items():
+        delta = ''
+        old = (baseline or {}).get('scenarios', {}).get(name)
+        if old:
+            delta = f"{old['p50']:.1f} → {stats['p50']:.1f}ms ({(stats['p50'] - old['p50']) / old['p50'] * 100:+.1f}%)"
+        print(f"{name:<14} {stats['p50']:>7.1f}ms {stats['p90']:>7.1f}ms {stats['p99']:>7.1f}ms"
+              f" {stats['mean']:>7.1f}ms {stats['count']:>6}  {delta}")
+
+    batch = result['scenarios'].get('batch')
+    if batch:
+        line = f"\nbatch 吞吐: {batch['codes_per_minute']:.0f} 个番号/分钟（每批 {batch['codes']} 个，状态 {batch['statuses']}）"
+        old = (baseline or {}).get('scenarios', {}).get('batch')
+        if old:
+            line += f"，之前 {old['codes_per_minute']:.0f}"
+        print(line)
+    print(f"请求数: javdb {meta['requests']['javdb']}，115 {meta['requests']['115']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--rounds', type=int, default=30, help='单命令场景的重复次数')
+    parser.add_argument('--codes', type=int, default=60, help='batch 场景每批的番号数')
+    parser.add_argument('--batch-rounds', type=int, default=3, help='batch 场景的批数')
+    parser.add_argument('--workers', '-w', type=int, default=8, help='batch 并发解析数')
+    parser.add_argument('--chunk-size', '-c', type=int, default=15, help='batch 每次提交的链接数')
+    parser.add_argument('--latency', type=float, default=0.05, help='替身服务器每个请求的固定延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.02, help='额外的随机延迟上限（秒）')
+    parser.add_argument('--prefill-tasks', type=int, default=300, help='115 替身中预置的历史任务数')
+    parser.add_argument('--paced', action='store_true', help='使用默认限速参数（测量真实的节流效果）')
+    parser.add_argument('--output', '-o', help='结果保存为JSON')
+    parser.add_argument('--compare', help='与之前保存的JSON结果对比')
+    parser.add_argument('--json', action='store_true', help='JSON输出')
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    result = bench(args)
+    if args.output:
+        Path(args.output).write_text(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_report(result, baseline)
+
+if __name__ == '__main__':
+    main()
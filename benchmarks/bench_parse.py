@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+bench_parse - javdb页面解析微基准：流式HTMLParser vs 旧的DOTALL正则
+
+用法:
+    python benchmarks/bench_parse.py [-n 200]
+"""
+
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+FIXTURES = BENCH_DIR / "fixtures"
+sys.path.insert(0, str(BENCH_DIR.parent / "scripts"))
+
+import javdb  # noqa: E402
+
+CHUNK_SIZE = 16384
+
+# 旧实现（search_javdb / get_magnets 改为流式解析前的正则）
+LEGACY_ITEM_PATTERN = r'<a href="(/v/[^"]+)" class="box"[^>]*>.*?<div class="video-title"[^>]*>\s*<strong>([^<]+)</strong>\s*([^<]*)</div>.*?<div class="meta">\s*(\d{4}-\d{2}-\d{2})\s*</div>'
+LEGACY_ROW_PATTERN = r'<tr[^>]*>.*?data-clipboard-text="(magnet:\?xt=urn:btih:[^"]+)".*?<span[^>]*class="tag[^"]*"[^>]*>([^<]+)</span>.*?</tr>'
+
+def legacy_search(html: str, limit: int) -> list:
+    matches = re.findall(LEGACY_ITEM_PATTERN, html, re.DOTALL)
+    return [
+        {'code': code.strip(), 'title': title.strip(), 'url': f"{javdb.BASE_URL}{path}", 'date': date.strip()}
+        for path, code, title, date in matches[:limit]
+    ]
+
+def legacy_magnets(html: str) -> list:
+    rows = re.findall(LEGACY_ROW_PATTERN, html, re.DOTALL)
+    if rows:
+        return [{'magnet': m.strip(), 'size': size.strip()} for m, size in rows]
+
+    simple_magnets = re.findall(r'data-clipboard-text="(magnet:\?xt=urn:btih:[^"]+)"', html)
+    sizes = re.findall(r'<span class="tag[^"]*is-success[^"]*">([^<]+)</span>', html)
+    return [
+        {'magnet': m.strip(), 'size': (sizes[i] if i < len(sizes) else 'N/A').strip()}
+        for i, m in enumerate(simple_magnets)
+    ]
+
+def streamed(parser, html: str) -> list:
+    """模拟按块到达的响应，满足limit后停止"""
+    for start in range(0, len(html), CHUNK_SIZE):
+        if parser.done:
+            break
+        parser.feed(html[start:start + CHUNK_SIZE])
+    if not parser.done:
+        parser.close()
+    return parser.items
+
+def bench(func, rounds: int) -> float:
+    """返回每次调用的平均耗时（毫秒）"""
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - start) / rounds * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--rounds', type=int, default=200, help='每项重复次数')
+    args = parser.parse_args()
+
+    search_html = (FIXTURES / "javdb_search.html").read_text(encoding='utf-8')
+    detail_html = (FIXTURES / "javdb_detail.html").read_text(encoding='utf-8')
+
+    # 正确性对照
+    new_items = streamed(javdb.SearchResultParser(None), search_html)
+    old_items = legacy_search(search_html, 10 ** 6)
+    assert [i['code'] for i in new_items] == [i['code'] for i in old_items], "搜索结果与旧正则不一致"
+    new_magnets = streamed(javdb.MagnetParser(None), detail_html)
+    old_magnets = legacy_magnets(detail_html)
+    mismatched = sum(
+        1 for old, new in zip(old_magnets, new_magnets) if old['size'] != new['size']
+    )
+
+    cases = [
+        ("search 全部条目 (regex)", lambda: legacy_search(search_html, 10 ** 6)),
+        ("search 全部条目 (stream)", lambda: streamed(javdb.SearchResultParser(None), search_html)),
+        ("search limit=1 (regex)", lambda: legacy_search(search_html, 1)),
+        ("search limit=1 (stream)", lambda: streamed(javdb.SearchResultParser(1), search_html)),
+        ("search limit=10 (regex)", lambda: legacy_search(search_html, 10)),
+        ("search limit=10 (stream)", lambda: streamed(javdb.SearchResultParser(10), search_html)),
+        ("detail 全部磁链 (regex)", lambda: legacy_magnets(detail_html)),
+        ("detail 全部磁链 (stream)", lambda: streamed(javdb.MagnetParser(None), detail_html)),
+        ("detail limit=1 (stream)", lambda: streamed(javdb.MagnetParser(1), detail_html)),
+    ]
+
+    print(f"search fixture: {len(search_html) / 1024:.0f}KB, {len(new_items)} 条目")
+    print(f"detail fixture: {len(detail_html) / 1024:.0f}KB, {len(new_magnets)} 磁链"
+          f"（旧正则大小配对错误 {mismatched}/{len(old_magnets)}）")
+    print()
+    width = max(len(name) for name, _ in cases)
+    for name, func in cases:
+        print(f"{name:<{width}}  {bench(func, args.rounds):8.3f} ms")
+
+if __name__ == '__main__':
+    main()
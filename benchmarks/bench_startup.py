@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+bench_startup - 各入口脚本的冷启动耗时（基于 python -X importtime）
+
+对每个入口统计：
+  - import: 导入入口模块的累计耗时（-X importtime 的 cumulative 列）
+  - --help: 运行 `python 脚本 --help` 的总墙钟时间（含解释器启动）
+并列出导入耗时最高的模块，便于发现新引入的重依赖
+
+用法:
+    python benchmarks/bench_startup.py [-n 10] [--top 8] [--json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).parent
+SCRIPTS_DIR = BENCH_DIR.parent / "scripts"
+ENTRY_POINTS = ['cli', 'javdb', 'jav115']
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def import_profile(module: str) -> list:
+    """返回 [(模块名, 自身耗时us, 累计耗时us, 层级), ...]"""
+    env = dict(os.environ, PYTHONPATH=str(SCRIPTS_DIR), CLI115_NO_DAEMON='1')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            rows.append((name, int(own), int(cumulative), len(indent) // 2))
+    return rows
+
+def help_wall_time(module: str) -> float:
+    """`python 脚本 --help` 的墙钟时间（秒）"""
+    env = dict(os.environ, CLI115_NO_DAEMON='1')
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(SCRIPTS_DIR / f"{module}.py"), '--help'],
+        env=env, stdout=subprocess.DEVNULL, check=True
+    )
+    return time.perf_counter() - start
+
+def bench(module: str, rounds: int, top: int) -> dict:
+    imports, walls = [], []
+    heaviest = {}
+    for _ in range(rounds):
+        rows = import_profile(module)
+        imports.append(next(c for name, _, c, _ in rows if name == module) / 1000)
+        walls.append(help_wall_time(module) * 1000)
+        # importtime 先输出子模块再输出父模块：入口模块那一行之前、上一个顶层模块之后的第一层即其直接依赖
+        children = []
+        for name, _, cumulative, level in rows:
+            if level == 0:
+                if name == module:
+                    break
+                children = []
+            elif level == 1:
+                children.append((name, cumulative))
+        for name, cumulative in children:
+            heaviest.setdefault(name, []).append(cumulative / 1000)
+    ranked = sorted(
+        ((name, statistics.median(values)) for name, values in heaviest.items()),
+        key=lambda item: item[1], reverse=True
+    )
+    return {
+        'module': module,
+        'import_ms': {'median': statistics.median(imports), 'min': min(imports)},
+        'help_ms': {'median': statistics.median(walls), 'min': min(walls)},
+        'heaviest': [{'module': name, 'ms': round(ms, 2)} for name, ms in ranked[:top]],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('-n', '--rounds', type=int, default=10, help='每个入口重复次数')
+    parser.add_argument('--top', type=int, default=8, help='列出耗时最高的前N个直接导入')
+    parser.add_argument('--json', action='store_true', help='JSON输出（便于记录历史）')
+    parser.add_argument('entries', nargs='*', default=ENTRY_POINTS, help='入口模块')
+    args = parser.parse_args()
+
+    results = [bench(module, args.rounds, args.top) for module in args.entries]
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+
+    print(f"{'入口':<10} {'import 中位数':>14} {'import 最小':>12} {'--help 中位数':>14} {'--help 最小':>12}")
+    for r in results:
+        print(f"{r['module']:<10} {r['import_ms']['median']:>12.1f}ms {r['import_ms']['min']:>10.1f}ms"
+              f" {r['help_ms']['median']:>12.1f}ms {r['help_ms']['min']:>10.1f}ms")
+    for r in results:
+        print(f"\n{r['module']} 导入耗时最高的直接依赖:")
+        for item in r['heaviest']:
+            print(f"  {item['module']:<24} {item['ms']:8.2f} ms")
+
+if __name__ == '__main__':
+    main()
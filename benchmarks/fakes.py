@@ -0,0 +1,265 @@
+"""
+fakes - 基准测试用的本地替身服务器
+
+FakeJavdb: 返回 fixtures/ 中录制的搜索页/详情页，未带 over18 cookie 时返回年龄验证页
+Fake115:   内存中的云下载任务列表和目录树，提供与 p115client 同名方法的 Fake115Client（经HTTP调用）
+两者都可以配置每个请求的延迟（固定 + 随机抖动），模拟真实网络往返
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, urlparse
+
+FIXTURES = Path(__file__).parent / "fixtures"
+MAGNET_HASH = re.compile(r'btih:[0-9a-fA-F]{8}')
+SEARCH_ITEM = re.compile(r'(<a href="/v/)([^"]+)(".*?<strong>)([^<]+)(</strong>)', re.DOTALL)
+
+class FakeServer:
+    """在后台线程中运行的HTTP服务器基类"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def delay(self):
+        with self._lock:
+            self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 头部和正文分两次写出，不关闭Nagle算法会和客户端的延迟ACK叠加出约40ms的额外延迟
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status: int, body: bytes, content_type: str, headers: dict | None = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.delay()
+                server.handle(self, 'GET', None)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                server.delay()
+                server.handle(self, 'POST', payload)
+
+        return Handler
+
+    def handle(self, request, method: str, payload):
+        raise NotImplementedError
+
+class FakeJavdb(FakeServer):
+    """
+    javdb 替身：搜索页的第一个条目换成查询的番号（链接为 /v/番号），
+    详情页返回录制的磁链列表，info_hash 的前8位按详情页路径改写，使每个番号的磁链互不相同
+    搜索结果共 search_pages 页：第2页起的条目番号和链接加上页码后缀，最后一页没有"下一页"，之后的页为空
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, search_pages: int = 3):
+        super().__init__(latency, jitter)
+        self.search_pages = search_pages
+        search_html = (FIXTURES / "javdb_search.html").read_text(encoding='utf-8')
+        self.detail_html = (FIXTURES / "javdb_detail.html").read_text(encoding='utf-8')
+        self.age_gate_html = (FIXTURES / "javdb_age_gate.html").read_bytes()
+        # 搜索页拆成模板：第一个条目的链接和番号替换为查询词
+        href = search_html.index('<a href="/v/') + len('<a href="/v/')
+        code = search_html.index('<strong>', href) + len('<strong>')
+        self.search_parts = (
+            search_html[:href],
+            search_html[search_html.index('"', href):code],
+            search_html[search_html.index('</strong>', code):],
+        )
+
+    def search_page(self, keyword: str, page: int = 1) -> str:
+        head, middle, tail = self.search_parts
+        html = f"{head}{quote(keyword)}{middle}{keyword}{tail}"
+        if page > 1:
+            html = SEARCH_ITEM.sub(lambda m: f"{m[1]}{m[2]}-p{page}{m[3]}{m[4]}-P{page}{m[5]}", html)
+        if page > self.search_pages:
+            start = html.index('<a href="/v/')
+            html = html[:start] + html[html.index('<nav class="pagination">'):]
+        if page >= self.search_pages:
+            html = re.sub(r'<a rel="next"[^>]*>[^<]*</a>', '', html)
+        return html
+
+    def detail_page(self, path: str) -> str:
+        tag = hashlib.sha1(path.encode()).hexdigest()[:8]
+        return MAGNET_HASH.sub(lambda m: 'btih:' + tag, self.detail_html)
+
+    def handle(self, request, method, payload):
+        url = urlparse(request.path)
+        if url.path == '/over18':
+            request.send_body(302, b'', 'text/html', {'Set-Cookie': 'over18=1; Path=/', 'Location': '/'})
+            return
+        if 'over18=1' not in (request.headers.get('Cookie') or ''):
+            request.send_body(200, self.age_gate_html, 'text/html; charset=utf-8')
+            return
+        if url.path == '/search':
+            query = parse_qs(url.query)
+            page = self.search_page(query.get('q', [''])[0], int(query.get('page', ['1'])[0]))
+            request.send_body(200, page.encode('utf-8'), 'text/html; charset=utf-8')
+            return
+        if url.path.startswith('/v/'):
+            request.send_body(200, self.detail_page(url.path).encode('utf-8'), 'text/html; charset=utf-8')
+            return
+        request.send_body(404, b'not found', 'text/plain')
+
+class Fake115(FakeServer):
+    """
+    115 替身：云下载任务按添加时间倒序分页，目录树为 {cid: [条目, ...]}
+    prefill_tasks 预先放入的历史任务数，用于测试翻页
+    """
+
+    PAGE_SIZE = 30
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, prefill_tasks: int = 0, files_per_dir: int = 0):
+        super().__init__(latency, jitter)
+        self.tasks = []
+        self.tree = {0: []}
+        self._next_id = 1000
+        for i in range(prefill_tasks):
+            self.tasks.append({
+                'info_hash': f"{i:040x}", 'name': f"OLD-{i:05d}", 'size': 1 << 30,
+                'status': 2, 'percent_done': 100, 'add_time': int(time.time()) - i, 'file_id': str(i + 1),
+            })
+        for i in range(files_per_dir):
+            self.tree[0].append({'fid': self._new_id(), 'cid': 0, 'n': f"FILE-{i:05d}.mp4", 's': (i + 1) << 20})
+
+    def _new_id(self) -> int:
+        self._next_id += 1
+        return self._next_id
+
+    def handle(self, request, method, payload):
+        url = urlparse(request.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        with self._lock:
+            result = self.dispatch(url.path, query, payload or {})
+        request.send_body(200, json.dumps(result).encode(), 'application/json')
+
+    def dispatch(self, path: str, query: dict, payload: dict) -> dict:
+        if path == '/offline/add':
+            results = []
+            for magnet in payload.get('urls', []):
+                info_hash = magnet.split('btih:', 1)[-1][:40].lower()
+                if any(t['info_hash'] == info_hash for t in self.tasks):
+                    results.append({'state': False, 'info_hash': info_hash, 'error_msg': '任务已存在'})
+                    continue
+                self.tasks.insert(0, {
+                    'info_hash': info_hash, 'name': magnet.split('dn=', 1)[-1] if 'dn=' in magnet else info_hash,
+                    'size': 1 << 30, 'status': 1, 'percent_done': 0, 'add_time': int(time.time()),
+                    'file_id': '',
+                })
+                results.append({'state': True, 'info_hash': info_hash})
+            return {'state': True, 'result': results}
+        if path == '/offline/remove':
+            hashes = {h.lower() for h in payload.get('hashes', [])}
+            self.tasks = [t for t in self.tasks if t['info_hash'] not in hashes]
+            return {'state': True}
+        if path == '/offline/list':
+            page = int(query.get('page', 1))
+            start = (page - 1) * self.PAGE_SIZE
+            page_count = max(1, -(-len(self.tasks) // self.PAGE_SIZE))
+            return {'state': True, 'tasks': self.tasks[start:start + self.PAGE_SIZE], 'page_count': page_count}
+        if path == '/files':
+            cid = int(query.get('cid', 0))
+            offset, limit = int(query.get('offset', 0)), int(query.get('limit', 30))
+            entries = self.tree.get(cid, [])
+            return {'state': True, 'cid': cid, 'count': len(entries), 'data': entries[offset:offset + limit]}
+        if path == '/files/search':
+            keyword = query.get('search_value', '').lower()
+            hits = [e for entries in self.tree.values() for e in entries if keyword in e['n'].lower()]
+            return {'state': True, 'data': hits[:int(query.get('limit', 20))]}
+        if path == '/files/move':
+            return {'state': True}
+        if path == '/files/add':
+            cid = self._new_id()
+            self.tree.setdefault(int(payload.get('pid', 0)), []).append({'cid': cid, 'n': payload['cname']})
+            self.tree[cid] = []
+            return {'state': True, 'cid': cid}
+        return {'state': False, 'error': f'unknown path {path}'}
+
+class Fake115Client:
+    """与 p115client 同名的方法，经HTTP调用 Fake115（返回值格式与真实接口一致）"""
+
+    def __init__(self, base_url: str):
+        import httpx
+
+        self.base_url = base_url
+        self.http = httpx.Client(base_url=base_url, timeout=30,
+                                 limits=httpx.Limits(max_connections=20, max_keepalive_connections=20))
+
+    def _get(self, path: str, params: dict) -> dict:
+        return self.http.get(path, params=params).json()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        return self.http.post(path, json=payload).json()
+
+    def user_info(self):
+        return {'user_name': 'bench', 'user_id': 1}
+
+    def offline_add_url(self, payload: dict):
+        result = self._post('/offline/add', {'urls': [payload['url']]})['result'][0]
+        return {'state': result['state'], 'info_hash': result.get('info_hash'), 'error_msg': result.get('error_msg')}
+
+    def offline_add_urls(self, payload: dict):
+        count = sum(1 for key in payload if key.startswith('url['))
+        return self._post('/offline/add', {'urls': [payload[f'url[{i}]'] for i in range(count)]})
+
+    def offline_remove(self, payload: dict):
+        return self._post('/offline/remove', {'hashes': [v for k, v in payload.items() if k.startswith('hash[')]})
+
+    def offline_list(self, payload: dict):
+        return self._get('/offline/list', payload)
+
+    def fs_files(self, payload: dict):
+        return self._get('/files', payload)
+
+    def fs_search(self, payload: dict):
+        return self._get('/files/search', payload)
+
+    def fs_move(self, ids, pid):
+        return self._post('/files/move', {'ids': list(ids), 'pid': pid})
+
+    def fs_mkdir(self, payload: dict):
+        return self._post('/files/add', payload)
+
+    def close(self):
+        self.http.close()
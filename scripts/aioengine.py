@@ -0,0 +1,368 @@
+"""
+aioengine - asyncio 并发引擎
+javdb 页面用 httpx.AsyncClient 流式获取并解析，与同步版共用 cookie、响应缓存、解析器、限速器和年龄验证；
+115 调用在 p115client 上使用其原生异步接口（async_=True），其他客户端放到线程中执行（jav115 batch 的网盘文件查重）。
+所有请求受同一个并发上限约束，每个请求单独超时；多个关键词/番号并发查询，总耗时取决于最慢的一个，
+Ctrl-C 会取消所有未完成的请求
+"""
+
+import asyncio
+import time
+
+import javdb
+import mirrors
+import ratelimit
+import tracing
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 30.0
+
+class Engine:
+    """
+    一次运行中共享的异步连接池和并发上限
+    用法: async with Engine() as engine: await engine.search('ABC-123')
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT, client=None):
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.client = client
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._http = None
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._session is not None:
+            self._session.save_cookies()
+
+    def _http_client(self):
+        """异步HTTP客户端，与同步会话共用同一个cookie jar"""
+        if self._http is None:
+            import httpx
+
+            self._session = javdb.get_session()
+            self._http = httpx.AsyncClient(
+                headers={'User-Agent': javdb.USER_AGENT},
+                cookies=self._session.jar,
+                follow_redirects=True,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            )
+        return self._http
+
+    # ---- javdb ----
+
+    async def _iter_html(self, url: str, kind: str | None = None):
+        """javdb.iter_html 的异步版本：缓存、重试、年龄验证的处理方式相同"""
+        cache = javdb.get_cache() if kind else None
+        with tracing.span('javdb.cache', kind=kind) as lookup:
+            entry = cache.get(url) if cache else None
+            fresh = bool(entry and entry.is_fresh(javdb.CACHE_TTL[kind]))
+            lookup.set(hit=fresh)
+        if fresh:
+            cache.record('hits')
+            yield entry.body
+            return
+
+        http = self._http_client()
+        session = self._session
+        headers = entry.validators() if entry else None
+        attempt = 0
+        age_confirmed = set()
+        while True:
+            try:
+                with tracing.span('javdb.request', url=url, attempt=attempt) as request:
+                    async with asyncio.timeout(self.timeout):
+                        response = await self._open(http, url, headers)
+                    request.set(status=response.status_code, host=mirrors.base_of(response.url))
+            except Exception as e:
+                if not ratelimit.is_transient(e):
+                    raise
+                ratelimit.failure('javdb')
+                if attempt == ratelimit.MAX_RETRIES:
+                    raise
+                await asyncio.sleep(ratelimit.backoff(attempt))
+                attempt += 1
+                continue
+
+            try:
+                session.save_cookies()
+                status = response.status_code
+                if status in ratelimit.RETRY_STATUS or status == 403:
+                    ratelimit.failure('javdb')
+                    if status == 403 or attempt == ratelimit.MAX_RETRIES:
+                        response.raise_for_status()
+                    await asyncio.sleep(ratelimit.backoff(attempt, response.headers.get('Retry-After')))
+                    attempt += 1
+                    continue
+                ratelimit.success('javdb')
+
+                if status == 304 and entry:
+                    cache.touch(url)
+                    yield entry.body
+                    return
+                gate = javdb.GateBuffer(session, response)
+                async for text in response.aiter_text(16384):
+                    if gate.feed(text):
+                        yield text
+            finally:
+                await response.aclose()
+
+            html = gate.html
+            if response.status_code == 200 and javdb.is_age_gate(html):
+                if gate.streaming:
+                    return
+                # 年龄验证由同步会话处理（线程安全，每个站点只确认一次），cookie写入共用的jar后重新请求
+                base = mirrors.base_of(response.url)
+                if base not in age_confirmed and await asyncio.to_thread(session.confirm_age, html, base):
+                    age_confirmed.add(base)
+                    headers = None
+                    continue
+                return
+            held = gate.held()
+            if held:
+                yield held
+            if response.status_code != 200:
+                return
+            if cache:
+                cache.put(
+                    url, kind, html,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                )
+            return
+
+    async def _send(self, http, base: str, url: str, headers: dict | None):
+        tracker = mirrors.get_tracker()
+        start = time.perf_counter()
+        try:
+            response = await http.send(http.build_request('GET', url, headers=headers), stream=True)
+        except asyncio.CancelledError:
+            tracker.abandoned(base, time.perf_counter() - start)
+            raise
+        except Exception:
+            tracker.failure(base)
+            raise
+        if mirrors.is_bad_status(response.status_code):
+            tracker.failure(base)
+        else:
+            tracker.success(base, time.perf_counter() - start)
+        return response
+
+    async def _open(self, http, url: str, headers: dict | None):
+        """JavdbSession.open 的异步版本：对冲请求中落后的一方直接取消"""
+        targets = mirrors.candidates(url, javdb.BASE_URL)
+        tracker = mirrors.get_tracker()
+        tasks = {}
+
+        async def start(target):
+            await asyncio.to_thread(ratelimit.acquire, 'javdb')
+            tasks[asyncio.ensure_future(self._send(http, *target, headers))] = target[0]
+
+        await start(targets[0])
+        rest = targets[1:]
+        delay = tracker.hedge_delay(targets[0][0])
+        hedged = False
+        winner = fallback = error = None
+        try:
+            while tasks and winner is None:
+                timeout = delay if rest and not hedged else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    tracker.hedged(rest[0][0])
+                    tracing.record('javdb.hedge', delay, host=rest[0][0])
+                    await start(rest.pop(0))
+                    continue
+                for task in done:
+                    tasks.pop(task)
+                    try:
+                        response = task.result()
+                    except Exception as e:
+                        error = e
+                        continue
+                    if winner is None and not mirrors.is_bad_status(response.status_code):
+                        winner = response
+                    elif fallback is None:
+                        fallback = response
+                    else:
+                        await response.aclose()
+                if winner is None and not tasks and rest:
+                    await start(rest.pop(0))
+        finally:
+            for task in tasks:
+                task.cancel()
+            for outcome in await asyncio.gather(*tasks, return_exceptions=True):
+                if not isinstance(outcome, BaseException):
+                    await outcome.aclose()
+        if winner is not None:
+            if fallback is not None:
+                await fallback.aclose()
+            return winner
+        if fallback is not None:
+            return fallback
+        raise error
+
+    async def _parse_page(self, url: str, kind: str, parser) -> list:
+        chunks = self._iter_html(url, kind)
+        parsing = 0.0
+        try:
+            async for chunk in chunks:
+                if parser.done:
+                    if javdb.get_cache() is None:
+                        break
+                    continue
+                start = time.perf_counter()
+                parser.feed(chunk)
+                parsing += time.perf_counter() - start
+            if not parser.done:
+                start = time.perf_counter()
+                parser.close()
+                parsing += time.perf_counter() - start
+        finally:
+            await chunks.aclose()
+        tracing.record('javdb.parse', parsing, kind=kind)
+        return parser.items
+
+    async def _forward(self, name: str, *args):
+        """守护进程在运行时转发给它（阻塞调用放到线程中）"""
+        import daemon
+
+        async with asyncio.timeout(self.timeout):
+            return await asyncio.to_thread(daemon.call, 'javdb', name, *args)
+
+    async def _search_page(self, keyword: str, page: int, limit: int | None = None) -> tuple[list, bool]:
+        async with self._semaphore:
+            parser = javdb.SearchResultParser(limit)
+            items = await self._parse_page(javdb.search_url(keyword, page), 'search', parser)
+            return items, parser.has_next
+
+    async def search(self, keyword: str, limit: int | None = 10, pages: int | None = 1) -> list:
+        """search_javdb 的异步版本：后续页按并发上限一批批请求"""
+        with tracing.span('javdb.search', keyword=keyword, pages=pages):
+            if javdb.use_daemon():
+                async with self._semaphore:
+                    return await self._forward('search_javdb', keyword, limit, pages)
+            items, seen = [], set()
+            stop = javdb.merge_pages(items, seen, [await self._search_page(keyword, 1, limit)], limit)
+            if not stop and pages != 1:
+                for window in javdb.page_windows(pages, self.concurrency):
+                    outcomes = await asyncio.gather(*(self._search_page(keyword, p) for p in window))
+                    if javdb.merge_pages(items, seen, outcomes, limit):
+                        break
+            javdb.remember(items)
+            return items[:limit]
+
+    async def magnets(self, detail_url: str, limit: int | None = None) -> list:
+        """get_magnets 的异步版本"""
+        async with self._semaphore:
+            with tracing.span('javdb.magnets', url=detail_url):
+                if javdb.use_daemon():
+                    return await self._forward('get_magnets', detail_url, limit)
+                return await self._parse_page(detail_url, 'detail', javdb.MagnetParser(limit))
+
+    async def lookup(self, code: str) -> dict | None:
+        """lookup_code 的异步版本"""
+        item = javdb.catalog_lookup(code)
+        if item is None:
+            results = await self.search(code, 1)
+            if not results:
+                return None
+            item = dict(results[0])
+        item['magnets'] = await self.magnets(item['url'])
+        return item
+
+    # ---- 115 ----
+
+    async def call(self, method: str, *args, **kwargs):
+        """调用115客户端方法，受并发上限和超时约束"""
+        client = self.client
+        if client is None:
+            from cli import get_client
+
+            client = self.client = get_client()
+        async with self._semaphore:
+            if isinstance(client, ratelimit.LimitedClient):
+                return await client.acall(method, *args, timeout=self.timeout, **kwargs)
+            # 守护进程代理：限速和重试由守护进程负责
+            async with asyncio.timeout(self.timeout):
+                return await asyncio.to_thread(getattr(client, method), *args, **kwargs)
+
+    async def search_files(self, keyword: str, limit: int = 20) -> list:
+        """cli.search_files 的异步版本（单页）"""
+        result = await self.call('fs_search', {'search_value': keyword, 'limit': limit})
+        return result.get('data', [])
+
+async def settle(coros, on_done=None) -> list:
+    """
+    并发执行，返回与输入顺序一致的 [(结果, 异常), ...]；单个失败不影响其他请求
+    on_done(index, result, error) 在每个完成时调用
+    """
+    async def guarded(index, coro):
+        try:
+            result, error = await coro, None
+        except Exception as e:
+            result, error = None, e
+        if on_done:
+            on_done(index, result, error)
+        return result, error
+
+    return await asyncio.gather(*(guarded(i, c) for i, c in enumerate(coros)))
+
+async def search_many(keywords: list, limit: int | None = 10, concurrency: int = DEFAULT_CONCURRENCY,
+                      timeout: float = DEFAULT_TIMEOUT, pages: int | None = 1) -> list:
+    """多个关键词并发搜索，返回 [{'keyword': ..., 'results': [...], 'error': None | str}, ...]"""
+    async with Engine(concurrency, timeout) as engine:
+        outcomes = await settle(engine.search(k, limit, pages) for k in keywords)
+    return [
+        {'keyword': k, 'results': results or [], 'error': error_message(error)}
+        for k, (results, error) in zip(keywords, outcomes)
+    ]
+
+async def lookup_many(codes: list, concurrency: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TIMEOUT,
+                      on_done=None) -> list:
+    """多个番号并发查询磁链，返回 [{'code': ..., 'item': dict | None, 'error': None | str}, ...]"""
+    async with Engine(concurrency, timeout) as engine:
+        outcomes = await settle((engine.lookup(c) for c in codes), on_done)
+    return [
+        {'code': c, 'item': item, 'error': error_message(error)}
+        for c, (item, error) in zip(codes, outcomes)
+    ]
+
+async def search_files_many(keywords: list, limit: int = 20, concurrency: int = DEFAULT_CONCURRENCY,
+                            timeout: float = DEFAULT_TIMEOUT, client=None) -> list:
+    """多个关键词并发搜索网盘文件，返回与输入顺序一致的 [(文件列表, 异常), ...]"""
+    async with Engine(concurrency, timeout, client) as engine:
+        return await settle(engine.search_files(k, limit) for k in keywords)
+
+def error_message(error: Exception | None) -> str | None:
+    if error is None:
+        return None
+    if isinstance(error, TimeoutError):
+        return '请求超时'
+    return str(error) or type(error).__name__
+
+def merge_results(groups: list) -> list:
+    """多个关键词的搜索结果按关键词顺序合并，同一番号只保留第一次出现，并标注来自哪个关键词"""
+    merged = []
+    seen = set()
+    for group in groups:
+        for item in group['results']:
+            if item['code'].upper() in seen:
+                continue
+            seen.add(item['code'].upper())
+            merged.append(dict(item, keyword=group['keyword']))
+    return merged
+
+def run(coro):
+    """在新的事件循环中运行到结束"""
+    return asyncio.run(coro)
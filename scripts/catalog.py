@@ -0,0 +1,73 @@
+"""
+catalog - javdb番号目录
+搜索结果中的 番号 → 详情页路径、标题、日期 保存在 ~/.115cli/javdb_catalog.db
+番号与详情页的对应关系不会变化，条目永不过期、不参与页面缓存的LRU淘汰；
+按番号查询详情页时先查目录，命中就不必再搜索一次
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+CATALOG_FILE = Path.home() / ".115cli" / "javdb_catalog.db"
+
+class Catalog:
+    """线程安全的SQLite番号目录，番号不区分大小写"""
+
+    def __init__(self, path: Path = CATALOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS catalog (
+                key TEXT PRIMARY KEY,
+                code TEXT NOT NULL,
+                path TEXT NOT NULL,
+                title TEXT NOT NULL,
+                date TEXT NOT NULL,
+                added REAL NOT NULL
+            );
+        ''')
+        self.db.commit()
+
+    def add_many(self, items: list) -> int:
+        """记录搜索结果（url 只保存路径部分，与站点域名无关），返回新增条数"""
+        now = time.time()
+        rows = [
+            (item['code'].upper(), item['code'], urlsplit(item['url']).path, item['title'], item['date'], now)
+            for item in items
+        ]
+        with self._lock:
+            before = self.db.total_changes
+            self.db.executemany('INSERT OR IGNORE INTO catalog VALUES (?, ?, ?, ?, ?, ?)', rows)
+            self.db.commit()
+            return self.db.total_changes - before
+
+    def get(self, code: str) -> dict | None:
+        """按番号查询，返回 {'code', 'path', 'title', 'date'}"""
+        with self._lock:
+            row = self.db.execute(
+                'SELECT code, path, title, date FROM catalog WHERE key = ?', (code.strip().upper(),)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('code', 'path', 'title', 'date'), row))
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self.db.execute('SELECT COUNT(*) FROM catalog').fetchone()[0]
+        return {'path': str(self.path), 'entries': entries}
+
+    def clear(self) -> int:
+        with self._lock:
+            deleted = self.db.execute('DELETE FROM catalog').rowcount
+            self.db.commit()
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -8,28 +8,627 @@ import os
 import json
 import click
 from pathlib import Path
-from rich.console import Console
-from rich.table import Table
-from rich.progress import Progress, SpinnerColumn, TextColumn
+import threading
 import time
+from collections import deque
+from itertools import islice
+import ratelimit
+import tracing
+from dircache import DirCache, normalize_path
+from dedupe import KnownTasks, find_task_duplicate, find_file_duplicates, magnet_name, parse_size
+from lazy import LazyConsole
+from output import RecordWriter, format_option, write_records
 
-console = Console()
+# rich、p115client、sqlite索引等较重的模块在命令实际用到时才导入
+console = LazyConsole()
+err_console = LazyConsole(stderr=True)
 
 CONFIG_DIR = Path.home() / ".115cli"
 COOKIE_FILE = CONFIG_DIR / "cookie.txt"
+# 翻页列目录/搜索时每页的条目数（fs_files 单页上限）
+PAGE_SIZE = 1150
+
+TASK_STATUS = {
+    0: "⏳ 等待",
+    1: "⬇️ 下载中",
+    2: "✅ 完成",
+    -1: "❌ 失败"
+}
+
+NOT_LOGGED_IN = "未登录！请先运行: 115cli login"
+
+_client = None
+_dircache = None
+_index = None
+# 查重、守护进程的请求线程等会在多个线程中同时首次用到共享对象，创建时加锁，保证只建一个
+_shared_lock = threading.Lock()
 
 def get_client():
-    """获取已认证的115客户端"""
-    from p115client import P115Client
+    """获取已认证的115客户端（进程内共享；守护进程在运行时返回转发代理）"""
+    global _client
+    with _shared_lock:
+        if _client is not None:
+            return _client
+        
+        import daemon
+        
+        if daemon.available():
+            _client = daemon.RemoteClient()
+            return _client
+        
+        if not COOKIE_FILE.exists():
+            console.print(f"[red]{NOT_LOGGED_IN}[/red]")
+            raise SystemExit(1)
+        
+        from p115client import P115Client
+        
+        cookie = COOKIE_FILE.read_text().strip()
+        # 所有API调用经过跨进程共享的限速器
+        _client = ratelimit.LimitedClient(P115Client(cookie))
+        return _client
+
+def get_dircache() -> DirCache:
+    """路径 → 目录ID 缓存（进程内共享）"""
+    global _dircache
+    with _shared_lock:
+        if _dircache is None:
+            _dircache = DirCache()
+        return _dircache
+
+def get_index() -> 'FileIndex':
+    """本地文件索引（进程内共享）"""
+    global _index
+    with _shared_lock:
+        if _index is None:
+            from fileindex import FileIndex
+            _index = FileIndex()
+        return _index
+
+def resolve_cid(client, path: str) -> int:
+    """目录参数转cid：数字为目录ID，其余按路径解析（/ 为根目录，带本地缓存）"""
+    path = str(path).strip()
+    if path.isdigit():
+        return int(path)
+    try:
+        with tracing.span('cli.resolve_cid', path=path):
+            return get_dircache().resolve(client, path)
+    except FileNotFoundError as e:
+        raise click.BadParameter(f"目录不存在: {e}")
+
+# 115 添加云下载任务时“任务已存在”的错误码
+TASK_EXISTS_ERRCODE = 10008
+
+def offline_add_magnet(client, magnet: str, save_cid: int = 0) -> dict:
+    """
+    添加单个云下载任务
+    返回: {'magnet': ..., 'state': bool, 'info_hash': ..., 'error': ...}
+    """
+    payload = {'url': magnet}
+    if save_cid:
+        payload['wp_path_id'] = save_cid
     
-    if not COOKIE_FILE.exists():
-        console.print("[red]未登录！请先运行: 115cli login[/red]")
-        raise SystemExit(1)
+    result = client.offline_add_url(payload)
+    state = bool(result.get('state'))
+    return {
+        'magnet': magnet,
+        'state': state,
+        'info_hash': (result.get('info_hash') or '').lower() or None,
+        'error': None if state else result.get('error_msg', '未知错误'),
+    }
+
+def offline_remove_task(client, info_hash: str) -> bool:
+    """删除云下载任务（保留已下载的文件），返回是否成功"""
+    result = client.offline_remove({'hash[0]': info_hash.lower(), 'flag': 0})
+    return bool(result.get('state'))
+
+def task_exists(item: dict) -> bool:
+    """添加任务的返回是否为“任务已存在”（同一磁链的任务已在列表中）"""
+    return item.get('errcode', item.get('error_code')) == TASK_EXISTS_ERRCODE or '已存在' in (item.get('error_msg') or '')
+
+def offline_add_magnets(client, magnets: list, save_cid: int = 0) -> list:
+    """
+    一次请求批量添加云下载任务
+    返回与magnets顺序一致的结果: [{'magnet': ..., 'state': bool, 'info_hash': ..., 'error': ..., 'exists': bool}, ...]
+    exists 表示提交失败是因为同一磁链的任务已存在
+    """
+    payload = {f'url[{i}]': m for i, m in enumerate(magnets)}
+    if save_cid:
+        payload['wp_path_id'] = save_cid
+    
+    result = client.offline_add_urls(payload)
+    items = result.get('result') or []
+    
+    outcomes = []
+    for i, magnet in enumerate(magnets):
+        item = items[i] if i < len(items) else {}
+        state = bool(item.get('state')) if item else False
+        if not item and not result.get('state'):
+            error = result.get('error_msg') or result.get('error') or '未知错误'
+        else:
+            error = None if state else (item.get('error_msg') or '未知错误')
+        outcomes.append({
+            'magnet': magnet,
+            'state': state,
+            'info_hash': (item.get('info_hash') or '').lower() or None,
+            'error': error,
+            'exists': not state and bool(item) and task_exists(item),
+        })
+    return outcomes
+
+TASK_STATUS_NAMES = {
+    'waiting': 0,
+    'downloading': 1,
+    'done': 2,
+    'failed': -1,
+}
+TASK_STATUS_LABELS = {value: name for name, value in TASK_STATUS_NAMES.items()}
+
+def iter_task_pages(client, lookahead: int = 4):
+    """
+    逐页产出云下载任务列表（按添加时间倒序）
+    第一页确定总页数后，后续页面以最多 lookahead 个并发请求预取；调用方停止迭代时取消未开始的请求
+    """
+    first = client.offline_list({'page': 1})
+    yield first.get('tasks') or []
+    
+    page_count = int(first.get('page_count') or 1)
+    if page_count <= 1:
+        return
+    
+    from concurrent.futures import ThreadPoolExecutor
     
-    cookie = COOKIE_FILE.read_text().strip()
-    return P115Client(cookie)
+    pool = ThreadPoolExecutor(max_workers=max(1, lookahead))
+    futures = deque()
+    next_page = 2
+    try:
+        while futures or next_page <= page_count:
+            while next_page <= page_count and len(futures) < lookahead:
+                futures.append(pool.submit(client.offline_list, {'page': next_page}))
+                next_page += 1
+            tasks = futures.popleft().result().get('tasks') or []
+            if not tasks:
+                return
+            yield tasks
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_tasks(client, lookahead: int = 4):
+    """逐个产出云下载任务（按添加时间倒序）"""
+    pages = iter_task_pages(client, lookahead)
+    try:
+        for tasks in pages:
+            yield from tasks
+    finally:
+        pages.close()
+
+def list_tasks(client, limit: int | None = None) -> list:
+    """获取云下载任务列表（跨页）"""
+    return list(islice(iter_tasks(client), limit))
+
+def task_matches(task: dict, status: int | None = None, name: str | None = None,
+                 since: float | None = None, until: float | None = None) -> bool:
+    """任务过滤：状态、名称包含（不区分大小写）、添加时间范围"""
+    if status is not None and task.get('status') != status:
+        return False
+    if name and name.lower() not in (task.get('name') or '').lower():
+        return False
+    add_time = int(task.get('add_time') or 0)
+    if since is not None and add_time < since:
+        return False
+    if until is not None and add_time >= until:
+        return False
+    return True
+
+def index_tasks(client, wanted: set | None = None, since: float | None = None) -> dict:
+    """
+    按info_hash（小写）建立任务字典
+    指定 wanted 时找齐即停止翻页；指定 since 时读到添加时间早于 since 的任务即停止（列表按添加时间倒序）；
+    都不指定时读取全部页面
+    """
+    index = {}
+    remaining = set(wanted) if wanted is not None else None
+    for task in iter_tasks(client):
+        if since is not None and int(task.get('add_time') or 0) < since:
+            break
+        info_hash = task.get('info_hash', '').lower()
+        if not info_hash:
+            continue
+        index[info_hash] = task
+        if remaining is not None:
+            remaining.discard(info_hash)
+            if not remaining:
+                break
+    return index
+
+def find_task(client, info_hash: str) -> dict | None:
+    """按info_hash查找云下载任务"""
+    return index_tasks(client, {info_hash.lower()}).get(info_hash.lower())
+
+class TaskWatcher:
+    """
+    多任务监视器
+    每轮只调用一次 offline_list，按info_hash字典查找所有被监视的任务；
+    轮询间隔按下载进度速率自适应：预计最快完成的任务剩余时间的一半，夹在 [min_interval, max_interval] 之间，
+    没有任何进展时逐步退避
+    指定 stall_after 时，下载中（status 1）进度超过 stall_after 秒没有变化的任务产出一次 stalled 事件（仍继续监视，进度恢复后可再次产出）
+    翻页只读到被监视任务中最早添加的那个为止；监视所有任务时，更早的页面每 FULL_SCAN_INTERVAL 秒才完整读一次
+    """
+    
+    FULL_SCAN_INTERVAL = 600
+    
+    def __init__(self, client, hashes=None, min_interval: float = 3, max_interval: float = 60,
+                 stall_after: float | None = None):
+        self.client = client
+        # hashes 为None表示监视所有未完成任务（包括之后新加入的）
+        self.watch_all = hashes is None
+        self.pending = {h.lower(): None for h in hashes or []}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.stall_after = stall_after
+        self._progress = {}
+        self._stalled = set()
+        # 被监视任务的添加时间，决定翻页读到哪里为止
+        self._added = {}
+        self._newest = None
+        self._full_scan = 0.0
+    
+    def add(self, hashes):
+        """运行中加入新的任务"""
+        for info_hash in hashes:
+            self.pending.setdefault(info_hash.lower(), None)
+    
+    def discard(self, info_hash: str):
+        """不再监视某个任务（如已删除换用其他磁链）"""
+        info_hash = info_hash.lower()
+        self.pending.pop(info_hash, None)
+        self._progress.pop(info_hash, None)
+        self._stalled.discard(info_hash)
+        self._added.pop(info_hash, None)
+    
+    def _since(self, now: float) -> float | None:
+        """本轮翻页的截止添加时间，None 表示读取全部页面（或找齐为止）"""
+        if self.watch_all and now - self._full_scan >= self.FULL_SCAN_INTERVAL:
+            return None
+        added = [self._added.get(h) for h in self.pending]
+        if None in added:
+            # 还没见过的任务，位置未知
+            return None
+        if added:
+            return min(added)
+        # 监视所有任务且没有未完成的：只需要看有没有新任务
+        return self._newest if self.watch_all else None
+    
+    def poll(self) -> list:
+        """
+        查询一次，返回事件列表:
+        [{'event': 'progress'|'stalled'|'completed'|'failed'|'missing', 'info_hash': ..., 'task': {...}}]
+        """
+        now = time.time()
+        since = self._since(now)
+        tasks = index_tasks(self.client, None if self.watch_all else set(self.pending), since)
+        
+        if self.watch_all:
+            if since is None:
+                self._full_scan = now
+            for info_hash, task in tasks.items():
+                if task.get('status') in (0, 1):
+                    self.pending.setdefault(info_hash, None)
+                self._newest = max(self._newest or 0, int(task.get('add_time') or 0))
+        for info_hash in self.pending:
+            if info_hash in tasks:
+                self._added[info_hash] = int(tasks[info_hash].get('add_time') or 0)
+        
+        events = []
+        etas = []
+        for info_hash in list(self.pending):
+            task = tasks.get(info_hash)
+            status_val = task.get('status') if task else None
+            
+            if task is None or status_val in (2, -1):
+                event = 'missing' if task is None else ('completed' if status_val == 2 else 'failed')
+                events.append({'event': event, 'info_hash': info_hash, 'task': task})
+                self.discard(info_hash)
+                continue
+            
+            self.pending[info_hash] = task
+            percent = float(task.get('percent_done') or 0)
+            previous = self._progress.get(info_hash)
+            if previous and percent > previous[1]:
+                rate = (percent - previous[1]) / max(now - previous[0], 1e-3)
+                etas.append((100 - percent) / rate)
+            if previous is None or percent != previous[1]:
+                events.append({'event': 'progress', 'info_hash': info_hash, 'task': task})
+                self._progress[info_hash] = (now, percent)
+                self._stalled.discard(info_hash)
+            elif status_val != 1:
+                # 还在排队（status 0）的任务没有开始下载，等待时间不算停滞
+                self._progress[info_hash] = (now, percent)
+            elif (self.stall_after and info_hash not in self._stalled
+                  and now - previous[0] >= self.stall_after):
+                events.append({'event': 'stalled', 'info_hash': info_hash, 'task': task})
+                self._stalled.add(info_hash)
+        
+        self._adapt(events, etas)
+        return events
+    
+    def _adapt(self, events: list, etas: list):
+        if etas:
+            target = min(etas) / 2
+        elif any(e['event'] != 'progress' for e in events):
+            target = self.min_interval
+        elif events:
+            # 首次看到的任务还没有速率数据
+            target = self.interval
+        else:
+            target = self.interval * 1.5
+        self.interval = max(self.min_interval, min(self.max_interval, target))
+    
+    def iter_events(self, timeout: float):
+        """持续轮询直到所有任务结束或超时，逐个产出事件"""
+        start = time.time()
+        while True:
+            yield from self.poll()
+            if not self.pending:
+                return
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
+                return
+            time.sleep(min(self.interval, remaining))
+
+def wait_task(client, info_hash: str, timeout: float = 600, interval: float = 5, on_progress=None) -> dict | None:
+    """
+    轮询直到任务完成或失败
+    返回最后一次查询到的任务信息；任务不存在返回None，超时返回时 status 仍为 0/1
+    """
+    watcher = TaskWatcher(client, [info_hash], min_interval=interval, max_interval=max(interval, 30))
+    with tracing.span('cli.wait_task', info_hash=info_hash):
+        for event in watcher.iter_events(timeout):
+            if event['event'] == 'progress':
+                if on_progress:
+                    on_progress(event['task'])
+            elif event['event'] == 'missing':
+                return None
+            else:
+                return event['task']
+        return watcher.pending.get(info_hash.lower())
+
+def event_record(event: dict) -> dict:
+    """监视事件 → 可输出的NDJSON记录"""
+    task = event.get('task') or {}
+    return {
+        'event': event['event'],
+        'info_hash': event['info_hash'],
+        'name': task.get('name'),
+        'status': task.get('status'),
+        'percent_done': task.get('percent_done'),
+        'file_id': task.get('file_id'),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+_known_tasks = None
+
+def get_known_tasks(client) -> KnownTasks:
+    """已提交过的任务集合（进程内共享，过期时从 offline_list 刷新）"""
+    global _known_tasks
+    if _known_tasks is None:
+        _known_tasks = KnownTasks()
+    if _known_tasks.is_stale():
+        _known_tasks.refresh(iter_tasks(client))
+        _known_tasks.save()
+    return _known_tasks
+
+# 文件查重时搜索的条目数
+DUPLICATE_SEARCH_LIMIT = 50
+
+def index_ready() -> bool:
+    """本地文件索引是否可用于查重（同步过目录）；批量查重时只需判断一次"""
+    from fileindex import INDEX_FILE
+
+    return INDEX_FILE.exists() and get_index().has_synced()
+
+def find_duplicate(client, magnet: str, title: str | None = None, size=None,
+                   use_index: bool | None = None) -> dict | None:
+    """
+    提交前查重：同一info_hash的任务已存在，或网盘中已有同名（大小相近）的文件
+    title 默认取磁力链接的 dn 参数；有本地索引时文件查重不请求网盘（use_index 默认按 index_ready() 判断）
+    返回: {'reason': 'task' | 'file', 'info_hash': ..., 'name': ..., ...}，没有重复时返回None
+    """
+    with tracing.span('cli.find_duplicate'):
+        return _find_duplicate(client, magnet, title, size, use_index)
+
+def _find_duplicate(client, magnet: str, title: str | None, size, use_index: bool | None) -> dict | None:
+    duplicate = find_task_duplicate(get_known_tasks(client), magnet)
+    if duplicate:
+        return duplicate
+    
+    title = title or magnet_name(magnet)
+    if not title:
+        return None
+    if use_index is None:
+        use_index = index_ready()
+    if use_index:
+        entries = get_index().search(title, limit=DUPLICATE_SEARCH_LIMIT)
+    else:
+        entries = search_files(client, title, limit=DUPLICATE_SEARCH_LIMIT)
+    return file_duplicate(entries, title, size)
+
+def file_duplicate(entries: list, title: str, size=None) -> dict | None:
+    """在搜索结果中查找同名（大小相近）的文件，返回格式同 find_duplicate"""
+    files = find_file_duplicates(entries, title, parse_size(size) if size else None)
+    if not files:
+        return None
+    return {'reason': 'file', 'info_hash': None, 'name': files[0].get('n', ''), 'file_id': files[0]['fid']}
+
+def remember_submitted(client, submitted: dict):
+    """记录提交成功的任务: {info_hash: 名称}"""
+    known = get_known_tasks(client)
+    for info_hash, name in submitted.items():
+        if info_hash:
+            known.add(info_hash, name)
+    known.save()
+
+def describe_duplicate(duplicate: dict) -> str:
+    """查重结果的简短说明"""
+    if duplicate['reason'] == 'task':
+        status = TASK_STATUS.get(duplicate.get('status'), '未知')
+        return f"任务已存在（{status}）{duplicate['name']}"
+    return f"网盘中已有文件 {duplicate['name']} (ID {duplicate['file_id']})"
+
+def search_files(client, keyword: str, limit: int = 20) -> list:
+    """搜索文件（单页）"""
+    return client.fs_search({'search_value': keyword, 'limit': limit}).get('data', [])
+
+def iter_file_pages(client, cid: int, limit: int | None = None, page_size: int = PAGE_SIZE):
+    """逐页列出目录（含子目录），最多 limit 条，None 为全部"""
+    offset = 0
+    while limit is None or offset < limit:
+        size = page_size if limit is None else min(page_size, limit - offset)
+        result = client.fs_files({'cid': cid, 'show_dir': 1, 'limit': size, 'offset': offset})
+        data = result.get('data') or []
+        if not data:
+            return
+        yield data
+        offset += len(data)
+        if offset >= int(result.get('count') or 0):
+            return
+
+def iter_search_pages(client, keyword: str, limit: int | None = None, page_size: int = PAGE_SIZE):
+    """逐页产出搜索结果，最多 limit 条，None 为全部"""
+    offset = 0
+    while limit is None or offset < limit:
+        size = page_size if limit is None else min(page_size, limit - offset)
+        data = client.fs_search({'search_value': keyword, 'limit': size, 'offset': offset}).get('data') or []
+        if not data:
+            return
+        yield data
+        offset += len(data)
+        if len(data) < size:
+            return
+
+FILE_FIELDS = ['type', 'id', 'parent', 'name', 'size', 'sha1', 'pick_code', 'mtime']
+TASK_FIELDS = ['info_hash', 'name', 'status', 'percent_done', 'size', 'add_time', 'file_id']
+
+def file_record(entry: dict) -> dict:
+    """fs_files / fs_search 条目 → 输出记录"""
+    is_dir = entry.get('fid') is None
+    mtime = entry.get('te') or entry.get('t')
+    return {
+        'type': 'dir' if is_dir else 'file',
+        'id': int(entry['cid'] if is_dir else entry['fid']),
+        'parent': entry.get('pid') if is_dir else entry.get('cid'),
+        'name': entry.get('n', ''),
+        'size': None if is_dir else int(entry.get('s') or 0),
+        'sha1': None if is_dir else entry.get('sha'),
+        'pick_code': entry.get('pc'),
+        'mtime': int(mtime) if str(mtime or '').isdigit() else mtime,
+    }
+
+def task_record(task: dict) -> dict:
+    """offline_list 任务 → 输出记录（status 为 waiting/downloading/done/failed）"""
+    return {
+        'info_hash': (task.get('info_hash') or '').lower(),
+        'name': task.get('name'),
+        'status': TASK_STATUS_LABELS.get(task.get('status'), task.get('status')),
+        'percent_done': task.get('percent_done'),
+        'size': task.get('size'),
+        'add_time': task.get('add_time'),
+        'file_id': task.get('file_id') or None,
+    }
+
+def fail(fmt: str, message: str, style: str = 'red'):
+    """
+    出错：表格模式照常输出到stdout；
+    机器可读格式输出到stderr并以状态1退出，避免错误信息混入数据
+    """
+    from rich.markup import escape
+    
+    if fmt == 'table':
+        console.print(f"[{style}]{escape(message)}[/{style}]")
+        return
+    err_console.print(f"[{style}]{escape(message)}[/{style}]")
+    raise SystemExit(1)
+
+def move_files(client, file_ids: list, target_cid: int) -> dict:
+    """移动文件/目录"""
+    return client.fs_move([int(fid) for fid in file_ids], target_cid)
+
+def read_ids(stream) -> list:
+    """读取ID列表：每行取第一列，忽略空行和 # 注释"""
+    ids = []
+    for line in stream:
+        fields = line.split('#', 1)[0].split()
+        if fields and fields[0].isdigit():
+            ids.append(int(fields[0]))
+    return ids
+
+def parse_size_option(value: str | None, param: str) -> int | None:
+    if value is None:
+        return None
+    size = parse_size(value if value[-1:].upper() == 'B' else value + 'B')
+    if size is None:
+        raise click.BadParameter(f"无法解析大小: {value}", param_hint=param)
+    return size
+
+def select_entries(entries: list, name: str | None = None, exts: list | None = None,
+                   min_size: int | None = None, max_size: int | None = None, include_dirs: bool = False) -> list:
+    """按名称通配符、扩展名、大小范围筛选 fs_files 条目（目录没有大小，只按名称匹配）"""
+    from fnmatch import fnmatch
+    
+    exts = {e.lower().lstrip('.') for e in exts} if exts else None
+    selected = []
+    for entry in entries:
+        is_dir = entry.get('fid') is None
+        if is_dir and not include_dirs:
+            continue
+        entry_name = entry.get('n', '')
+        if name and not fnmatch(entry_name.lower(), name.lower()):
+            continue
+        if not is_dir:
+            size = int(entry.get('s') or 0)
+            if exts is not None and entry_name.rsplit('.', 1)[-1].lower() not in exts:
+                continue
+            if (min_size is not None and size < min_size) or (max_size is not None and size > max_size):
+                continue
+        elif exts is not None or min_size is not None or max_size is not None:
+            continue
+        selected.append(entry)
+    return selected
+
+def move_in_chunks(client, ids: list, target_cid: int, chunk_size: int = 500, workers: int = 4,
+                   retries: int = 2, on_chunk=None) -> dict:
+    """
+    把ID分成大块并发调用 fs_move，只重试失败的分块
+    返回: {'moved': [id, ...], 'failed': [{'ids': [...], 'error': ...}, ...]}
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    pending = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    moved = []
+    for attempt in range(retries + 1):
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+            futures = {pool.submit(move_files, client, chunk, target_cid): chunk for chunk in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    result = future.result()
+                    error = None if result.get('state') else (result.get('error') or result.get('error_msg') or str(result))
+                except Exception as e:
+                    error = str(e)
+                if error:
+                    failed.append({'ids': chunk, 'error': error})
+                else:
+                    moved.extend(chunk)
+                if on_chunk:
+                    on_chunk(chunk, error)
+        if not failed or attempt == retries:
+            return {'moved': moved, 'failed': failed}
+        pending = [f['ids'] for f in failed]
+        time.sleep(ratelimit.backoff(attempt))
 
 @click.group()
+@tracing.options
 def cli():
     """115网盘命令行工具"""
     CONFIG_DIR.mkdir(exist_ok=True)
@@ -59,6 +658,12 @@ def login(cookie):
             console.print("115cli login --cookie 'YOUR_COOKIE_STRING'")
             raise SystemExit(1)
     
+    # 让守护进程使用新cookie
+    import daemon
+    
+    if daemon.available():
+        daemon.call('daemon', 'reload')
+    
     # 验证登录
     try:
         client = get_client()
@@ -68,225 +673,768 @@ def login(cookie):
         console.print(f"[yellow]Cookie已保存，但验证失败: {e}[/yellow]")
 
 @cli.command()
-def whoami():
+@format_option()
+def whoami(fmt):
     """显示当前登录用户信息"""
     client = get_client()
     try:
         info = client.user_info()
-        console.print(f"用户名: {info.get('user_name', 'N/A')}")
-        console.print(f"用户ID: {info.get('user_id', 'N/A')}")
     except Exception as e:
-        console.print(f"[red]获取用户信息失败: {e}[/red]")
+        fail(fmt, f"获取用户信息失败: {e}")
+        return
+    if fmt != 'table':
+        write_records(fmt, [{'user_name': info.get('user_name'), 'user_id': info.get('user_id')}])
+        return
+    console.print(f"用户名: {info.get('user_name', 'N/A')}")
+    console.print(f"用户ID: {info.get('user_id', 'N/A')}")
+
+DOWNLOAD_FIELDS = ['magnet', 'state', 'info_hash', 'error', 'duplicate']
 
 @cli.command()
 @click.argument('magnet')
-@click.option('--save-path', '-s', default='/', help='保存路径（目录ID或路径）')
-def download(magnet, save_path):
-    """添加磁力链接到云下载"""
+@click.option('--save-path', '-s', default='/', help='保存目录（目录ID或路径）')
+@click.option('--force', '-f', is_flag=True, help='跳过查重，强制提交')
+@format_option()
+def download(magnet, save_path, force, fmt):
+    """添加磁力链接到云下载（默认跳过已有任务/文件）"""
+    from rich.markup import escape
+    
     client = get_client()
     
-    console.print(f"[cyan]添加云下载任务...[/cyan]")
-    console.print(f"链接: {magnet[:60]}...")
+    if fmt == 'table':
+        console.print(f"[cyan]添加云下载任务...[/cyan]")
+        console.print(f"链接: {magnet[:60]}...")
     
     try:
-        # 添加离线下载任务
-        result = client.offline_add_url(magnet, save_path)
+        duplicate = None if force else find_duplicate(client, magnet)
+        if duplicate:
+            if fmt != 'table':
+                write_records(fmt, [{
+                    'magnet': magnet, 'state': False, 'info_hash': duplicate['info_hash'],
+                    'error': None, 'duplicate': describe_duplicate(duplicate),
+                }], DOWNLOAD_FIELDS)
+                return duplicate['info_hash']
+            console.print(f"[yellow]跳过：{escape(describe_duplicate(duplicate))}[/yellow]（--force 强制提交）")
+            return duplicate['info_hash']
         
-        if result.get('state'):
-            info_hash = result.get('info_hash', 'N/A')
-            console.print(f"[green]✓ 任务添加成功！[/green]")
-            console.print(f"Info Hash: {info_hash}")
-            return info_hash
-        else:
-            error = result.get('error_msg', '未知错误')
-            console.print(f"[red]✗ 添加失败: {error}[/red]")
-            raise SystemExit(1)
+        # 添加离线下载任务
+        result = offline_add_magnet(client, magnet, resolve_cid(client, save_path))
     except Exception as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, f"错误: {e}")
+        raise SystemExit(1)
+    
+    if result['state']:
+        remember_submitted(client, {result['info_hash']: magnet_name(magnet) or ''})
+    if fmt != 'table':
+        write_records(fmt, [dict(result, duplicate=None)], DOWNLOAD_FIELDS)
+        if not result['state']:
+            raise SystemExit(1)
+        return result['info_hash']
+    
+    if result['state']:
+        console.print(f"[green]✓ 任务添加成功！[/green]")
+        console.print(f"Info Hash: {result['info_hash'] or 'N/A'}")
+        return result['info_hash']
+    else:
+        console.print(f"[red]✗ 添加失败: {result['error']}[/red]")
         raise SystemExit(1)
 
+def print_task_row(task: dict, header: bool):
+    from rich.markup import escape
+    
+    if header:
+        console.print(f"[bold]{'状态':<8} {'进度':>6} {'大小':>9}  名称[/bold]")
+    status_text = TASK_STATUS.get(task.get('status', 0), "❓ 未知")
+    percent = f"{task.get('percent_done', 0)}%"
+    size = format_size(task.get('size', 0))
+    console.print(
+        f"[cyan]{status_text:<8}[/cyan] [green]{percent:>6}[/green] [blue]{size:>9}[/blue]  {escape(task.get('name', 'N/A'))}",
+        highlight=False
+    )
+
 @cli.command()
-@click.option('--limit', '-n', default=20, help='显示数量')
-def tasks(limit):
-    """查看云下载任务列表"""
+@click.option('--limit', '-n', default=20, help='显示数量（0为全部）')
+@click.option('--status', type=click.Choice(list(TASK_STATUS_NAMES)), help='按状态过滤')
+@click.option('--name', help='名称包含')
+@click.option('--since', type=click.DateTime(['%Y-%m-%d']), help='添加日期不早于')
+@click.option('--until', type=click.DateTime(['%Y-%m-%d']), help='添加日期早于')
+@format_option()
+def tasks(limit, status, name, since, until, fmt):
+    """查看云下载任务列表（跨页，逐页输出）"""
     client = get_client()
+    since = since.timestamp() if since else None
+    until = until.timestamp() if until else None
+    writer = None if fmt == 'table' else RecordWriter(fmt, TASK_FIELDS)
     
     try:
-        result = client.offline_list()
-        task_list = result.get('tasks', [])
+        shown = 0
+        done = False
+        for page in iter_task_pages(client):
+            matched = []
+            for task in page:
+                # 任务按添加时间倒序，早于 --since 之后不会再有匹配
+                if since is not None and int(task.get('add_time') or 0) < since:
+                    done = True
+                    break
+                if not task_matches(task, TASK_STATUS_NAMES.get(status), name, None, until):
+                    continue
+                matched.append(task)
+                if limit and shown + len(matched) >= limit:
+                    done = True
+                    break
+            
+            if writer:
+                writer.write_many(task_record(t) for t in matched)
+            else:
+                for i, task in enumerate(matched):
+                    print_task_row(task, header=shown == 0 and i == 0)
+            shown += len(matched)
+            if done:
+                break
         
-        if not task_list:
+        if writer:
+            writer.close()
+        elif shown == 0:
             console.print("[yellow]没有云下载任务[/yellow]")
+    except Exception as e:
+        fail(fmt, f"获取任务列表失败: {e}")
+
+def remember_dirs(path: str, entries: list):
+    """按路径列目录时顺便记录子目录，之后按路径访问无需再请求"""
+    if path.isdigit():
+        return
+    get_dircache().remember_children(normalize_path(path), {
+        f.get('n', ''): int(f['cid']) for f in entries if f.get('fid') is None and f.get('cid') is not None
+    })
+
+@cli.command()
+@click.argument('path', default='/')
+@click.option('--limit', '-n', default=30, help='显示数量（0为全部）')
+@click.option('--local', '-l', is_flag=True, help='从本地索引读取（需先 index sync）')
+@format_option()
+def ls(path, limit, local, fmt):
+    """列出目录内容（ndjson/json/tsv 格式逐页输出）"""
+    if local:
+        cid = int(path) if path.isdigit() else get_index().resolve_path(path)
+        files = get_index().list_dir(cid, limit or None) if cid is not None else None
+        if files is None:
+            fail(fmt, "本地索引中没有该目录，请先运行: 115cli index sync", 'yellow')
             return
+        if fmt != 'table':
+            write_records(fmt, map(file_record, files), FILE_FIELDS)
+            return
+        print_files(files, f"目录内容: {path} (cid={cid}, 本地索引)", "目录为空")
+        return
+    
+    client = get_client()
+    
+    try:
+        cid = resolve_cid(client, path)
+        pages = iter_file_pages(client, cid, limit or None)
+        files = []
+        if fmt == 'table':
+            for page in pages:
+                files.extend(page)
+                remember_dirs(path, page)
+        else:
+            with RecordWriter(fmt, FILE_FIELDS) as writer:
+                for page in pages:
+                    writer.write_many(file_record(f) for f in page)
+                    remember_dirs(path, page)
+        get_dircache().save()
         
-        table = Table(title="云下载任务")
-        table.add_column("状态", style="cyan")
-        table.add_column("名称", max_width=50)
-        table.add_column("进度", style="green")
-        table.add_column("大小", style="blue")
-        
-        for task in task_list[:limit]:
-            status_map = {
-                0: "⏳ 等待",
-                1: "⬇️ 下载中",
-                2: "✅ 完成",
-                -1: "❌ 失败"
-            }
-            status = status_map.get(task.get('status', 0), "❓ 未知")
-            name = task.get('name', 'N/A')[:50]
-            percent = f"{task.get('percent_done', 0)}%"
-            size = format_size(task.get('size', 0))
-            
-            table.add_row(status, name, percent, size)
-        
-        console.print(table)
+        if fmt == 'table':
+            title = f"目录内容 (cid={cid})" if path.isdigit() else f"目录内容: {normalize_path(path)} (cid={cid})"
+            print_files(files, title, "目录为空")
     except Exception as e:
-        console.print(f"[red]获取任务列表失败: {e}[/red]")
+        fail(fmt, f"获取目录失败: {e}")
+
+DU_FIELDS = ['id', 'parent', 'path', 'depth', 'files', 'dirs', 'size']
+TREE_FIELDS = ['type', 'id', 'parent', 'depth', 'path', 'size', 'sha1', 'pick_code', 'mtime']
+
+def walk_progress(fmt: str):
+    """遍历目录树时的进度显示（仅表格模式），返回 (Progress, on_page)"""
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    
+    progress = Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        console=err_console.instance,
+        transient=True,
+        disable=fmt != 'table',
+    )
+    task = progress.add_task("遍历中...", total=None)
+    counts = {'pages': 0, 'entries': 0}
+    
+    def on_page(cid, entries):
+        counts['pages'] += 1
+        counts['entries'] += len(entries)
+        progress.update(task, description=f"遍历中... {counts['pages']} 页, {counts['entries']} 个条目")
+    
+    return progress, on_page
 
 @cli.command()
 @click.argument('path', default='/')
-@click.option('--limit', '-n', default=30, help='显示数量')
-def ls(path, limit):
-    """列出目录内容"""
+@click.option('--depth', '-d', default=1, help='显示到第几层子目录（0为只显示总计）')
+@click.option('--workers', '-w', default=8, help='同时在途的请求数')
+@format_option()
+def du(path, depth, workers, fmt):
+    """统计目录树的大小和文件数（并发遍历；ndjson/json/tsv 格式在每个目录统计完成时输出）"""
+    import treewalk
+    
     client = get_client()
+    try:
+        cid = resolve_cid(client, path)
+        root_path = path if path.isdigit() else normalize_path(path)
+        progress, on_page = walk_progress(fmt)
+        usage = treewalk.disk_usage(client, cid, root_path, workers, on_page=on_page)
+        if fmt != 'table':
+            with RecordWriter(fmt, DU_FIELDS) as writer:
+                for record in usage:
+                    if record['depth'] <= depth:
+                        writer.write_many([record])
+            return
+        with progress:
+            records = [record for record in usage if record['depth'] <= depth]
+    except Exception as e:
+        fail(fmt, f"统计失败: {e}")
+        return
+    
+    from rich.markup import escape
+    from rich.table import Table
     
+    table = Table(title=f"目录大小: {root_path}")
+    table.add_column("路径", max_width=60)
+    table.add_column("大小", style="blue", justify="right")
+    table.add_column("文件", justify="right")
+    table.add_column("目录", justify="right")
+    for record in sorted(records, key=lambda r: r['path']):
+        table.add_row(
+            escape(record['path']),
+            format_size(record['size']),
+            str(record['files']),
+            str(record['dirs']),
+            style='bold' if record['id'] == cid else None,
+        )
+    console.print(table)
+
+@cli.command()
+@click.argument('path', default='/')
+@click.option('--max-depth', '-L', type=int, help='最多进入几层子目录')
+@click.option('--dirs-only', '-d', is_flag=True, help='只显示目录')
+@click.option('--workers', '-w', default=8, help='同时在途的请求数')
+@format_option()
+def tree(path, max_depth, dirs_only, workers, fmt):
+    """递归列出目录树（并发遍历；ndjson/json/tsv 格式逐页输出，顺序为到达顺序）"""
+    import treewalk
+    
+    client = get_client()
     try:
-        # 如果是数字，当作目录ID
-        if path.isdigit():
-            cid = int(path)
-        else:
-            # 路径转ID
-            cid = 0  # 根目录
-            if path != '/':
-                # 简单实现：只支持根目录或目录ID
-                console.print("[yellow]提示：路径导航暂只支持目录ID，根目录请用 / 或 0[/yellow]")
+        cid = resolve_cid(client, path)
+        root_path = path if path.isdigit() else normalize_path(path)
+        paths = {cid: root_path}
+        children = {}
+        progress, on_page = walk_progress(fmt)
+        writer = RecordWriter(fmt, TREE_FIELDS) if fmt != 'table' else None
+        with progress:
+            for dir_cid, depth, entries, listed in treewalk.walk(client, cid, workers, max_depth):
+                on_page(dir_cid, entries)
+                records = []
+                for entry in entries:
+                    entry_path = f"{paths[dir_cid].rstrip('/')}/{entry.get('n', '')}"
+                    if treewalk.is_dir(entry):
+                        paths[int(entry['cid'])] = entry_path
+                    elif dirs_only:
+                        continue
+                    if writer:
+                        records.append(dict(file_record(entry), parent=dir_cid, depth=depth + 1, path=entry_path))
+                    else:
+                        children.setdefault(dir_cid, []).append(entry)
+                if writer:
+                    writer.write_many(records)
+        if writer:
+            writer.close()
+            return
+    except Exception as e:
+        fail(fmt, f"遍历失败: {e}")
+        return
+    
+    from rich.markup import escape
+    from rich.tree import Tree
+    
+    def add_children(node, dir_cid):
+        for entry in children.get(dir_cid, []):
+            if treewalk.is_dir(entry):
+                add_children(node.add(f"[bold blue]{escape(entry.get('n', ''))}/[/bold blue]"), int(entry['cid']))
+            else:
+                node.add(f"{escape(entry.get('n', ''))} [dim]{format_size(int(entry.get('s') or 0))}[/dim]")
+    
+    root = Tree(f"[bold]{escape(root_path)}[/bold] (cid={cid})")
+    add_children(root, cid)
+    console.print(root)
+
+MOVE_FIELDS = ['target', 'count', 'ids', 'error']
+
+@cli.command()
+@click.argument('file_ids', nargs=-1)
+@click.argument('target_dir')
+@click.option('--from', 'source', help='从该目录（目录ID或路径）中按条件选择')
+@click.option('--name', help='名称通配符，如 "*.mp4"、"ABC-*"（不区分大小写）')
+@click.option('--ext', help='扩展名，逗号分隔，如 mp4,mkv')
+@click.option('--min-size', help='最小大小，如 500MB')
+@click.option('--max-size', help='最大大小，如 10GB')
+@click.option('--include-dirs', is_flag=True, help='选择器也匹配子目录（默认只选文件）')
+@click.option('--chunk-size', '-c', default=500, help='每次 fs_move 的条目数')
+@click.option('--workers', '-w', default=4, help='并发请求数')
+@click.option('--retries', default=2, help='失败分块的重试轮数')
+@click.option('--dry-run', is_flag=True, help='只列出将被移动的条目')
+@format_option()
+def mv(file_ids, target_dir, source, name, ext, min_size, max_size, include_dirs,
+       chunk_size, workers, retries, dry_run, fmt):
+    """
+    批量移动文件/目录到指定目录（目录ID或路径）
+
+    \b
+    FILE_IDS 可以是多个ID，或 - 表示从标准输入读取（每行一个）；
+    也可以用 --from 加 --name/--ext/--min-size/--max-size 从目录中选择
+    --format ndjson/json/tsv：--dry-run 时输出选中的条目，否则每个分块完成（含重试）时输出一条记录
+    """
+    client = get_client()
+    writer = None
+    
+    try:
+        ids = []
+        for file_id in file_ids:
+            if file_id == '-':
+                ids.extend(read_ids(click.get_text_stream('stdin')))
+            elif file_id.isdigit():
+                ids.append(int(file_id))
+            else:
+                raise click.BadParameter(f"不是有效的ID: {file_id}", param_hint='FILE_IDS')
         
-        result = client.fs_files(cid, limit=limit)
-        files = result.get('data', [])
+        selected = []
+        if source:
+            from fileindex import list_dir_entries
+            
+            entries = list_dir_entries(client, resolve_cid(client, source))
+            selected = select_entries(
+                entries, name=name, exts=ext.split(',') if ext else None,
+                min_size=parse_size_option(min_size, '--min-size'),
+                max_size=parse_size_option(max_size, '--max-size'),
+                include_dirs=include_dirs,
+            )
+            ids.extend(int(e['fid'] if e.get('fid') is not None else e['cid']) for e in selected)
+        elif name or ext or min_size or max_size:
+            raise click.UsageError("--name/--ext/--min-size/--max-size 需要配合 --from 使用")
         
-        if not files:
-            console.print("[yellow]目录为空[/yellow]")
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            if fmt != 'table':
+                write_records(fmt, [], MOVE_FIELDS if not dry_run else FILE_FIELDS)
+                return
+            console.print("[yellow]没有要移动的条目[/yellow]")
             return
         
-        table = Table(title=f"目录内容 (cid={cid})")
-        table.add_column("类型", style="cyan", width=4)
-        table.add_column("名称", max_width=50)
-        table.add_column("大小", style="blue", justify="right")
-        table.add_column("ID", style="dim")
+        target_cid = resolve_cid(client, target_dir)
+        if dry_run:
+            if fmt != 'table':
+                # 直接给出的ID没有条目详情，只输出ID
+                records = {r['id']: r for r in map(file_record, selected)}
+                write_records(fmt, (records.get(i) or {'id': i} for i in ids), FILE_FIELDS)
+                return
+            if selected:
+                print_files(selected, f"将移动到 {target_dir} (cid={target_cid})", "")
+            console.print(f"共 {len(ids)} 个条目，{(len(ids) + chunk_size - 1) // chunk_size} 次请求")
+            return
         
-        for f in files:
-            ftype = "📁" if f.get('fid') is None else "📄"
-            name = f.get('n', 'N/A')[:50]
-            size = format_size(f.get('s', 0)) if f.get('fid') else '-'
-            fid = str(f.get('cid') or f.get('fid', 'N/A'))
+        on_chunk = None
+        if fmt != 'table':
+            writer = RecordWriter(fmt, MOVE_FIELDS)
             
-            table.add_row(ftype, name, size, fid)
+            def on_chunk(chunk, error):
+                writer.write_many([{'target': target_cid, 'count': len(chunk), 'ids': chunk, 'error': error}])
         
-        console.print(table)
+        result = move_in_chunks(client, ids, target_cid, max(1, chunk_size), workers, retries, on_chunk)
+    except click.ClickException:
+        raise
     except Exception as e:
-        console.print(f"[red]获取目录失败: {e}[/red]")
+        fail(fmt, f"错误: {e}")
+        raise SystemExit(1)
+    
+    # 被移动的如果是目录，其缓存路径已失效
+    get_dircache().invalidate(cids=result['moved'])
+    get_dircache().save()
+    
+    if writer:
+        writer.close()
+    elif result['moved']:
+        console.print(f"[green]✓ 已移动 {len(result['moved'])} 个条目到目录 {target_dir}[/green]")
+    for chunk in result['failed']:
+        if fmt == 'table':
+            console.print(f"[red]移动失败 ({len(chunk['ids'])} 个): {chunk['error']}[/red]")
+    if result['failed']:
+        raise SystemExit(1)
 
 @cli.command()
-@click.argument('file_id')
-@click.argument('target_dir_id')
-def mv(file_id, target_dir_id):
-    """移动文件到指定目录"""
+@click.argument('path')
+@format_option()
+def mkdir(path, fmt):
+    """新建目录（父目录需已存在）"""
     client = get_client()
+    path = normalize_path(path)
+    if path == '/':
+        raise click.BadParameter("不能创建根目录")
+    parent, name = path.rsplit('/', 1)
     
     try:
-        result = client.fs_move([int(file_id)], int(target_dir_id))
-        if result.get('state'):
-            console.print(f"[green]✓ 文件已移动到目录 {target_dir_id}[/green]")
-        else:
-            console.print(f"[red]移动失败: {result}[/red]")
+        pid = resolve_cid(client, parent or '/')
+        result = client.fs_mkdir({'cname': name, 'pid': pid})
+        if not result.get('state'):
+            fail(fmt, f"创建失败: {result.get('error', result)}")
+            return
+        
+        cid = int(result.get('cid') or result.get('file_id'))
+        get_dircache().invalidate(paths=[path])
+        get_dircache().put(path, cid)
+        get_dircache().save()
+        if fmt != 'table':
+            write_records(fmt, [{'path': path, 'cid': cid, 'parent': pid}])
+            return
+        console.print(f"[green]✓ 已创建 {path} (cid={cid})[/green]")
+    except click.BadParameter:
+        raise
     except Exception as e:
-        console.print(f"[red]错误: {e}[/red]")
+        fail(fmt, f"错误: {e}")
 
 @cli.command()
 @click.argument('keyword')
-@click.option('--limit', '-n', default=20, help='结果数量')
-def search(keyword, limit):
-    """搜索文件"""
+@click.option('--limit', '-n', default=20, help='结果数量（0为全部）')
+@click.option('--local', '-l', is_flag=True, help='从本地索引搜索（需先 index sync）')
+@format_option()
+def search(keyword, limit, local, fmt):
+    """搜索文件（ndjson/json/tsv 格式逐页输出）"""
+    if local:
+        files = get_index().search(keyword, limit or -1)
+        if fmt != 'table':
+            write_records(fmt, map(file_record, files), FILE_FIELDS)
+            return
+        print_files(files, f"搜索结果: {keyword} (本地索引)", f"未找到 '{keyword}' 相关文件")
+        return
+    
     client = get_client()
     
     try:
-        result = client.fs_search(keyword, limit=limit)
-        files = result.get('data', [])
-        
-        if not files:
-            console.print(f"[yellow]未找到 '{keyword}' 相关文件[/yellow]")
+        pages = iter_search_pages(client, keyword, limit or None)
+        if fmt != 'table':
+            with RecordWriter(fmt, FILE_FIELDS) as writer:
+                for page in pages:
+                    writer.write_many(file_record(f) for f in page)
             return
-        
-        table = Table(title=f"搜索结果: {keyword}")
-        table.add_column("类型", style="cyan", width=4)
-        table.add_column("名称", max_width=50)
-        table.add_column("大小", style="blue", justify="right")
-        table.add_column("ID", style="dim")
-        
-        for f in files:
-            ftype = "📁" if f.get('fid') is None else "📄"
-            name = f.get('n', 'N/A')[:50]
-            size = format_size(f.get('s', 0)) if f.get('fid') else '-'
-            fid = str(f.get('cid') or f.get('fid', 'N/A'))
-            
-            table.add_row(ftype, name, size, fid)
-        
-        console.print(table)
+        files = [f for page in pages for f in page]
+        print_files(files, f"搜索结果: {keyword}", f"未找到 '{keyword}' 相关文件")
     except Exception as e:
-        console.print(f"[red]搜索失败: {e}[/red]")
+        fail(fmt, f"搜索失败: {e}")
 
 @cli.command()
 @click.argument('info_hash')
 @click.option('--wait', '-w', is_flag=True, help='等待下载完成')
 @click.option('--timeout', '-t', default=600, help='等待超时（秒）')
-def status(info_hash, wait, timeout):
+@format_option()
+def status(info_hash, wait, timeout, fmt):
     """查询云下载任务状态"""
     client = get_client()
     
-    def check_status():
-        result = client.offline_list()
-        for task in result.get('tasks', []):
-            if task.get('info_hash', '').lower() == info_hash.lower():
-                return task
-        return None
-    
-    if wait:
+    if not wait:
+        info = find_task(client, info_hash)
+    elif fmt != 'table':
+        info = wait_task(client, info_hash, timeout)
+    else:
+        from rich.progress import Progress, SpinnerColumn, TextColumn
+        
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
-            console=console
+            console=console.instance
         ) as progress:
             task = progress.add_task("等待下载完成...", total=None)
-            start = time.time()
             
-            while time.time() - start < timeout:
-                info = check_status()
-                if info is None:
-                    console.print("[yellow]任务不存在[/yellow]")
-                    return
-                
-                status_val = info.get('status', 0)
-                percent = info.get('percent_done', 0)
-                
-                progress.update(task, description=f"下载中... {percent}%")
-                
-                if status_val == 2:  # 完成
-                    console.print(f"[green]✓ 下载完成: {info.get('name')}[/green]")
-                    console.print(f"文件ID: {info.get('file_id', 'N/A')}")
-                    return info
-                elif status_val == -1:  # 失败
-                    console.print(f"[red]✗ 下载失败: {info.get('name')}[/red]")
-                    return info
-                
-                time.sleep(5)
+            def on_progress(info):
+                progress.update(task, description=f"下载中... {info.get('percent_done', 0)}%")
             
-            console.print("[yellow]等待超时[/yellow]")
+            info = wait_task(client, info_hash, timeout, on_progress=on_progress)
+    
+    if info is None:
+        fail(fmt, "任务不存在", 'yellow')
+        return
+    if fmt != 'table':
+        write_records(fmt, [task_record(info)], TASK_FIELDS)
+        return info
+    if not wait:
+        console.print(json.dumps(info, indent=2, ensure_ascii=False))
+        return info
+    
+    status_val = info.get('status', 0)
+    if status_val == 2:  # 完成
+        console.print(f"[green]✓ 下载完成: {info.get('name')}[/green]")
+        console.print(f"文件ID: {info.get('file_id', 'N/A')}")
+    elif status_val == -1:  # 失败
+        console.print(f"[red]✗ 下载失败: {info.get('name')}[/red]")
     else:
-        info = check_status()
+        console.print("[yellow]等待超时[/yellow]")
+    return info
+
+WATCH_FIELDS = ['event', 'info_hash', 'name', 'status', 'percent_done', 'file_id', 'time']
+
+@cli.command()
+@click.argument('hashes', nargs=-1)
+@click.option('--all', 'watch_all', is_flag=True, help='监视所有未完成任务')
+@click.option('--timeout', '-t', default=3600, help='等待超时（秒）')
+@click.option('--min-interval', default=3.0, help='最短轮询间隔（秒）')
+@click.option('--max-interval', default=60.0, help='最长轮询间隔（秒）')
+@click.option('--progress', '-p', is_flag=True, help='同时输出进度事件')
+@format_option(default='ndjson')
+def watch(hashes, watch_all, timeout, min_interval, max_interval, progress, fmt):
+    """
+    同时监视多个云下载任务，事件逐行输出（默认NDJSON）
+    
+    HASHES 为 - 时从标准输入读取（每行一个info_hash）
+    """
+    if hashes == ('-',):
+        hashes = tuple(line.strip() for line in click.get_text_stream('stdin') if line.strip())
+    if not hashes and not watch_all:
+        raise click.UsageError("请指定info_hash，或使用 --all 监视所有未完成任务")
+    
+    client = get_client()
+    watcher = TaskWatcher(client, None if watch_all else hashes, min_interval, max_interval)
+    writer = None if fmt == 'table' else RecordWriter(fmt, WATCH_FIELDS)
+    
+    def emit(event):
+        record = event_record(event)
+        if writer:
+            writer.write_many([record])
+            return
+        from rich.markup import escape
+        
+        percent = f"{record['percent_done'] or 0}%"
+        console.print(
+            f"[dim]{record['time']}[/dim] [cyan]{record['event']:<9}[/cyan] [green]{percent:>5}[/green]  "
+            f"{escape(record['name'] or record['info_hash'])}",
+            highlight=False
+        )
+    
+    for event in watcher.iter_events(timeout):
+        if event['event'] == 'progress' and not progress:
+            continue
+        emit(event)
+    
+    for info_hash, task in watcher.pending.items():
+        emit({'event': 'timeout', 'info_hash': info_hash, 'task': task})
+    if writer:
+        writer.close()
+
+@cli.group()
+def index():
+    """本地文件索引（SQLite镜像，用于离线搜索和查重）"""
+    pass
+
+@index.command()
+@click.argument('root', default='/')
+@click.option('--full', is_flag=True, help='忽略目录修改时间，全部重新列出')
+@click.option('--workers', '-w', default=4, help='并发请求数')
+def sync(root, full, workers):
+    """同步目录树到本地索引（默认增量）"""
+    client = get_client()
+    cid = resolve_cid(client, root)
+    
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+    
+    with Progress(
+        SpinnerColumn(),
+        TextColumn("[progress.description]{task.description}"),
+        console=console.instance,
+        transient=True
+    ) as progress:
+        task = progress.add_task("同步中...", total=None)
+        counts = {'dirs': 0, 'entries': 0}
+        
+        def on_dir(dir_cid, entries):
+            counts['dirs'] += 1
+            counts['entries'] += entries
+            progress.update(task, description=f"同步中... {counts['dirs']} 个目录, {counts['entries']} 个条目")
+        
+        start = time.time()
+        stats = get_index().sync(client, cid, full=full, workers=workers, on_dir=on_dir)
+    
+    console.print(
+        f"[green]✓ 同步完成[/green] 列出 {stats['dirs_listed']} 个目录，"
+        f"跳过未变化的 {stats['dirs_skipped']} 个，{stats['entries']} 个条目，用时 {time.time() - start:.1f}s"
+    )
+
+@index.command(name='stats')
+@format_option()
+def index_stats(fmt):
+    """索引统计"""
+    info = get_index().stats()
+    if fmt != 'table':
+        write_records(fmt, [info])
+        return
+    last = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(info['last_sync'])) if info['last_sync'] else '从未同步'
+    console.print(f"索引文件: {info['path']}")
+    console.print(f"文件: {info['files']}  目录: {info['dirs']}  总大小: {format_size(info['size'])}")
+    console.print(f"已同步目录: {info['synced_dirs']}  最近同步: {last}")
+    console.print(f"全文索引: {'FTS5 trigram' if info['fts'] else '不可用（使用LIKE）'}")
+
+@cli.group(name='daemon')
+def daemon_group():
+    """后台守护进程（保持已认证的客户端和HTTP连接，加速后续命令）"""
+    pass
+
+@daemon_group.command(name='start')
+@click.option('--foreground', is_flag=True, help='在前台运行')
+@click.option('--idle-timeout', default=0.0, help='空闲多少秒后自动退出（0为不退出）')
+def daemon_start(foreground, idle_timeout):
+    """启动守护进程"""
+    import daemon
+    
+    info = daemon.ping()
+    if info:
+        console.print(f"[yellow]守护进程已在运行 (PID {info['pid']})[/yellow]")
+        return
+    
+    if foreground:
+        console.print(f"[green]守护进程已启动[/green] {daemon.SOCKET_FILE}")
+        daemon.serve(idle_timeout)
+        return
+    
+    import subprocess
+    import sys
+    with open(daemon.LOG_FILE, 'ab') as log:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), 'daemon', 'start', '--foreground',
+             '--idle-timeout', str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True
+        )
+    
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        info = daemon.ping()
         if info:
-            console.print(json.dumps(info, indent=2, ensure_ascii=False))
-        else:
-            console.print("[yellow]任务不存在[/yellow]")
+            console.print(f"[green]✓ 守护进程已启动[/green] (PID {info['pid']})")
+            return
+        time.sleep(0.1)
+    console.print(f"[red]守护进程启动失败，请查看 {daemon.LOG_FILE}[/red]")
+    raise SystemExit(1)
+
+@daemon_group.command(name='stop')
+def daemon_stop():
+    """停止守护进程"""
+    import daemon
+    
+    if daemon.ping() is None:
+        console.print("[yellow]守护进程未运行[/yellow]")
+        return
+    daemon.call('daemon', 'shutdown')
+    console.print("[green]✓ 守护进程已停止[/green]")
+
+@daemon_group.command(name='status')
+@format_option()
+def daemon_status(fmt):
+    """查看守护进程状态"""
+    import daemon
+    
+    info = daemon.ping()
+    if fmt != 'table':
+        write_records(fmt, [{
+            'running': info is not None, 'pid': (info or {}).get('pid'), 'uptime': (info or {}).get('uptime'),
+            'requests': (info or {}).get('requests'), 'socket': str(daemon.SOCKET_FILE),
+        }])
+        return
+    if info is None:
+        console.print("[yellow]守护进程未运行[/yellow]（命令将在本进程内执行）")
+        return
+    console.print(f"[green]运行中[/green] PID {info['pid']}")
+    console.print(f"已运行: {info['uptime'] / 60:.1f} 分钟  已处理请求: {info['requests']}")
+    console.print(f"套接字: {daemon.SOCKET_FILE}")
+
+@cli.group(name='ratelimit')
+def ratelimit_group():
+    """请求限速与熔断（javdb / 115，所有进程共享）"""
+    pass
+
+@ratelimit_group.command(name='status')
+@click.option('--json-output', '-j', is_flag=True, help='同 --format json')
+@format_option()
+def ratelimit_status(json_output, fmt):
+    """查看限速器状态"""
+    report = ratelimit.status()
+    if json_output:
+        fmt = 'json'
+    if fmt != 'table':
+        write_records(fmt, [dict(name=name, **info) for name, info in report.items()])
+        return
+    
+    from rich.table import Table
+    
+    circuit_style = {'closed': '[green]正常[/green]', 'open': '[red]熔断[/red]', 'half-open': '[yellow]试探[/yellow]'}
+    table = Table(title="请求限速")
+    table.add_column("名称", style="cyan")
+    table.add_column("速率/秒", justify="right")
+    table.add_column("突发", justify="right")
+    table.add_column("可用令牌", justify="right")
+    table.add_column("熔断器")
+    table.add_column("连续失败", justify="right")
+    table.add_column("请求数", justify="right")
+    table.add_column("累计等待", justify="right")
+    for name, info in report.items():
+        circuit = circuit_style[info['circuit']]
+        if info['circuit'] == 'open':
+            circuit += f" ({info['retry_in']:.0f}s)"
+        table.add_row(
+            name, f"{info['rate']:g}", str(info['burst']), f"{info['tokens']:.1f}", circuit,
+            str(info['failures']), str(info['requests']), f"{info['waited']:.1f}s"
+        )
+    console.print(table)
+
+@ratelimit_group.command(name='set')
+@click.argument('name', type=click.Choice(list(ratelimit.DEFAULT_LIMITS)))
+@click.option('--rate', '-r', type=click.FloatRange(min=0.01), help='每秒请求数')
+@click.option('--burst', '-b', type=click.IntRange(min=1), help='突发容量')
+def ratelimit_set(name, rate, burst):
+    """修改限速参数"""
+    ratelimit.configure(name, rate, burst)
+    info = ratelimit.status()[name]
+    console.print(f"[green]✓ {name}: {info['rate']:g} 次/秒，突发 {info['burst']}[/green]")
+
+@ratelimit_group.command(name='reset')
+@click.argument('name', required=False, type=click.Choice(list(ratelimit.DEFAULT_LIMITS)))
+def ratelimit_reset(name):
+    """关闭熔断并清空统计"""
+    ratelimit.reset(name)
+    console.print("[green]✓ 已重置[/green]")
+
+def print_files(files: list, title: str, empty_message: str):
+    """以表格显示 fs_files 格式的条目"""
+    if not files:
+        console.print(f"[yellow]{empty_message}[/yellow]")
+        return
+    
+    from rich.table import Table
+    
+    table = Table(title=title)
+    table.add_column("类型", style="cyan", width=4)
+    table.add_column("名称", max_width=50)
+    table.add_column("大小", style="blue", justify="right")
+    table.add_column("ID", style="dim")
+    
+    for f in files:
+        ftype = "📁" if f.get('fid') is None else "📄"
+        name = f.get('n', 'N/A')[:50]
+        size = format_size(f.get('s', 0)) if f.get('fid') else '-'
+        fid = str(f.get('fid') or f.get('cid', 'N/A'))
+        
+        table.add_row(ftype, name, size, fid)
+    
+    console.print(table)
 
 def format_size(size_bytes):
     """格式化文件大小"""
@@ -0,0 +1,212 @@
+"""
+daemon - 常驻后台进程，保持已认证的115客户端和javdb HTTP会话
+通过 ~/.115cli/daemon.sock 接收按行分隔的JSON请求；
+115cli / javdb / jav115 检测到守护进程在运行时把网络调用转发给它，否则在本进程内执行
+"""
+
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from pathlib import Path
+
+import click
+
+import ratelimit
+import tracing
+
+SOCKET_FILE = Path.home() / ".115cli" / "daemon.sock"
+LOG_FILE = Path.home() / ".115cli" / "daemon.log"
+
+# 允许远程调用的115客户端方法和javdb函数
+CLIENT_METHODS = {
+    'user_info', 'offline_list', 'offline_add_url', 'offline_add_urls', 'offline_remove',
+    'fs_files', 'fs_search', 'fs_move', 'fs_mkdir', 'fs_delete', 'fs_rename',
+}
+JAVDB_FUNCTIONS = {'search_javdb', 'get_magnets'}
+
+class DaemonError(Exception):
+    """守护进程返回的错误；remote_type 为守护进程中原异常的类名，status_code 为其HTTP状态码"""
+
+    def __init__(self, message: str, remote_type: str | None = None, status_code: int | None = None):
+        super().__init__(message)
+        self.remote_type = remote_type
+        self.status_code = status_code
+
+class RemoteTimeout(DaemonError, TimeoutError):
+    """守护进程中的请求超时"""
+
+class RemoteConnectionError(DaemonError, ConnectionError):
+    """守护进程中的连接/传输错误"""
+
+class RemoteUnsent(DaemonError, ConnectionRefusedError):
+    """守护进程中的请求还没有发出就失败了（连接不上、连接池等待超时）"""
+
+class LoginRequired(DaemonError, click.ClickException):
+    """守护进程中没有可用的115登录（cookie 缺失）；命令行中显示错误并以状态码1退出"""
+
+def error_kind(exc: Exception) -> str | None:
+    """错误类别，客户端据此重建可被 ratelimit 识别的异常"""
+    if isinstance(exc, LoginRequired):
+        return 'login'
+    if ratelimit.is_unsent(exc):
+        return 'unsent'
+    if isinstance(exc, TimeoutError) or any(cls.__name__ == 'TimeoutException' for cls in type(exc).__mro__):
+        return 'timeout'
+    if ratelimit.error_status(exc) is None and ratelimit.is_transient(exc):
+        return 'transport'
+    return None
+
+def remote_error(response: dict) -> DaemonError:
+    """按守护进程返回的错误类别和状态码重建异常"""
+    kind = response.get('kind')
+    cls = {'unsent': RemoteUnsent, 'timeout': RemoteTimeout, 'transport': RemoteConnectionError,
+           'login': LoginRequired}.get(kind, DaemonError)
+    remote_type = response.get('type')
+    message = f"{remote_type}: {response['error']}" if remote_type and kind != 'login' else response['error']
+    return cls(message, remote_type, response.get('status'))
+
+_in_daemon = False
+_available = None
+
+def available() -> bool:
+    """守护进程是否可用（每个进程只检测一次）；设置 CLI115_NO_DAEMON=1 可强制本地执行"""
+    global _available
+    if _in_daemon or os.environ.get('CLI115_NO_DAEMON'):
+        return False
+    if _available is None:
+        _available = ping() is not None
+    return _available
+
+def call(target: str, method: str, *args, **kwargs):
+    """发送一次请求并返回结果"""
+    request = {'target': target, 'method': method, 'args': args, 'kwargs': kwargs}
+    with tracing.span(f'daemon.{target}.{method}'), socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(SOCKET_FILE))
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode() + b'\n')
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise DaemonError("守护进程未返回结果")
+    response = json.loads(line)
+    if not response['ok']:
+        raise remote_error(response)
+    return response['result']
+
+def ping() -> dict | None:
+    """守护进程状态，不在运行时返回None"""
+    if not SOCKET_FILE.exists():
+        return None
+    try:
+        return call('daemon', 'ping')
+    except (OSError, ValueError, DaemonError):
+        return None
+
+class RemoteClient:
+    """转发到守护进程的115客户端代理，接口与 P115Client 的常用方法一致"""
+
+    def __getattr__(self, name):
+        if name not in CLIENT_METHODS:
+            raise AttributeError(name)
+        return lambda *args, **kwargs: call('115', name, *args, **kwargs)
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: Path, idle_timeout: float = 0):
+        self.started = time.time()
+        self.last_request = time.time()
+        self.requests = 0
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        super().__init__(str(path), RequestHandler)
+
+    def dispatch(self, request: dict):
+        import cli
+        import javdb
+
+        target, method = request['target'], request['method']
+        args, kwargs = request.get('args') or [], request.get('kwargs') or {}
+        with self._lock:
+            self.requests += 1
+            self.last_request = time.time()
+
+        if target == '115' and method in CLIENT_METHODS:
+            try:
+                client = cli.get_client()
+            except SystemExit:
+                # 本地执行时 get_client 打印提示后退出；守护进程中把提示原样传回调用方
+                raise LoginRequired(cli.NOT_LOGGED_IN)
+            return getattr(client, method)(*args, **kwargs)
+        if target == 'javdb' and method in JAVDB_FUNCTIONS:
+            return getattr(javdb, method)(*args, **kwargs)
+        if target == 'daemon':
+            if method == 'ping':
+                return {
+                    'pid': os.getpid(),
+                    'uptime': time.time() - self.started,
+                    'requests': self.requests,
+                }
+            if method == 'reload':
+                # cookie更新后重新创建客户端
+                cli._client = None
+                return True
+            if method == 'shutdown':
+                threading.Thread(target=self.shutdown).start()
+                return True
+        raise DaemonError(f"不支持的调用: {target}.{method}")
+
+    def service_actions(self):
+        if self.idle_timeout and time.time() - self.last_request > self.idle_timeout:
+            threading.Thread(target=self.shutdown).start()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                result = self.server.dispatch(json.loads(line))
+                response = {'ok': True, 'result': result}
+            except SystemExit as e:
+                # 不能让请求线程静默退出，调用方会只看到“守护进程未返回结果”
+                response = {'ok': False, 'error': f'守护进程中的调用退出（状态码 {e.code}）', 'type': 'SystemExit',
+                            'status': None, 'kind': None}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e), 'type': type(e).__name__,
+                            'status': ratelimit.error_status(e), 'kind': error_kind(e)}
+            self.wfile.write(json.dumps(response, ensure_ascii=False, default=str).encode() + b'\n')
+            self.wfile.flush()
+
+def serve(idle_timeout: float = 0):
+    """在前台运行守护进程，直到收到 shutdown 或空闲超时"""
+    global _in_daemon
+    _in_daemon = True
+
+    if SOCKET_FILE.exists():
+        if ping() is not None:
+            raise DaemonError("守护进程已在运行")
+        SOCKET_FILE.unlink()
+
+    SOCKET_FILE.parent.mkdir(exist_ok=True)
+    # 套接字创建时就只有本用户可访问，避免 bind 与 chmod 之间被其他用户连上
+    umask = os.umask(0o077)
+    try:
+        server = DaemonServer(SOCKET_FILE, idle_timeout)
+    finally:
+        os.umask(umask)
+    try:
+        # 预热：构建客户端和HTTP会话
+        import cli
+        import javdb
+        if cli.COOKIE_FILE.exists():
+            cli.get_client()
+        javdb.get_session()
+        server.serve_forever(poll_interval=1)
+    finally:
+        server.server_close()
+        try:
+            SOCKET_FILE.unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,112 @@
+"""
+dedupe - 提交云下载前的查重
+已知任务的 info_hash 保存在 ~/.115cli/known_tasks.json，超过 REFRESH_AFTER 后从 offline_list 整体刷新；
+文件查重按名称(+大小)进行，优先使用本地索引（index sync），没有索引时调用网盘搜索
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+KNOWN_TASKS_FILE = Path.home() / ".115cli" / "known_tasks.json"
+REFRESH_AFTER = 600
+# javdb 显示的大小是四舍五入后的值（如 4.51GB），按比例容差比较
+SIZE_TOLERANCE = 0.02
+
+SIZE_PATTERN = re.compile(r'([\d.]+)\s*([KMGTP]?)i?B', re.IGNORECASE)
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+
+def parse_size(text) -> int | None:
+    """'4.51GB' / '700 MB, 2個文件' → 字节数，无法解析时返回None"""
+    if isinstance(text, (int, float)):
+        return int(text)
+    match = SIZE_PATTERN.search(text or '')
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+    except ValueError:
+        return None
+
+def magnet_info_hash(magnet: str) -> str | None:
+    """从磁力链接中提取info_hash（小写）"""
+    match = re.search(r'btih:([a-zA-Z0-9]+)', magnet)
+    return match.group(1).lower() if match else None
+
+def magnet_name(magnet: str) -> str | None:
+    """磁力链接的 dn 参数（显示名称）"""
+    values = parse_qs(urlparse(magnet).query).get('dn')
+    return values[0].strip() if values and values[0].strip() else None
+
+class KnownTasks:
+    """已提交过的云下载任务: {info_hash: {'name': ..., 'status': ...}}"""
+
+    def __init__(self, path: Path = KNOWN_TASKS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            data = json.loads(path.read_text())
+            self.tasks = data['tasks']
+            self.refreshed = data['refreshed']
+        except (OSError, ValueError, KeyError, TypeError):
+            self.tasks = {}
+            self.refreshed = 0
+
+    def is_stale(self) -> bool:
+        return time.time() - self.refreshed > REFRESH_AFTER
+
+    def refresh(self, tasks):
+        """用完整的任务列表替换已知集合"""
+        fresh = {}
+        for task in tasks:
+            info_hash = (task.get('info_hash') or '').lower()
+            if info_hash:
+                fresh[info_hash] = {'name': task.get('name', ''), 'status': task.get('status')}
+        with self._lock:
+            self.tasks = fresh
+            self.refreshed = time.time()
+            self._dirty = True
+
+    def add(self, info_hash: str, name: str = '', status: int = 0):
+        """记录刚提交成功的任务，避免在下次刷新前重复提交"""
+        with self._lock:
+            self.tasks[info_hash.lower()] = {'name': name, 'status': status}
+            self._dirty = True
+
+    def get(self, info_hash: str) -> dict | None:
+        with self._lock:
+            return self.tasks.get(info_hash.lower())
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(exist_ok=True)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps({'refreshed': self.refreshed, 'tasks': self.tasks}, ensure_ascii=False))
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+def find_task_duplicate(known: KnownTasks, magnet: str) -> dict | None:
+    """同一 info_hash 的任务已存在（失败的任务不算，可以重新提交）"""
+    info_hash = magnet_info_hash(magnet)
+    task = known.get(info_hash) if info_hash else None
+    if task is None or task.get('status') == -1:
+        return None
+    return {'reason': 'task', 'info_hash': info_hash, 'name': task.get('name', ''), 'status': task.get('status')}
+
+def find_file_duplicates(entries: list, title: str, size: int | None = None) -> list:
+    """
+    从按名称搜索到的条目中筛出名称包含 title 的文件（ABC-12 不匹配 ABC-123），
+    给定大小时只保留大小相近的
+    """
+    pattern = re.compile(r'(?<![A-Za-z0-9])' + re.escape(title) + r'(?![0-9])', re.IGNORECASE)
+    files = [e for e in entries if e.get('fid') is not None and pattern.search(e.get('n', ''))]
+    if size:
+        files = [f for f in files if abs(int(f.get('s') or 0) - size) <= size * SIZE_TOLERANCE]
+    return files
@@ -0,0 +1,152 @@
+"""
+dircache - 115网盘 路径 → 目录ID 缓存
+持久化在 ~/.115cli/dircache.json，按需逐级填充；命中后不再请求 fs_files，
+超过 REVALIDATE_AFTER 的条目先返回缓存结果，再在后台线程中校验
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DIRCACHE_FILE = Path.home() / ".115cli" / "dircache.json"
+REVALIDATE_AFTER = 3600
+PAGE_SIZE = 1150
+
+def normalize_path(path: str) -> str:
+    """统一为 /a/b 形式，根目录为 /"""
+    parts = [p for p in str(path).strip().split('/') if p]
+    return '/' + '/'.join(parts)
+
+def list_child_dirs(client, cid: int) -> dict:
+    """列出目录下的所有子目录（自动翻页）: {名称: cid}"""
+    children = {}
+    offset = 0
+    while True:
+        result = client.fs_files({'cid': cid, 'show_dir': 1, 'nf': 1, 'limit': PAGE_SIZE, 'offset': offset})
+        data = result.get('data') or []
+        for item in data:
+            if item.get('fid') is None and item.get('cid') is not None:
+                children.setdefault(item.get('n', ''), int(item['cid']))
+        offset += len(data)
+        if not data or offset >= int(result.get('count') or 0):
+            return children
+
+class DirCache:
+    """线程安全的路径缓存，修改后原子写回磁盘"""
+
+    def __init__(self, path: Path = DIRCACHE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        try:
+            self.entries = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, path: str) -> dict | None:
+        with self._lock:
+            return self.entries.get(path)
+
+    def put(self, path: str, cid: int):
+        with self._lock:
+            entry = self.entries.get(path)
+            if entry is None or entry['cid'] != cid:
+                self.entries[path] = {'cid': cid, 'checked': time.time()}
+                self._dirty = True
+
+    def touch(self, path: str):
+        with self._lock:
+            if path in self.entries:
+                self.entries[path]['checked'] = time.time()
+                self._dirty = True
+
+    def invalidate(self, paths=(), cids=()) -> int:
+        """删除指定路径/目录ID的条目及其所有子路径，返回删除条数"""
+        cids = {int(c) for c in cids}
+        with self._lock:
+            roots = {normalize_path(p) for p in paths}
+            roots.update(p for p, e in self.entries.items() if e['cid'] in cids)
+            doomed = [
+                p for p in self.entries
+                if any(p == root or p.startswith(root + '/') for root in roots)
+            ]
+            for p in doomed:
+                del self.entries[p]
+            if doomed:
+                self._dirty = True
+            return len(doomed)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            self.path.parent.mkdir(exist_ok=True)
+            tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps(self.entries, ensure_ascii=False))
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+    def remember_children(self, parent: str, children: dict):
+        """记录某目录下的子目录（列目录时顺便填充缓存）"""
+        prefix = '' if parent == '/' else parent
+        for name, cid in children.items():
+            self.put(f"{prefix}/{name}", cid)
+
+    def resolve(self, client, path: str) -> int:
+        """
+        路径 → 目录ID
+        从最深的已缓存祖先开始，逐级列出子目录；目录不存在时抛出 FileNotFoundError
+        """
+        path = normalize_path(path)
+        if path == '/':
+            return 0
+
+        entry = self.get(path)
+        if entry:
+            if time.time() - entry['checked'] > REVALIDATE_AFTER:
+                self.revalidate_async(client, path, entry['cid'])
+            return entry['cid']
+
+        parts = path[1:].split('/')
+        cid, depth = 0, 0
+        for i in range(len(parts) - 1, 0, -1):
+            ancestor = self.get('/' + '/'.join(parts[:i]))
+            if ancestor:
+                cid, depth = ancestor['cid'], i
+                break
+
+        for i in range(depth, len(parts)):
+            children = list_child_dirs(client, cid)
+            self.remember_children('/' + '/'.join(parts[:i]), children)
+            if parts[i] not in children:
+                self.save()
+                raise FileNotFoundError('/' + '/'.join(parts[:i + 1]))
+            cid = children[parts[i]]
+
+        self.save()
+        return cid
+
+    def revalidate_async(self, client, path: str, cid: int) -> threading.Thread:
+        """
+        后台校验缓存条目：目录ID对应的实际路径不一致时删除该条目及子路径
+        校验线程是守护线程，命令结束时不等待它（没做完的校验下次解析路径时再做）
+        """
+        thread = threading.Thread(target=self._revalidate, args=(client, path, cid),
+                                  name='dircache-revalidate', daemon=True)
+        thread.start()
+        return thread
+
+    def _revalidate(self, client, path: str, cid: int):
+        try:
+            result = client.fs_files({'cid': cid, 'limit': 1})
+        except Exception:
+            return
+        # 不存在的cid会被当作根目录返回
+        names = [p.get('name', '') for p in (result.get('path') or [])[1:]]
+        if int(result.get('cid', cid)) == cid and '/' + '/'.join(names) == path:
+            self.touch(path)
+        else:
+            self.invalidate(paths=[path])
+        self.save()
@@ -0,0 +1,94 @@
+"""
+failover - 云下载失败或停滞时换用备选磁链
+解析番号时按 javdb.rank_magnets 排序，保留前 MAX_CANDIDATES 个磁链随任务保存；
+任务失败（status -1）或进度超过 STALL_AFTER 秒没有变化时，删除该任务并提交下一个备选，不必等人发现后重来
+"""
+
+import tracing
+
+MAX_CANDIDATES = 5
+STALL_AFTER = 600
+
+def candidates(magnets: list, chosen: int = 0) -> list:
+    """下载候选（第一个为首选）"""
+    import javdb
+
+    return javdb.rank_magnets(magnets, chosen)[:MAX_CANDIDATES]
+
+def describe(event: str) -> str:
+    return '下载失败' if event == 'failed' else '下载停滞'
+
+def drop_task(client, info_hash: str, name: str = ''):
+    """删除失败/停滞的任务，并在已知任务中标记为失败（查重时不再拦住同一磁链）"""
+    from cli import get_known_tasks, offline_remove_task
+
+    with tracing.span('failover.remove', info_hash=info_hash):
+        if not offline_remove_task(client, info_hash):
+            raise RuntimeError(f"删除任务失败: {info_hash}")
+    known = get_known_tasks(client)
+    known.add(info_hash, name, -1)
+    known.save()
+
+def submit_alternate(client, alternates: list, save_cid: int, code: str, reason: str) -> tuple:
+    """
+    依次提交 alternates 中的备选磁链（提交过的从列表中移除），直到有一个成功
+    返回 (新的 info_hash, 提交成功的备选, 说明)；全部失败时返回 (None, None, 说明)
+    """
+    from cli import offline_add_magnet, remember_submitted
+    from dedupe import magnet_info_hash
+
+    while alternates:
+        candidate = alternates.pop(0)
+        try:
+            with tracing.span('failover.submit', reason=reason):
+                result = offline_add_magnet(client, candidate['magnet'], save_cid)
+        except Exception as e:
+            result = {'state': False, 'error': str(e)}
+        if result['state']:
+            new_hash = result['info_hash'] or magnet_info_hash(candidate['magnet'])
+            remember_submitted(client, {new_hash: code})
+            return new_hash, candidate, reason
+        reason = f"{reason}，备选磁链提交失败: {result['error']}"
+    return None, None, reason
+
+def wait_download(client, info_hash: str, alternates: list, save_cid: int = 0, code: str = '',
+                  timeout: float = 600, stall_after: float | None = STALL_AFTER, interval: float = 5,
+                  on_progress=None, on_switch=None) -> tuple:
+    """
+    等待下载完成；失败或停滞时删除任务，依次提交 alternates 中的备选磁链（每个磁链单独计 timeout）
+    返回 (最后一次查询到的任务信息, 最终的 info_hash)，任务信息的含义同 wait_task；
+    所有备选都用完时返回最后一个任务的信息，停滞的任务已被删除，其 status 记为 -1；
+    删除失败/停滞的任务出错时不再换用备选，返回的任务信息带有 error 说明
+    on_switch(old_hash, new_hash, candidate, reason) 在换用备选后调用
+    """
+    from cli import TaskWatcher
+
+    alternates = list(alternates)
+    while True:
+        watcher = TaskWatcher(client, [info_hash], min_interval=interval, max_interval=max(interval, 30),
+                              stall_after=stall_after if alternates else None)
+        outcome = None
+        with tracing.span('failover.wait', info_hash=info_hash, alternates=len(alternates)):
+            for event in watcher.iter_events(timeout):
+                if event['event'] == 'progress':
+                    if on_progress:
+                        on_progress(event['task'])
+                    continue
+                outcome = event
+                break
+        if outcome is None:
+            return watcher.pending.get(info_hash.lower()), info_hash
+        if outcome['event'] in ('completed', 'missing') or not alternates:
+            return outcome['task'], info_hash
+
+        reason = describe(outcome['event'])
+        try:
+            drop_task(client, info_hash, code)
+        except Exception as e:
+            return dict(outcome['task'], error=f'{reason}，{e}'), info_hash
+        new_hash, candidate, reason = submit_alternate(client, alternates, save_cid, code, reason)
+        if new_hash is None:
+            return dict(outcome['task'], status=-1), info_hash
+        if on_switch:
+            on_switch(info_hash, new_hash, candidate, reason)
+        info_hash = new_hash
@@ -0,0 +1,307 @@
+"""
+fileindex - 115网盘文件树的本地SQLite镜像
+~/.115cli/index.db 保存 名称/大小/sha1/父目录/修改时间，名称带FTS全文索引（trigram，支持中文和番号片段）
+增量同步时只重新列出修改时间变化了的目录；目录的修改时间在整棵子树同步完之后才记下，
+中断（Ctrl-C、请求出错）后下次同步会重新进入没有完成的子树
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+INDEX_FILE = Path.home() / ".115cli" / "index.db"
+PAGE_SIZE = 1150
+# 已列出、子树尚未同步完的目录在 synced_dirs 中的修改时间，与任何真实修改时间都不相等
+PENDING_MTIME = -1
+
+def _timestamp(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+def entry_row(item: dict, parent: int) -> tuple:
+    """fs_files 返回的条目 → files 表的一行"""
+    is_dir = item.get('fid') is None
+    return (
+        int(item['cid'] if is_dir else item['fid']),
+        parent,
+        item.get('n', ''),
+        int(is_dir),
+        0 if is_dir else int(item.get('s') or 0),
+        None if is_dir else (item.get('sha') or None),
+        _timestamp(item.get('te') or item.get('t')),
+        item.get('pc'),
+    )
+
+def row_entry(row) -> dict:
+    """files 表的一行 → 与 fs_files 相同格式的条目，便于复用显示代码"""
+    id_, parent, name, is_dir, size, sha1, mtime, pick_code = row
+    if is_dir:
+        return {'cid': id_, 'pid': parent, 'n': name, 'te': mtime}
+    return {'fid': id_, 'cid': parent, 'n': name, 's': size, 'sha': sha1, 'te': mtime, 'pc': pick_code}
+
+def list_dir_entries(client, cid: int) -> list:
+    """完整列出一个目录（自动翻页）"""
+    entries = []
+    while True:
+        result = client.fs_files({'cid': cid, 'show_dir': 1, 'limit': PAGE_SIZE, 'offset': len(entries)})
+        data = result.get('data') or []
+        entries.extend(data)
+        if not data or len(entries) >= int(result.get('count') or 0):
+            return entries
+
+class FileIndex:
+    """线程安全的本地文件索引"""
+
+    COLUMNS = 'id, parent, name, is_dir, size, sha1, mtime, pick_code'
+
+    def __init__(self, path: Path = INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS files (
+                id INTEGER PRIMARY KEY,
+                parent INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                is_dir INTEGER NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                sha1 TEXT,
+                mtime INTEGER NOT NULL DEFAULT 0,
+                pick_code TEXT
+            );
+            CREATE INDEX IF NOT EXISTS files_parent ON files(parent);
+            CREATE INDEX IF NOT EXISTS files_sha1 ON files(sha1);
+            CREATE INDEX IF NOT EXISTS files_name_size ON files(name, size);
+            CREATE TABLE IF NOT EXISTS synced_dirs (
+                id INTEGER PRIMARY KEY,
+                mtime INTEGER NOT NULL,
+                synced REAL NOT NULL
+            );
+        ''')
+        self.fts = self._init_fts()
+        self.db.commit()
+
+    def _init_fts(self) -> bool:
+        """FTS5 trigram 需要 SQLite 3.34+，不支持时退回 LIKE 查询"""
+        try:
+            self.db.executescript('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                    name, content='files', content_rowid='id', tokenize='trigram'
+                );
+                CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+                    INSERT INTO files_fts(rowid, name) VALUES (new.id, new.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+                    INSERT INTO files_fts(files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                END;
+                CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE OF name ON files BEGIN
+                    INSERT INTO files_fts(files_fts, rowid, name) VALUES ('delete', old.id, old.name);
+                    INSERT INTO files_fts(rowid, name) VALUES (new.id, new.name);
+                END;
+            ''')
+            return True
+        except sqlite3.OperationalError:
+            return False
+
+    # ---- 同步 ----
+
+    def replace_children(self, cid: int, entries: list) -> list:
+        """
+        用一次完整列表替换某目录的直接子项，删除已不存在的条目（含子树）
+        该目录标记为已列出但未完成（PENDING_MTIME），子树全部同步后由 mark_synced 记下修改时间
+        返回修改时间与上次同步不一致（或从未同步完）的子目录: [(cid, mtime), ...]
+        """
+        rows = [entry_row(item, cid) for item in entries]
+        ids = {row[0] for row in rows}
+        with self._lock, self.db:
+            current = {
+                row[0]: row for row in
+                self.db.execute(f'SELECT {self.COLUMNS} FROM files WHERE parent = ?', (cid,))
+            }
+            synced = dict(self.db.execute(
+                'SELECT s.id, s.mtime FROM synced_dirs s JOIN files f ON f.id = s.id WHERE f.parent = ?',
+                (cid,)
+            ))
+            gone = [i for i in current if i not in ids]
+            if gone:
+                self._delete_subtrees(gone)
+
+            # UPSERT 而不是 REPLACE，保证FTS触发器同步更新
+            self.db.executemany(f'''
+                INSERT INTO files ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    parent = excluded.parent, name = excluded.name, is_dir = excluded.is_dir,
+                    size = excluded.size, sha1 = excluded.sha1, mtime = excluded.mtime,
+                    pick_code = excluded.pick_code
+            ''', [row for row in rows if current.get(row[0]) != row])
+            self.db.execute(
+                'INSERT OR REPLACE INTO synced_dirs (id, mtime, synced) VALUES (?, ?, ?)',
+                (cid, PENDING_MTIME, time.time())
+            )
+        return [
+            (row[0], row[6]) for row in rows
+            if row[3] and synced.get(row[0]) != row[6]
+        ]
+
+    def mark_synced(self, cid: int, mtime: int):
+        """目录及其整棵子树已同步：记下修改时间，之后的增量同步可以跳过它"""
+        with self._lock, self.db:
+            self.db.execute('UPDATE synced_dirs SET mtime = ?, synced = ? WHERE id = ?', (mtime, time.time(), cid))
+
+    def _delete_subtrees(self, ids: list):
+        placeholders = ','.join('?' * len(ids))
+        doomed = [r[0] for r in self.db.execute(f'''
+            WITH RECURSIVE subtree(id) AS (
+                SELECT id FROM files WHERE id IN ({placeholders})
+                UNION SELECT f.id FROM files f JOIN subtree s ON f.parent = s.id
+            ) SELECT id FROM subtree
+        ''', ids)]
+        for start in range(0, len(doomed), 500):
+            chunk = doomed[start:start + 500]
+            marks = ','.join('?' * len(chunk))
+            self.db.execute(f'DELETE FROM files WHERE id IN ({marks})', chunk)
+            self.db.execute(f'DELETE FROM synced_dirs WHERE id IN ({marks})', chunk)
+
+    def sync(self, client, root: int = 0, full: bool = False, workers: int = 4, on_dir=None) -> dict:
+        """
+        从 root 开始并发同步目录树
+        增量模式下，修改时间与上次同步一致的子目录整棵跳过；full=True 时全部重新列出
+        目录的所有子目录都完成后才标记该目录完成（向上逐级汇总）
+        """
+        stats = {'dirs_listed': 0, 'dirs_skipped': 0, 'entries': 0}
+        queue = deque([(root, 0)])
+        running = {}
+        # 已列出、子树未完成的目录: cid → [修改时间, 未完成的子目录数]
+        pending = {}
+        parents = {root: None}
+
+        def finish(cid):
+            while cid is not None:
+                mtime, left = pending[cid]
+                if left:
+                    return
+                del pending[cid]
+                self.mark_synced(cid, mtime)
+                cid = parents.pop(cid)
+                if cid is not None:
+                    pending[cid][1] -= 1
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while queue or running:
+                while queue and len(running) < workers:
+                    cid, mtime = queue.popleft()
+                    running[pool.submit(list_dir_entries, client, cid)] = (cid, mtime)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cid, mtime = running.pop(future)
+                    entries = future.result()
+                    changed = self.replace_children(cid, entries)
+                    stats['dirs_listed'] += 1
+                    stats['entries'] += len(entries)
+                    if on_dir:
+                        on_dir(cid, len(entries))
+
+                    if full:
+                        changed = [
+                            (int(item['cid']), _timestamp(item.get('te') or item.get('t')))
+                            for item in entries if item.get('fid') is None
+                        ]
+                    subdirs = sum(1 for item in entries if item.get('fid') is None)
+                    stats['dirs_skipped'] += subdirs - len(changed)
+                    queue.extend(changed)
+                    pending[cid] = [mtime, len(changed)]
+                    parents.update((child, cid) for child, _ in changed)
+                    finish(cid)
+        return stats
+
+    # ---- 查询 ----
+
+    def search(self, keyword: str, limit: int = 20) -> list:
+        """按名称搜索，返回 fs_files 格式的条目"""
+        with self._lock:
+            if self.fts and len(keyword) >= 3:
+                rows = self.db.execute(f'''
+                    SELECT {', '.join('f.' + c.strip() for c in self.COLUMNS.split(','))}
+                    FROM files_fts JOIN files f ON f.id = files_fts.rowid
+                    WHERE files_fts MATCH ? ORDER BY f.mtime DESC LIMIT ?
+                ''', ('"' + keyword.replace('"', '""') + '"', limit)).fetchall()
+            else:
+                pattern = '%' + keyword.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                rows = self.db.execute(
+                    f"SELECT {self.COLUMNS} FROM files WHERE name LIKE ? ESCAPE '\\' ORDER BY mtime DESC LIMIT ?",
+                    (pattern, limit)
+                ).fetchall()
+        return [row_entry(r) for r in rows]
+
+    def list_dir(self, cid: int, limit: int | None = None) -> list | None:
+        """目录内容（目录在前）；该目录从未同步过时返回None"""
+        with self._lock:
+            if self.db.execute('SELECT 1 FROM synced_dirs WHERE id = ?', (cid,)).fetchone() is None:
+                return None
+            rows = self.db.execute(
+                f'SELECT {self.COLUMNS} FROM files WHERE parent = ? ORDER BY is_dir DESC, name LIMIT ?',
+                (cid, -1 if limit is None else limit)
+            ).fetchall()
+        return [row_entry(r) for r in rows]
+
+    def resolve_path(self, path: str) -> int | None:
+        """按名称逐级在索引中查找目录，找不到返回None"""
+        cid = 0
+        with self._lock:
+            for name in [p for p in path.split('/') if p]:
+                row = self.db.execute(
+                    'SELECT id FROM files WHERE parent = ? AND name = ? AND is_dir = 1', (cid, name)
+                ).fetchone()
+                if row is None:
+                    return None
+                cid = row[0]
+        return cid
+
+    def find_duplicates(self, name: str | None = None, size: int | None = None, sha1: str | None = None) -> list:
+        """按 sha1，或 名称(+大小) 查找已有文件"""
+        with self._lock:
+            if sha1:
+                rows = self.db.execute(
+                    f'SELECT {self.COLUMNS} FROM files WHERE sha1 = ? AND is_dir = 0', (sha1.upper(),)
+                ).fetchall()
+            elif size is not None:
+                rows = self.db.execute(
+                    f'SELECT {self.COLUMNS} FROM files WHERE name = ? AND size = ? AND is_dir = 0', (name, size)
+                ).fetchall()
+            else:
+                rows = self.db.execute(
+                    f'SELECT {self.COLUMNS} FROM files WHERE name = ?', (name,)
+                ).fetchall()
+        return [row_entry(r) for r in rows]
+
+    def has_synced(self) -> bool:
+        """是否同步过任何目录（查重据此决定用本地索引还是请求网盘）"""
+        with self._lock:
+            return bool(self.db.execute('SELECT EXISTS (SELECT 1 FROM synced_dirs)').fetchone()[0])
+
+    def stats(self) -> dict:
+        with self._lock:
+            files, dirs, size = self.db.execute(
+                'SELECT COALESCE(SUM(1 - is_dir), 0), COALESCE(SUM(is_dir), 0), COALESCE(SUM(size), 0) FROM files'
+            ).fetchone()
+            synced, last = self.db.execute('SELECT COUNT(*), MAX(synced) FROM synced_dirs').fetchone()
+        return {
+            'path': str(self.path),
+            'files': files,
+            'dirs': dirs,
+            'size': size,
+            'synced_dirs': synced,
+            'last_sync': last,
+            'fts': self.fts,
+        }
+
+    def close(self):
+        with self._lock:
+            self.db.close()
@@ -0,0 +1,167 @@
+"""
+httpcache - javdb页面的本地响应缓存
+SQLite存储，按URL索引，支持分类TTL、总大小上限（LRU淘汰）以及ETag/Last-Modified重新验证
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+CACHE_FILE = Path.home() / ".115cli" / "javdb_cache.db"
+MAX_CACHE_SIZE = 50 * 1024 * 1024  # 50MB
+
+class CacheEntry:
+    """一条缓存记录"""
+
+    def __init__(self, url, kind, body, etag, last_modified, fetched):
+        self.url = url
+        self.kind = kind
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched = fetched
+
+    def is_fresh(self, ttl: float) -> bool:
+        return time.time() - self.fetched < ttl
+
+    def validators(self) -> dict:
+        """用于条件请求的请求头"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class ResponseCache:
+    """线程安全的SQLite响应缓存"""
+
+    def __init__(self, path: Path = CACHE_FILE, max_size: int = MAX_CACHE_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched REAL NOT NULL,
+                accessed REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed ON responses(accessed);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        ''')
+        self.db.commit()
+
+    def _count(self, name: str):
+        self.db.execute(
+            'INSERT INTO counters(name, value) VALUES (?, 1) '
+            'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,)
+        )
+
+    def get(self, url: str) -> CacheEntry | None:
+        """读取缓存（同时刷新LRU访问时间），不判断是否过期"""
+        with self._lock:
+            row = self.db.execute(
+                'SELECT url, kind, body, etag, last_modified, fetched FROM responses WHERE url = ?',
+                (url,)
+            ).fetchone()
+            if row is None:
+                self._count('misses')
+                self.db.commit()
+                return None
+            self.db.execute('UPDATE responses SET accessed = ? WHERE url = ?', (time.time(), url))
+            self.db.commit()
+            return CacheEntry(*row)
+
+    def record(self, name: str):
+        """记录一次命中/重新验证等统计"""
+        with self._lock:
+            self._count(name)
+            self.db.commit()
+
+    def put(self, url: str, kind: str, body: str, etag: str | None = None, last_modified: str | None = None):
+        """写入缓存，超过大小上限时按LRU淘汰"""
+        now = time.time()
+        size = len(body.encode('utf-8'))
+        with self._lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, kind, body, etag, last_modified, now, now, size)
+            )
+            self._evict()
+            self.db.commit()
+
+    def touch(self, url: str):
+        """304后刷新抓取时间"""
+        now = time.time()
+        with self._lock:
+            self.db.execute('UPDATE responses SET fetched = ?, accessed = ? WHERE url = ?', (now, now, url))
+            self._count('revalidated')
+            self.db.commit()
+
+    def _evict(self):
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self.db.execute('SELECT url, size FROM responses ORDER BY accessed').fetchall()
+        for url, size in rows:
+            if total <= self.max_size:
+                break
+            self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self._count('evicted')
+            total -= size
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        with self._lock:
+            kinds = {
+                kind: {'entries': n, 'size': size}
+                for kind, n, size in self.db.execute(
+                    'SELECT kind, COUNT(*), SUM(size) FROM responses GROUP BY kind'
+                )
+            }
+            counters = dict(self.db.execute('SELECT name, value FROM counters'))
+        return {
+            'path': str(self.path),
+            'entries': sum(k['entries'] for k in kinds.values()),
+            'size': sum(k['size'] for k in kinds.values()),
+            'max_size': self.max_size,
+            'kinds': kinds,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+            'revalidated': counters.get('revalidated', 0),
+            'evicted': counters.get('evicted', 0),
+        }
+
+    def clear(self, kind: str | None = None, older_than: float | None = None) -> int:
+        """清空缓存，可按类型或抓取时间过滤，返回删除条数"""
+        sql = 'DELETE FROM responses WHERE 1 = 1'
+        params = []
+        if kind:
+            sql += ' AND kind = ?'
+            params.append(kind)
+        if older_than is not None:
+            sql += ' AND fetched < ?'
+            params.append(time.time() - older_than)
+        with self._lock:
+            deleted = self.db.execute(sql, params).rowcount
+            if kind is None and older_than is None:
+                self.db.execute('DELETE FROM counters')
+            self.db.commit()
+        return deleted
+
+    def close(self):
+        with self._lock:
+            self.db.close()
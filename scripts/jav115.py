@@ -4,62 +4,45 @@ jav115 - 一键搜索javdb并添加到115云下载
 """
 
 import click
-import re
+import contextvars
 import json
-import subprocess
-from urllib.parse import quote
-from pathlib import Path
-from rich.console import Console
-from rich.prompt import Prompt, IntPrompt
-from rich.table import Table
-import time
-
-console = Console()
-
-SCRIPT_DIR = Path(__file__).parent
-SKILL_DIR = SCRIPT_DIR.parent
-CLI_115 = SCRIPT_DIR / "115cli"
-JAVDB_PY = SCRIPT_DIR / "javdb.py"
-VENV_PYTHON = SKILL_DIR / "venv" / "bin" / "python"
-
-def run_115cli(*args):
-    """运行115cli命令"""
-    result = subprocess.run(
-        [str(CLI_115)] + list(args),
-        capture_output=True,
-        text=True
-    )
-    return result.stdout, result.returncode
-
-def run_javdb(*args):
-    """运行javdb命令"""
-    result = subprocess.run(
-        [str(VENV_PYTHON), str(JAVDB_PY)] + list(args),
-        capture_output=True,
-        text=True
-    )
-    return result.stdout, result.returncode
 
-def search_and_get_magnet(keyword: str) -> str | None:
-    """搜索并获取magnet链接"""
+# javdb.py / cli.py 与本脚本同目录，直接进程内调用，共享HTTP会话和115客户端
+import javdb
+import tracing
+from cli import get_client, resolve_cid, offline_add_magnet, offline_add_magnets
+from cli import find_duplicate, remember_submitted, describe_duplicate
+from lazy import LazyConsole, LazyGroup
+
+# rich的表格、进度条、输入提示在用到时才导入
+console = LazyConsole()
+
+# 等待选择时在后台预取前几个结果的详情页
+PREFETCH_TOP = 3
+
+def search_and_get_magnet(keyword: str, prefetch: int = PREFETCH_TOP) -> dict | None:
+    """
+    搜索并获取magnet链接
+    等待用户选择时，后台线程预取前 prefetch 个结果的详情页（同时写入缓存），选中后直接使用；
+    选中的结果已有详情页地址，不再按番号重新搜索
+    返回: {'code': ..., 'name': ..., 'size': ..., 'bytes': ..., 'magnet': ..., 'alternates': [备选磁链, ...]}
+    """
     # 搜索
     console.print(f"[cyan]🔍 搜索: {keyword}[/cyan]")
-    output, code = run_javdb("search", keyword, "-j")
-    
-    if code != 0 or not output.strip():
-        console.print("[red]搜索失败[/red]")
-        return None
-    
     try:
-        results = json.loads(output)
-    except:
-        console.print("[red]解析搜索结果失败[/red]")
+        results = javdb.search_javdb(keyword)
+    except Exception as e:
+        console.print(f"[red]搜索失败: {e}[/red]")
         return None
     
     if not results:
         console.print("[yellow]未找到结果[/yellow]")
         return None
     
+    from concurrent.futures import ThreadPoolExecutor
+    from rich.prompt import IntPrompt
+    from rich.table import Table
+    
     # 显示搜索结果
     table = Table(title="搜索结果")
     table.add_column("#", style="dim", width=3)
@@ -80,8 +63,20 @@ def search_and_get_magnet(keyword: str) -> str | None:
     # 选择
     if len(results) == 1:
         choice = 1
+        prefetched = {}
     else:
-        choice = IntPrompt.ask("选择", default=1)
+        pool = ThreadPoolExecutor(max_workers=max(1, prefetch), thread_name_prefix='prefetch')
+        prefetched = {
+            i: pool.submit(javdb.get_magnets, item['url'])
+            for i, item in enumerate(results[:prefetch], 1)
+        }
+        try:
+            # 等待用户输入的时间单独计，便于和网络耗时区分
+            with tracing.span('jav115.prompt', prefetch=len(prefetched)):
+                choice = IntPrompt.ask("选择", default=1)
+        finally:
+            # 未开始的预取直接取消，已开始的在后台完成（结果进入缓存）
+            pool.shutdown(wait=False, cancel_futures=True)
     
     if choice < 1 or choice > len(results):
         console.print("[red]无效选择[/red]")
@@ -92,91 +87,607 @@ def search_and_get_magnet(keyword: str) -> str | None:
     
     # 获取magnet
     console.print("[cyan]🔗 获取磁力链接...[/cyan]")
-    output, code = run_javdb("magnet", selected['code'], "-1")
+    try:
+        with tracing.span('jav115.magnets', prefetched=choice in prefetched):
+            if choice in prefetched:
+                magnets = prefetched[choice].result()
+            else:
+                magnets = javdb.get_magnets(selected['url'])
+    except Exception as e:
+        console.print(f"[red]获取磁力链接失败: {e}[/red]")
+        return None
     
-    if code != 0 or not output.strip():
+    if not magnets:
         console.print("[red]获取磁力链接失败[/red]")
         return None
     
-    magnet = output.strip()
-    console.print(f"[dim]{magnet[:60]}...[/dim]")
+    import failover
+    
+    first, *alternates = failover.candidates(magnets)
+    magnet = dict(first, code=selected['code'], alternates=alternates)
+    console.print(f"[dim]{magnet['magnet'][:60]}...[/dim]")
     return magnet
 
-@click.group()
+# 直接转发到 javdb.py / cli.py 的子命令，调用时才导入
+PASSTHROUGH_COMMANDS = {
+    'search': ('javdb', 'search', '仅搜索，不下载'),
+    'magnet': ('javdb', 'magnet', '获取指定番号的磁力链接'),
+    'tasks': ('cli', 'tasks', '查看115云下载任务'),
+    'ls': ('cli', 'ls', '列出115目录'),
+}
+
+@click.group(cls=LazyGroup, lazy_commands=PASSTHROUGH_COMMANDS)
+@tracing.options
 def cli():
     """JavDB + 115网盘 一键下载工具"""
     pass
 
 @cli.command()
 @click.argument('keyword')
-@click.option('--save-path', '-s', default='/', help='115保存路径（目录ID）')
-@click.option('--move-to', '-m', help='下载完成后移动到的目录ID')
-@click.option('--wait', '-w', is_flag=True, help='等待下载完成')
-def download(keyword, save_path, move_to, wait):
+@click.option('--save-path', '-s', default='/', help='115保存目录（目录ID或路径）')
+@click.option('--move-to', '-m', help='下载完成后移动到的目录（目录ID或路径）')
+@click.option('--rename', is_flag=True, help='下载完成后按番号重命名')
+@click.option('--clean-junk', type=float, metavar='MB', help='下载完成后删除小于MB的文件')
+@click.option('--wait', '-w', is_flag=True, help='等待下载完成（否则后续操作由 pipeline run 处理）')
+@click.option('--force', '-f', is_flag=True, help='跳过查重，强制提交')
+@click.option('--stall-after', default=300.0, help='等待时进度停滞多少秒后换用备选磁链（0为不换）')
+def download(keyword, save_path, move_to, rename, clean_junk, wait, force, stall_after):
     """搜索并下载到115"""
     
     # 1. 搜索并获取magnet
-    magnet = search_and_get_magnet(keyword)
-    if not magnet:
+    selected = search_and_get_magnet(keyword)
+    if not selected:
         return
+    magnet = selected['magnet']
     
-    # 2. 添加到115云下载
+    # 2. 添加到115云下载（先查重）
     console.print("[cyan]☁️ 添加到115云下载...[/cyan]")
-    output, code = run_115cli("download", magnet, "-s", save_path)
-    console.print(output)
+    client = get_client()
+    try:
+        duplicate = None if force else find_duplicate(client, magnet, selected['code'], selected['size'])
+        if duplicate:
+            from rich.markup import escape
+            
+            console.print(f"[yellow]跳过：{escape(describe_duplicate(duplicate))}[/yellow]（--force 强制提交）")
+            return
+        save_cid = resolve_cid(client, save_path)
+        with tracing.span('jav115.submit', count=1):
+            result = offline_add_magnet(client, magnet, save_cid)
+    except Exception as e:
+        result = {'state': False, 'error': str(e)}
     
-    if code != 0:
-        console.print("[red]添加云下载失败[/red]")
+    if not result['state']:
+        console.print(f"[red]添加云下载失败: {result['error']}[/red]")
         return
     
-    # 提取info_hash
-    hash_match = re.search(r'btih:([a-fA-F0-9]+)', magnet)
-    if not hash_match:
+    info_hash = result['info_hash'] or javdb.magnet_info_hash(magnet)
+    remember_submitted(client, {info_hash: selected['code']})
+    console.print(f"[green]✓ 任务添加成功！[/green]")
+    console.print(f"Info Hash: {info_hash or 'N/A'}")
+    if not info_hash:
         console.print("[yellow]无法提取hash[/yellow]")
         return
     
-    info_hash = hash_match.group(1)
+    actions = post_actions(client, move_to, rename, clean_junk)
+    if actions:
+        # 等待时由 wait_download 换用备选，否则备选随登记交给 pipeline run
+        alternates = [] if wait else selected['alternates']
+        get_pipeline().register(info_hash, selected['code'], actions, alternates, save_cid)
+        if not wait:
+            console.print("[cyan]已登记完成后的操作，运行 jav115 pipeline run 处理[/cyan]")
     
     # 3. 等待下载完成（可选）
     if wait:
-        console.print("[cyan]⏳ 等待下载完成...[/cyan]")
-        output, code = run_115cli("status", info_hash, "--wait")
-        console.print(output)
+        from rich.progress import Progress, SpinnerColumn, TextColumn
+        import failover
+        
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console.instance
+        ) as progress:
+            task = progress.add_task("⏳ 等待下载完成...", total=None)
+            
+            def on_progress(info):
+                progress.update(task, description=f"下载中... {info.get('percent_done', 0)}%")
+            
+            def on_switch(old_hash, new_hash, candidate, reason):
+                console.print(f"[yellow]{reason}，换用备选磁链 {candidate['size']}: {new_hash}[/yellow]")
+                if actions:
+                    get_pipeline().finish(old_hash, 'failed', [{'action': None, 'error': reason}])
+                    get_pipeline().register(new_hash, selected['code'], actions)
+                progress.update(task, description="⏳ 等待下载完成...")
+            
+            info, info_hash = failover.wait_download(
+                client, info_hash, selected['alternates'], save_cid, selected['code'],
+                stall_after=stall_after or None, on_progress=on_progress, on_switch=on_switch
+            )
+        
+        if info is None:
+            console.print("[yellow]任务不存在[/yellow]")
+            return
+        if info.get('error'):
+            from rich.markup import escape
+            
+            console.print(f"[red]✗ {escape(info['error'])}[/red]")
+            return
+        if info.get('status') == -1:
+            console.print(f"[red]✗ 下载失败: {info.get('name')}[/red]")
+            return
+        if info.get('status') != 2:
+            console.print("[yellow]等待超时[/yellow]")
+            return
+        console.print(f"[green]✓ 下载完成: {info.get('name')}[/green]")
+        console.print(f"文件ID: {info.get('file_id', 'N/A')}")
         
-        # 4. 移动文件（可选）
-        if move_to and code == 0:
-            console.print(f"[cyan]📂 移动文件到目录 {move_to}...[/cyan]")
-            # 需要从status输出中提取file_id
-            # 这部分需要115cli支持返回文件ID
-            console.print("[yellow]文件移动功能待完善[/yellow]")
+        # 4. 完成后的操作（可选）
+        if actions:
+            import pipeline
+            
+            entry = {'code': selected['code'], 'actions': actions}
+            with tracing.span('jav115.post_actions', actions=','.join(actions)):
+                status, results = pipeline.process_task(client, info_hash, entry, info)
+            get_pipeline().finish(info_hash, status, results)
+            print_results(results)
+            if status != 'done':
+                return
     
     console.print("[green]✓ 完成！[/green]")
 
-@cli.command()
-@click.argument('keyword')
-def search(keyword):
-    """仅搜索，不下载"""
-    run_javdb("search", keyword)
+_pipeline = None
 
-@cli.command()
-@click.argument('code')
-def magnet(code):
-    """获取指定番号的磁力链接"""
-    output, _ = run_javdb("magnet", code)
-    console.print(output)
+def get_pipeline() -> 'pipeline.PostActions':
+    """后续操作登记表（进程内共享）"""
+    global _pipeline
+    if _pipeline is None:
+        import pipeline
+        
+        _pipeline = pipeline.PostActions()
+    return _pipeline
 
-@cli.command()
-def tasks():
-    """查看115云下载任务"""
-    output, _ = run_115cli("tasks")
-    console.print(output)
+def post_actions(client, move_to: str | None, rename: bool, clean_junk: float | None) -> dict:
+    """命令行选项 → 登记的操作；移动目标在登记时解析为目录ID"""
+    actions = {}
+    if clean_junk:
+        actions['clean'] = clean_junk
+    if rename:
+        actions['rename'] = True
+    if move_to:
+        actions['move'] = resolve_cid(client, move_to)
+    return actions
+
+def print_results(results: list):
+    from rich.markup import escape
+    
+    for r in results:
+        if r.get('error'):
+            console.print(f"[red]✗ {r['action'] or ''} {escape(r['error'])}[/red]")
+        else:
+            console.print(f"[green]✓ {escape(r['message'])}[/green]")
+
+def read_codes(source) -> list:
+    """读取番号列表：每行一个，忽略空行和 # 注释，去重并保持顺序"""
+    codes = []
+    seen = set()
+    for line in source:
+        code = line.split('#', 1)[0].strip()
+        if code and code.upper() not in seen:
+            seen.add(code.upper())
+            codes.append(code)
+    return codes
+
+def resolve_code(code: str) -> dict:
+    """番号 → 详情页 → 排好序的磁力链接（首选 + alternates 备选）"""
+    report = {'code': code, 'status': 'not_found', 'magnet': None, 'size': None, 'info_hash': None,
+              'alternates': [], 'error': None}
+    import failover
+    
+    try:
+        with tracing.span('jav115.resolve_code', code=code):
+            item = javdb.lookup_code(code)
+        if not item:
+            report['error'] = '未找到该番号'
+            return report
+        
+        if not item['magnets']:
+            report['error'] = '未找到磁力链接'
+            return report
+        
+        first, *alternates = failover.candidates(item['magnets'])
+        report['status'] = 'resolved'
+        report['magnet'] = first['magnet']
+        report['size'] = first['size']
+        report['info_hash'] = javdb.magnet_info_hash(report['magnet'])
+        report['alternates'] = alternates
+    except Exception as e:
+        report['status'] = 'failed'
+        report['error'] = f'解析失败: {e}'
+    return report
+
+def mark_duplicates(reports: list, workers: int = 8):
+    """
+    已有任务或文件的番号标记为 duplicate；同一批次内磁链相同的只保留第一个
+    任务查重和本地索引查重都在本地完成；没有本地索引时在 aioengine 中并发搜索网盘（最多 workers 个请求）
+    """
+    import aioengine
+    from cli import DUPLICATE_SEARCH_LIMIT, file_duplicate, get_index, get_known_tasks, index_ready
+    from dedupe import find_task_duplicate
+    
+    client = get_client()
+    seen = set()
+    pending = []
+    for report in reports:
+        if report['status'] != 'resolved':
+            continue
+        if report['info_hash'] and report['info_hash'] in seen:
+            report['status'] = 'duplicate'
+            report['error'] = '与本批次中其他番号的磁链相同'
+            continue
+        seen.add(report['info_hash'])
+        pending.append(report)
+    if not pending:
+        return
+    
+    def mark(report, duplicate):
+        if duplicate:
+            report['status'] = 'duplicate'
+            report['error'] = describe_duplicate(duplicate)
+    
+    try:
+        known = get_known_tasks(client)
+        use_index = index_ready()
+    except Exception as e:
+        for report in pending:
+            report['status'] = 'failed'
+            report['error'] = f'查重失败: {e}'
+        return
+    remote = []
+    for report in pending:
+        duplicate = find_task_duplicate(known, report['magnet'])
+        if duplicate is None and use_index:
+            entries = get_index().search(report['code'], limit=DUPLICATE_SEARCH_LIMIT)
+            duplicate = file_duplicate(entries, report['code'], report['size'])
+        elif duplicate is None:
+            remote.append(report)
+            continue
+        mark(report, duplicate)
+    if not remote:
+        return
+    
+    outcomes = aioengine.run(aioengine.search_files_many(
+        [r['code'] for r in remote], DUPLICATE_SEARCH_LIMIT, max(1, workers), client=client
+    ))
+    for report, (entries, error) in zip(remote, outcomes):
+        if error is not None:
+            report['status'] = 'failed'
+            report['error'] = f'查重失败: {aioengine.error_message(error)}'
+            continue
+        mark(report, file_duplicate(entries, report['code'], report['size']))
+
+def submit_resolved(reports: list, save_cid: int, chunk_size: int):
+    """把已解析的磁力链接分块提交到115云下载，结果写回report"""
+    pending = [r for r in reports if r['status'] == 'resolved']
+    if not pending:
+        return
+    
+    client = get_client()
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        try:
+            with tracing.span('jav115.submit', count=len(chunk)):
+                outcomes = offline_add_magnets(client, [r['magnet'] for r in chunk], save_cid)
+        except Exception as e:
+            outcomes = [{'state': False, 'info_hash': None, 'error': str(e)} for _ in chunk]
+        
+        for report, outcome in zip(chunk, outcomes):
+            if outcome['state']:
+                report['status'] = 'submitted'
+                report['info_hash'] = outcome['info_hash'] or report['info_hash']
+            else:
+                report['status'] = 'failed'
+                report['error'] = f"提交失败: {outcome['error']}"
+        
+        remember_submitted(client, {r['info_hash']: r['code'] for r in chunk if r['status'] == 'submitted'})
 
 @cli.command()
-@click.argument('path', default='/')
-def ls(path):
-    """列出115目录"""
-    output, _ = run_115cli("ls", path)
-    console.print(output)
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--save-path', '-s', default='/', help='115保存目录（目录ID或路径）')
+@click.option('--workers', '-w', default=8, help='并发解析数')
+@click.option('--chunk-size', '-c', default=15, help='每次提交到115的链接数')
+@click.option('--dry-run', is_flag=True, help='只解析磁力链接，不提交')
+@click.option('--force', '-f', is_flag=True, help='跳过查重，已有的任务/文件也重新提交')
+@click.option('--move-to', '-m', help='下载完成后移动到的目录（目录ID或路径）')
+@click.option('--rename', is_flag=True, help='下载完成后按番号重命名')
+@click.option('--clean-junk', type=float, metavar='MB', help='下载完成后删除小于MB的文件')
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出报告')
+def batch(source, save_path, workers, chunk_size, dry_run, force, move_to, rename, clean_junk, json_output):
+    """批量下载：从文件（或 - 表示标准输入）读取番号列表"""
+    codes = read_codes(source)
+    if not codes:
+        console.print("[yellow]没有番号[/yellow]")
+        return
+    
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from rich.progress import Progress, BarColumn, TextColumn, MofNCompleteColumn
+    
+    # 1. 并发解析 番号 → 磁力链接
+    reports = {}
+    with Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        MofNCompleteColumn(),
+        console=console.instance,
+        transient=True,
+        disable=json_output,
+    ) as progress:
+        task = progress.add_task("🔍 解析番号", total=len(codes))
+        with tracing.span('jav115.resolve_all', count=len(codes)), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            # 每个任务在当前上下文的副本中运行，其中的span挂在 jav115.resolve_all 下
+            futures = [pool.submit(contextvars.copy_context().run, resolve_code, code) for code in codes]
+            for future in as_completed(futures):
+                report = future.result()
+                reports[report['code']] = report
+                progress.advance(task)
+    reports = [reports[code] for code in codes]
+    
+    # 2. 查重后分块提交到115
+    if not dry_run:
+        if not json_output:
+            console.print("[cyan]☁️ 添加到115云下载...[/cyan]")
+        client = get_client()
+        actions = post_actions(client, move_to, rename, clean_junk)
+        if not force:
+            with tracing.span('jav115.dedupe', count=len(reports)):
+                mark_duplicates(reports, workers)
+        save_cid = resolve_cid(client, save_path)
+        submit_resolved(reports, save_cid, max(1, chunk_size))
+        
+        # 登记完成后的操作和备选磁链，由 pipeline run 统一处理
+        if actions:
+            for r in reports:
+                if r['status'] == 'submitted' and r['info_hash']:
+                    get_pipeline().register(r['info_hash'], r['code'], actions, r['alternates'], save_cid)
+    
+    # 3. 报告
+    if json_output:
+        print(json.dumps(reports, indent=2, ensure_ascii=False))
+        return
+    
+    status_style = {
+        'resolved': '[cyan]已解析[/cyan]',
+        'submitted': '[green]已提交[/green]',
+        'duplicate': '[magenta]已存在[/magenta]',
+        'not_found': '[yellow]未找到[/yellow]',
+        'failed': '[red]失败[/red]',
+    }
+    from rich.markup import escape
+    from rich.table import Table
+    
+    table = Table(title="批量下载报告")
+    table.add_column("番号", style="cyan")
+    table.add_column("状态")
+    table.add_column("大小", style="blue")
+    table.add_column("Info Hash / 错误", max_width=50)
+    
+    for r in reports:
+        table.add_row(
+            r['code'],
+            status_style[r['status']],
+            r['size'] or '-',
+            escape(r['error'] or r['info_hash'] or '-')
+        )
+    
+    console.print(table)
+    counts = {}
+    for r in reports:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    console.print("  ".join(f"{status_style[k]}: {v}" for k, v in counts.items()))
+
+@cli.group(name='pipeline')
+def pipeline_group():
+    """下载完成后的自动处理（移动、重命名、清理小文件）"""
+    pass
+
+@pipeline_group.command(name='run')
+@click.option('--follow', is_flag=True, help='持续运行，处理之后新登记的任务')
+@click.option('--timeout', '-t', default=3600, help='最长运行时间（秒）')
+@click.option('--workers', '-w', default=4, help='并发处理数')
+@click.option('--min-interval', default=3.0, help='最短轮询间隔（秒）')
+@click.option('--max-interval', default=60.0, help='最长轮询间隔（秒）')
+@click.option('--stall-after', default=600.0, help='进度停滞多少秒后换用备选磁链（0为不换）')
+@click.option('--json-output', '-j', is_flag=True, help='处理结果按NDJSON逐行输出')
+def pipeline_run(follow, timeout, workers, min_interval, max_interval, stall_after, json_output):
+    """监视所有待处理任务，完成后执行登记的操作"""
+    import pipeline
+    
+    registry = get_pipeline()
+    pending = len(registry.pending())
+    if not pending and not follow:
+        console.print("[yellow]没有待处理的任务[/yellow]")
+        return
+    if not json_output:
+        console.print(f"[cyan]监视 {pending} 个任务...[/cyan]")
+    
+    def on_result(info_hash, entry, status, results):
+        if json_output:
+            record = {'info_hash': info_hash, 'code': entry['code'], 'status': status, 'results': results}
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            return
+        style = 'green' if status == 'done' else 'red'
+        console.print(f"[{style}]{entry['code'] or info_hash}[/{style}]")
+        print_results(results)
+    
+    counts = pipeline.run(
+        get_client(), registry, timeout=timeout, follow=follow, workers=workers,
+        min_interval=min_interval, max_interval=max_interval, stall_after=stall_after or None, on_result=on_result
+    )
+    if not json_output:
+        console.print(f"完成 {counts['done']}，失败 {counts['failed']}，仍在下载 {counts['pending']}")
+
+@pipeline_group.command(name='ls')
+@click.option('--status', type=click.Choice(['pending', 'done', 'failed']), help='按状态过滤')
+@click.option('--limit', '-n', default=50, help='显示数量')
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出')
+def pipeline_ls(status, limit, json_output):
+    """查看登记的后续操作"""
+    items = get_pipeline().list(status, limit)
+    if json_output:
+        print(json.dumps(items, indent=2, ensure_ascii=False))
+        return
+    if not items:
+        console.print("[yellow]没有记录[/yellow]")
+        return
+    
+    from rich.markup import escape
+    from rich.table import Table
+    
+    status_style = {'pending': '[cyan]待处理[/cyan]', 'done': '[green]完成[/green]', 'failed': '[red]失败[/red]'}
+    table = Table(title="后续操作")
+    table.add_column("番号", style="cyan")
+    table.add_column("操作")
+    table.add_column("状态")
+    table.add_column("结果", max_width=50)
+    for item in items:
+        actions = ', '.join(
+            f"{name}={value}" if name != 'rename' else name for name, value in item['actions'].items()
+        )
+        outcome = '; '.join(r.get('error') or r.get('message', '') for r in item['results'])
+        table.add_row(item['code'] or item['info_hash'][:12], actions, status_style[item['status']], escape(outcome or '-'))
+    console.print(table)
+
+@pipeline_group.command(name='retry')
+@click.argument('info_hash', required=False)
+def pipeline_retry(info_hash):
+    """把失败的条目重新标记为待处理"""
+    count = get_pipeline().retry(info_hash)
+    console.print(f"[green]✓ {count} 个条目重新待处理[/green]")
+
+_queue = None
+
+def get_queue() -> 'jobqueue.JobQueue':
+    """作业队列（进程内共享）"""
+    global _queue
+    if _queue is None:
+        import jobqueue
+        
+        _queue = jobqueue.JobQueue()
+    return _queue
+
+QUEUE_STAGE_STYLE = {
+    'resolve': '[cyan]待解析[/cyan]',
+    'submit': '[cyan]待提交[/cyan]',
+    'downloading': '[blue]下载中[/blue]',
+    'postprocess': '[blue]后续处理[/blue]',
+    'done': '[green]完成[/green]',
+    'failed': '[red]失败[/red]',
+}
+
+@cli.group(name='queue')
+def queue_group():
+    """持久化作业队列：番号 → 解析 → 提交 → 下载 → 后续操作，中断后可继续"""
+    pass
+
+@queue_group.command(name='add')
+@click.argument('codes', nargs=-1)
+@click.option('--input', '-i', 'source', type=click.File('r', encoding='utf-8'), help='从文件（- 为标准输入）读取番号')
+@click.option('--save-path', '-s', default='/', help='115保存目录（目录ID或路径）')
+@click.option('--move-to', '-m', help='下载完成后移动到的目录（目录ID或路径）')
+@click.option('--rename', is_flag=True, help='下载完成后按番号重命名')
+@click.option('--clean-junk', type=float, metavar='MB', help='下载完成后删除小于MB的文件')
+@click.option('--force', '-f', is_flag=True, help='跳过查重，已有的任务/文件也重新提交')
+def queue_add(codes, source, save_path, move_to, rename, clean_junk, force):
+    """加入作业（已在队列中的番号跳过）"""
+    codes = read_codes(list(codes) + (list(source) if source else []))
+    if not codes:
+        console.print("[yellow]没有番号[/yellow]")
+        return
+    client = get_client()
+    actions = post_actions(client, move_to, rename, clean_junk)
+    added = get_queue().add(codes, resolve_cid(client, save_path), actions, force)
+    console.print(f"[green]✓ 加入 {len(added)} 个作业[/green]" + (
+        f"，{len(codes) - len(added)} 个已在队列中" if len(added) < len(codes) else ''
+    ))
+    console.print("[cyan]运行 jav115 queue run 开始处理[/cyan]")
+
+@queue_group.command(name='run')
+@click.option('--workers', '-w', default=4, help='并发解析数')
+@click.option('--chunk-size', '-c', default=15, help='每次提交到115的链接数')
+@click.option('--post-workers', default=2, help='并发执行后续操作数')
+@click.option('--follow', is_flag=True, help='持续运行，处理之后新加入的作业')
+@click.option('--timeout', '-t', default=0.0, help='最长运行时间（秒），0为不限')
+@click.option('--min-interval', default=3.0, help='下载进度最短轮询间隔（秒）')
+@click.option('--max-interval', default=60.0, help='下载进度最长轮询间隔（秒）')
+@click.option('--stall-after', default=600.0, help='进度停滞多少秒后换用备选磁链（0为不换）')
+@click.option('--json-output', '-j', is_flag=True, help='阶段变化按NDJSON逐行输出')
+def queue_run(workers, chunk_size, post_workers, follow, timeout, min_interval, max_interval, stall_after,
+              json_output):
+    """处理队列，直到所有作业完成或失败（中断后再次运行会从各自的阶段继续）"""
+    import jobqueue
+    from rich.markup import escape
+    
+    queue = get_queue()
+    if not queue.waiting() and not follow:
+        console.print("[yellow]没有待处理的作业[/yellow]")
+        return
+    if not json_output:
+        counts = queue.counts()
+        console.print("[cyan]作业: " + "  ".join(
+            f"{stage} {counts[stage]}" for stage in jobqueue.STAGES if counts[stage]
+        ) + "[/cyan]")
+    
+    def on_event(job, stage, error):
+        if json_output:
+            record = {'code': job['code'] if job else None, 'stage': stage, 'error': error}
+            print(json.dumps(record, ensure_ascii=False), flush=True)
+            return
+        code = job['code'] if job else ''
+        line = f"{code} → {QUEUE_STAGE_STYLE[stage]}"
+        console.print(f"{line} {escape(error)}" if error else line)
+    
+    counts = jobqueue.run(
+        get_client(), queue, resolve_workers=workers, chunk_size=chunk_size, post_workers=post_workers,
+        follow=follow, timeout=timeout or None, min_interval=min_interval, max_interval=max_interval,
+        stall_after=stall_after or None, on_event=on_event
+    )
+    if not json_output:
+        console.print(f"完成 {counts['done']}，失败 {counts['failed']}，未结束 {queue.waiting()}")
+
+@queue_group.command(name='ls')
+@click.option('--stage', type=click.Choice(list(QUEUE_STAGE_STYLE)), help='按阶段过滤')
+@click.option('--limit', '-n', default=50, help='显示数量（0为不限）')
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出')
+def queue_ls(stage, limit, json_output):
+    """查看作业"""
+    queue = get_queue()
+    jobs = queue.list(stage, limit or None)
+    if json_output:
+        print(json.dumps(jobs, indent=2, ensure_ascii=False))
+        return
+    counts = queue.counts()
+    if not jobs:
+        console.print("[yellow]没有作业[/yellow]")
+        return
+    
+    from rich.markup import escape
+    from rich.table import Table
+    
+    table = Table(title="作业队列")
+    table.add_column("番号", style="cyan")
+    table.add_column("阶段")
+    table.add_column("大小", style="blue")
+    table.add_column("Info Hash / 错误", max_width=50)
+    for job in jobs:
+        detail = job['error'] or '; '.join(r.get('message', '') for r in job['results']) or job['info_hash']
+        table.add_row(job['code'], QUEUE_STAGE_STYLE[job['stage']], job['size'] or '-', escape(detail or '-'))
+    console.print(table)
+    console.print("  ".join(f"{QUEUE_STAGE_STYLE[k]}: {v}" for k, v in counts.items() if v))
+
+@queue_group.command(name='retry')
+@click.argument('code', required=False)
+def queue_retry(code):
+    """失败的作业从出错的阶段重新开始"""
+    count = get_queue().retry(code)
+    console.print(f"[green]✓ {count} 个作业重新排队[/green]")
 
 if __name__ == '__main__':
     cli()
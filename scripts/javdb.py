@@ -6,228 +6,923 @@ javdb-search - 从javdb.com搜索影片并获取magnet链接
 import click
 import re
 import json
-import subprocess
+import atexit
+import threading
+import time
+from html import unescape
 from urllib.parse import quote
 from pathlib import Path
-from rich.console import Console
-from rich.table import Table
+import mirrors
+from dedupe import magnet_info_hash, parse_size
+import ratelimit
+import tracing
+from lazy import LazyConsole
 
-console = Console()
+# httpx、cookiejar、rich表格、SQLite缓存在第一次用到时才导入
+console = LazyConsole()
 
 COOKIE_FILE = Path.home() / ".115cli" / "javdb_cookie.txt"
+BASE_URL = "https://javdb.com"
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
 
-def get_html(url: str) -> str:
-    """获取页面HTML，自动处理年龄验证"""
-    
-    # 检查是否有cookie文件
-    cookie_args = []
-    if COOKIE_FILE.exists():
-        cookie_args = ['-b', str(COOKIE_FILE)]
-    
-    # 先尝试直接访问
-    result = subprocess.run(
-        ['curl', '-s', '-L', '-A', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-         '-c', str(COOKIE_FILE)] + cookie_args + [url],
-        capture_output=True,
-        text=True,
-        timeout=30
-    )
+# 缓存有效期（秒）：搜索结果变化较快，详情页的磁链偶尔会新增
+CACHE_TTL = {
+    'search': 6 * 3600,
+    'detail': 24 * 3600,
+}
+# 多页搜索时同时请求的页数
+SEARCH_FANOUT = 4
+
+def is_age_gate(html: str) -> bool:
+    """是否为年龄验证页面"""
+    return 'over18-modal' in html or '您必須已達您當地的法定年齡' in html
+
+class GateBuffer:
+    """
+    年龄验证页不能交给调用方：验证框可能出现在页面任何位置，只有读完才能确定
+    站点还没有 over18 cookie 时整页缓存，确认不是验证页后一次产出；已有 cookie 时边下载边产出
+    iter_html 与 aioengine 共用
+    """
     
-    html = result.stdout
-    
-    # 如果遇到年龄验证页面，先确认年龄
-    if 'over18-modal' in html or '您必須已達您當地的法定年齡' in html:
-        # 提取确认链接
-        confirm_match = re.search(r'href="(/over18\?respond=1[^"]*)"', html)
-        if confirm_match:
-            confirm_url = f"https://javdb.com{confirm_match.group(1)}"
-            # 确认年龄
-            subprocess.run(
-                ['curl', '-s', '-L', '-A', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                 '-c', str(COOKIE_FILE), '-b', str(COOKIE_FILE), confirm_url],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            # 重新访问
-            result = subprocess.run(
-                ['curl', '-s', '-L', '-A', 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36',
-                 '-b', str(COOKIE_FILE), url],
-                capture_output=True,
-                text=True,
-                timeout=30
+    def __init__(self, session: 'JavdbSession', response):
+        self.streaming = session.has_age_cookie(response.url)
+        self.chunks = []
+    
+    def feed(self, text: str) -> str | None:
+        """收到一块文本，返回可以立即产出的部分"""
+        self.chunks.append(text)
+        return text if self.streaming else None
+    
+    @property
+    def html(self) -> str:
+        return ''.join(self.chunks)
+    
+    def held(self) -> str:
+        """读完后尚未产出的内容"""
+        return '' if self.streaming else self.html
+
+class JavdbSession:
+    """
+    进程内复用的javdb HTTP会话
+    - keep-alive连接池，避免每个请求重新建立DNS/TCP/TLS
+    - 内存cookie jar，仅在cookie变化时写回磁盘（兼容curl的cookie文件格式）
+    - gzip/brotli 自动解压（brotli需安装 brotli 包）
+    - 年龄验证每个会话每个站点只处理一次
+    - 配置了镜像时对冲请求（见 mirrors）
+    """
+    
+    def __init__(self, cookie_file: Path = COOKIE_FILE):
+        import httpx
+        from http.cookiejar import MozillaCookieJar, LoadError
+        
+        self.cookie_file = cookie_file
+        self.jar = MozillaCookieJar(str(cookie_file))
+        if cookie_file.exists():
+            try:
+                self.jar.load(ignore_discard=True, ignore_expires=True)
+            except (LoadError, OSError):
+                # 损坏的cookie文件直接忽略，之后会被覆盖
+                self.jar.clear()
+        self._saved = self._snapshot()
+        self._lock = threading.Lock()
+        self._age_lock = threading.Lock()
+        self._age_confirmed = set()
+        
+        self.client = httpx.Client(
+            headers={'User-Agent': USER_AGENT},
+            cookies=self.jar,
+            follow_redirects=True,
+            timeout=30,
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    
+    def _snapshot(self) -> tuple:
+        return tuple(sorted(
+            (c.domain, c.path, c.name, c.value or '', c.expires or 0) for c in self.jar
+        ))
+    
+    def save_cookies(self):
+        """cookie有变化时写回磁盘"""
+        with self._lock:
+            snapshot = self._snapshot()
+            if snapshot == self._saved:
+                return
+            self.cookie_file.parent.mkdir(exist_ok=True)
+            self.jar.save(ignore_discard=True, ignore_expires=True)
+            self._saved = snapshot
+    
+    def fetch(self, url: str, headers: dict | None = None):
+        """GET请求并返回响应对象"""
+        ratelimit.acquire('javdb')
+        response = self.client.get(url, headers=headers)
+        self.save_cookies()
+        return response
+    
+    def has_age_cookie(self, url) -> bool:
+        """cookie jar 中是否已有该站点的 over18 cookie（有则不会再返回验证页）"""
+        from urllib.parse import urlsplit
+        
+        host = urlsplit(str(url)).hostname or ''
+        for cookie in self.jar:
+            domain = cookie.domain.lstrip('.')
+            if cookie.name == 'over18' and (host == domain or host.endswith('.' + domain)):
+                return True
+        return False
+    
+    def confirm_age(self, html: str, base: str | None = None) -> bool:
+        """
+        处理年龄验证页面，每个会话每个站点只确认一次（cookie按站点区分）
+        返回True表示已确认（包括并发请求中由其他线程确认）、需要重新请求原页面
+        """
+        if not is_age_gate(html):
+            return False
+        base = base or BASE_URL
+        with self._age_lock:
+            if base in self._age_confirmed:
+                return True
+            confirm_match = re.search(r'href="(/over18\?respond=1[^"]*)"', html)
+            if not confirm_match:
+                return False
+            with tracing.span('javdb.age_gate', host=base):
+                self.fetch(f"{base}{unescape(confirm_match.group(1))}")
+            self._age_confirmed.add(base)
+        return True
+    
+    def _send(self, base: str, url: str, headers: dict | None):
+        """发出流式GET，收到响应头后返回，同时记录站点耗时/失败（调用前已取得限速令牌）"""
+        tracker = mirrors.get_tracker()
+        start = time.perf_counter()
+        try:
+            response = self.client.send(self.client.build_request('GET', url, headers=headers), stream=True)
+        except Exception:
+            tracker.failure(base)
+            raise
+        if mirrors.is_bad_status(response.status_code):
+            tracker.failure(base)
+        else:
+            tracker.success(base, time.perf_counter() - start)
+        self.save_cookies()
+        return response
+    
+    def open(self, url: str, headers: dict | None = None):
+        """
+        GET请求，收到响应头后返回流式响应（调用方负责 close）
+        配置了镜像时先请求最快的站点，超过其 p90 耗时未响应就向下一个站点发出对冲请求，
+        出错或状态异常时立即换下一个站点；先返回正常响应的获胜，其余的响应到达后直接关闭
+        """
+        targets = mirrors.candidates(url, BASE_URL)
+        if len(targets) == 1:
+            ratelimit.acquire('javdb')
+            return self._send(*targets[0], headers)
+        
+        from concurrent.futures import FIRST_COMPLETED, Future, wait
+        
+        tracker = mirrors.get_tracker()
+        pending = {}
+        
+        def start(target):
+            # 守护线程：卡住的请求不会拖住进程退出
+            ratelimit.acquire('javdb')
+            future = Future()
+            
+            def run():
+                try:
+                    future.set_result(self._send(*target, headers))
+                except Exception as e:
+                    future.set_exception(e)
+            
+            threading.Thread(target=run, name='javdb-hedge', daemon=True).start()
+            pending[future] = target[0]
+        
+        start(targets[0])
+        rest = targets[1:]
+        delay = tracker.hedge_delay(targets[0][0])
+        hedged = False
+        winner = fallback = error = None
+        while pending and winner is None:
+            done, _ = wait(pending, timeout=delay if rest and not hedged else None, return_when=FIRST_COMPLETED)
+            if not done:
+                hedged = True
+                tracker.hedged(rest[0][0])
+                tracing.record('javdb.hedge', delay, host=rest[0][0])
+                start(rest.pop(0))
+                continue
+            for future in done:
+                pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if winner is None and not mirrors.is_bad_status(response.status_code):
+                    winner = response
+                elif fallback is None:
+                    fallback = response
+                else:
+                    response.close()
+            if winner is None and not pending and rest:
+                start(rest.pop(0))
+        
+        # 落后的请求无法中断，响应头到达后立即关闭，不读取正文
+        for future in pending:
+            future.add_done_callback(_close_response)
+        if winner is not None:
+            if fallback is not None:
+                fallback.close()
+            return winner
+        if fallback is not None:
+            return fallback
+        raise error
+    
+    def iter_page(self, url: str, headers: dict | None = None, chunk_size: int = 16384):
+        """
+        流式GET：先产出响应对象，之后逐块产出解码后的文本
+        提前关闭生成器会中断读取并释放连接
+        """
+        response = self.open(url, headers)
+        try:
+            yield response
+            yield from response.iter_text(chunk_size)
+        finally:
+            response.close()
+    
+    def close(self):
+        self.save_cookies()
+        self.client.close()
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+_session = None
+_session_lock = threading.Lock()
+_cache = None
+_catalog = None
+_cache_enabled = True
+
+def get_session() -> JavdbSession:
+    """获取进程内共享的javdb会话"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = JavdbSession()
+            atexit.register(_session.close)
+        return _session
+
+def get_cache() -> 'ResponseCache | None':
+    """获取响应缓存，--no-cache 时返回None"""
+    global _cache
+    if not _cache_enabled:
+        return None
+    with _session_lock:
+        if _cache is None:
+            from httpcache import ResponseCache
+            _cache = ResponseCache()
+            atexit.register(_cache.close)
+        return _cache
+
+def get_catalog() -> 'Catalog | None':
+    """获取番号目录，--no-cache 时返回None"""
+    global _catalog
+    if not _cache_enabled:
+        return None
+    with _session_lock:
+        if _catalog is None:
+            from catalog import Catalog
+            _catalog = Catalog()
+            atexit.register(_catalog.close)
+        return _catalog
+
+def disable_cache():
+    """本进程内不读写缓存"""
+    global _cache_enabled
+    _cache_enabled = False
+
+def use_daemon() -> bool:
+    """是否转发给守护进程（--no-cache 时在本进程内请求，不使用守护进程的缓存）"""
+    if not _cache_enabled:
+        return False
+    import daemon
+
+    return daemon.available()
+
+def iter_html(url: str, kind: str | None = None):
+    """
+    流式获取页面HTML，逐块产出文本，自动处理年龄验证
+    kind 为 'search'/'detail' 时走本地缓存：新鲜直接返回，过期则用ETag/Last-Modified重新验证
+    只有完整读取的页面才会写入缓存
+    请求经过共享限速器；429/5xx/网络错误在产出任何内容之前退避重试，403 视为被封禁，直接抛出
+    """
+    cache = get_cache() if kind else None
+    with tracing.span('javdb.cache', kind=kind) as lookup:
+        entry = cache.get(url) if cache else None
+        fresh = bool(entry and entry.is_fresh(CACHE_TTL[kind]))
+        lookup.set(hit=fresh)
+    if fresh:
+        cache.record('hits')
+        yield entry.body
+        return
+    
+    session = get_session()
+    headers = entry.validators() if entry else None
+    attempt = 0
+    age_confirmed = set()
+    while True:
+        page = session.iter_page(url, headers)
+        try:
+            try:
+                with tracing.span('javdb.request', url=url, attempt=attempt) as request:
+                    response = next(page)
+                    request.set(status=response.status_code, host=mirrors.base_of(response.url))
+            except Exception as e:
+                if not ratelimit.is_transient(e):
+                    raise
+                ratelimit.failure('javdb')
+                if attempt == ratelimit.MAX_RETRIES:
+                    raise
+                time.sleep(ratelimit.backoff(attempt))
+                attempt += 1
+                continue
+            
+            status = response.status_code
+            if status in ratelimit.RETRY_STATUS or status == 403:
+                ratelimit.failure('javdb')
+                if status == 403 or attempt == ratelimit.MAX_RETRIES:
+                    response.raise_for_status()
+                time.sleep(ratelimit.backoff(attempt, response.headers.get('Retry-After')))
+                attempt += 1
+                continue
+            ratelimit.success('javdb')
+            
+            if response.status_code == 304 and entry:
+                cache.touch(url)
+                yield entry.body
+                return
+            gate = GateBuffer(session, response)
+            for text in page:
+                if gate.feed(text):
+                    yield text
+        finally:
+            page.close()
+        
+        html = gate.html
+        if response.status_code == 200 and is_age_gate(html):
+            if gate.streaming:
+                # 已有 cookie 仍返回验证页，内容已产出，无法重新请求
+                return
+            # 在返回验证页的站点上确认年龄后重新请求（不带条件头，避免304拿回旧的验证页），每个站点一次
+            base = mirrors.base_of(response.url)
+            if base not in age_confirmed and session.confirm_age(html, base):
+                age_confirmed.add(base)
+                headers = None
+                continue
+            return
+        held = gate.held()
+        if held:
+            yield held
+        if response.status_code != 200:
+            return
+        if cache:
+            cache.put(
+                url, kind, html,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
             )
-            html = result.stdout
+        return
+
+def get_html(url: str, kind: str | None = None) -> str:
+    """获取完整页面HTML，自动处理年龄验证"""
+    return ''.join(iter_html(url, kind))
+
+def parse_page(url: str, kind: str, parser) -> list:
+    """
+    边下载边解析，parser 满足 limit 后停止解析
+    未启用缓存时同时中断读取剩余内容；启用缓存时读完页面以便写入缓存
+    """
+    chunks = iter_html(url, kind)
+    parsing = 0.0
+    try:
+        for chunk in chunks:
+            if parser.done:
+                if get_cache() is None:
+                    break
+                continue
+            start = time.perf_counter()
+            parser.feed(chunk)
+            parsing += time.perf_counter() - start
+        if not parser.done:
+            start = time.perf_counter()
+            parser.close()
+            parsing += time.perf_counter() - start
+    finally:
+        chunks.close()
+    # 解析与下载交替进行，只累计解析本身的耗时
+    tracing.record('javdb.parse', parsing, kind=kind)
+    return parser.items
+
+class StreamScanner:
+    """
+    增量扫描器基类：按块喂入HTML，在缓冲区中切出完整的片段（条目/行）后立即解析
+    只对单个片段运行小正则，不在整页上做DOTALL回溯；满足limit后 done 为True
+    """
+    
+    # 片段起始标记，子类覆盖
+    START = None
+    
+    def __init__(self, limit: int | None = None):
+        self.limit = limit
+        self.items = []
+        self._buffer = ''
     
-    return html
+    @property
+    def done(self) -> bool:
+        return self.limit is not None and len(self.items) >= self.limit
+    
+    def feed(self, chunk: str):
+        self._buffer += chunk
+        pos = 0
+        while not self.done:
+            start = self.START.search(self._buffer, pos)
+            if not start:
+                break
+            end = self._segment_end(start)
+            if end is None:
+                break
+            self.parse_segment(self._buffer[start.start():end])
+            pos = end
+        # 只保留尚未解析完的部分
+        start = self.START.search(self._buffer, pos)
+        self._buffer = self._buffer[start.start():] if start else self._buffer[-256:]
+    
+    def close(self):
+        """响应读取完毕，解析最后一个片段"""
+        start = self.START.search(self._buffer)
+        if start and not self.done:
+            self.parse_segment(self._buffer[start.start():])
+        self._buffer = ''
+    
+    def _segment_end(self, start) -> int | None:
+        raise NotImplementedError
+    
+    def parse_segment(self, segment: str):
+        raise NotImplementedError
 
-def search_javdb(keyword: str, limit: int = 10) -> list:
+class SearchResultParser(StreamScanner):
     """
-    搜索javdb并返回结果列表
-    返回: [{'code': 'ABC-123', 'title': '...', 'url': '...', 'date': '...'}, ...]
+    增量解析搜索结果页，每个条目的 </a> 到达后立即加入 items
+    <a href="/v/4DxWwZ" class="box" title="...">
+      <div class="video-title"><strong>HEYZO-3797</strong> 标题</div>
+      <div class="meta">2026-01-29</div>
+    </a>
     """
-    search_url = f"https://javdb.com/search?q={quote(keyword)}&f=all"
-    html = get_html(search_url)
     
-    items = []
+    START = re.compile(r'<a href="/v/[^"]+" class="box"')
+    NEXT_PAGE = re.compile(r'class="pagination-next"')
+    ITEM = re.compile(
+        r'<a href="(/v/[^"]+)".*?<div class="video-title"[^>]*>\s*<strong>([^<]+)</strong>([^<]*)'
+        r'.*?<div class="meta">\s*(\d{4}-\d{2}-\d{2})',
+        re.DOTALL
+    )
     
-    # 新的解析模式 - 匹配 item div 块
-    # <a href="/v/4DxWwZ" class="box" title="...">
-    #   <div class="video-title"><strong>HEYZO-3797</strong> 标题</div>
-    #   <div class="meta">2026-01-29</div>
+    def __init__(self, limit: int | None = None, base_url: str | None = None):
+        super().__init__(limit)
+        self.base_url = base_url or BASE_URL
+        # 页面中有"下一页"链接（在所有条目之后，满足limit提前停止时可能未读到）
+        self.has_next = False
     
-    item_pattern = r'<a href="(/v/[^"]+)" class="box"[^>]*>.*?<div class="video-title"[^>]*>\s*<strong>([^<]+)</strong>\s*([^<]*)</div>.*?<div class="meta">\s*(\d{4}-\d{2}-\d{2})\s*</div>'
+    def feed(self, chunk: str):
+        # 带上缓冲区末尾一段，跨块的标记也能找到
+        if not self.has_next and self.NEXT_PAGE.search(self._buffer[-64:] + chunk):
+            self.has_next = True
+        super().feed(chunk)
     
-    matches = re.findall(item_pattern, html, re.DOTALL)
+    def _segment_end(self, start) -> int | None:
+        end = self._buffer.find('</a>', start.end())
+        return None if end < 0 else end + 4
     
-    for match in matches[:limit]:
-        url_path, code, title, date = match
-        items.append({
-            'code': code.strip(),
-            'title': title.strip(),
-            'url': f"https://javdb.com{url_path}",
-            'date': date.strip()
+    def parse_segment(self, segment: str):
+        match = self.ITEM.match(segment)
+        if not match:
+            return
+        path, code, title, date = match.groups()
+        self.items.append({
+            'code': unescape(code).strip(),
+            'title': ' '.join(unescape(title).split()),
+            'url': f"{self.base_url}{path}",
+            'date': date,
         })
-    
-    return items
 
-def get_magnets(detail_url: str) -> list:
+class MagnetParser(StreamScanner):
     """
-    从详情页获取magnet链接
-    返回: [{'name': '...', 'size': '...', 'magnet': 'magnet:?...'}, ...]
+    增量解析详情页的磁力链接
+    以行（<tr> 或 <div class="item ...">）切分，每行内的磁链和大小成对解析，不再按列表下标配对
+    一行的结束以下一行的开始（或响应结束）为准
     """
-    html = get_html(detail_url)
-    magnets = []
     
-    # 匹配磁链 - 在 data-clipboard-text 属性中
-    # 以及对应的大小标签
+    START = re.compile(r'<tr[\s>]|<div class="item[\s"]')
+    # 以字面量开头便于正则引擎快速定位（磁链出现在 href 或 data-clipboard-text 中）
+    MAGNET = re.compile(r'"(magnet:\?xt=urn:btih:[^"]+)"')
+    NAME = re.compile(r'<span class="name">([^<]*)</span>')
+    TAG_TEXT = re.compile(r'<span[^>]*class="(?:meta|tag)[^"]*"[^>]*>([^<]+)</span>')
+    SIZE = re.compile(r'\d+(?:\.\d+)?\s*[KMGT]i?B', re.IGNORECASE)
     
-    # 方法1: 找所有包含magnet的行
-    row_pattern = r'<tr[^>]*>.*?data-clipboard-text="(magnet:\?xt=urn:btih:[^"]+)".*?<span[^>]*class="tag[^"]*"[^>]*>([^<]+)</span>.*?</tr>'
-    rows = re.findall(row_pattern, html, re.DOTALL)
+    def __init__(self, limit: int | None = None):
+        super().__init__(limit)
+        self._seen = set()
     
-    if rows:
-        for magnet, size in rows:
-            magnets.append({
-                'magnet': magnet.strip(),
-                'size': size.strip(),
-            })
-    else:
-        # 方法2: 直接提取所有magnet链接
-        simple_pattern = r'data-clipboard-text="(magnet:\?xt=urn:btih:[^"]+)"'
-        simple_magnets = re.findall(simple_pattern, html)
-        
-        # 尝试匹配大小
-        size_pattern = r'<span class="tag[^"]*is-success[^"]*">([^<]+)</span>'
-        sizes = re.findall(size_pattern, html)
-        
-        for i, m in enumerate(simple_magnets):
-            size = sizes[i] if i < len(sizes) else 'N/A'
-            magnets.append({
-                'magnet': m.strip(),
-                'size': size.strip(),
+    def _segment_end(self, start) -> int | None:
+        following = self.START.search(self._buffer, start.end())
+        return following.start() if following else None
+    
+    def parse_segment(self, segment: str):
+        # 同一行的 href 和复制按钮是同一个磁链
+        magnets = dict.fromkeys(self.MAGNET.findall(segment))
+        if not magnets:
+            return
+        
+        name = self.NAME.search(segment)
+        size = None
+        for tag_text in self.TAG_TEXT.finditer(segment):
+            size = self.SIZE.search(tag_text.group(1))
+            if size:
+                break
+        
+        # 行内其它磁链大小未知
+        for magnet in magnets:
+            magnet = unescape(magnet).strip()
+            info_hash = magnet_info_hash(magnet)
+            if self.done or info_hash in self._seen:
+                continue
+            self._seen.add(info_hash)
+            self.items.append({
+                'name': unescape(name.group(1)).strip() if name else '',
+                'size': size.group(0) if size else 'N/A',
+                'bytes': parse_size(size.group(0)) if size else None,
+                'magnet': magnet,
             })
+            name = size = None
+
+def search_url(keyword: str, page: int = 1) -> str:
+    url = f"{BASE_URL}/search?q={quote(keyword)}&f=all"
+    return url if page == 1 else f"{url}&page={page}"
+
+def search_page(keyword: str, page: int = 1, limit: int | None = None) -> tuple[list, bool]:
+    """获取一页搜索结果，返回 (条目, 是否还有下一页)"""
+    parser = SearchResultParser(limit)
+    items = parse_page(search_url(keyword, page), 'search', parser)
+    return items, parser.has_next
+
+def page_windows(pages: int | None, fanout: int):
+    """第2页起按 fanout 一批批产出页码范围；pages 为None时不设上限"""
+    start = 2
+    while pages is None or start <= pages:
+        stop = start + fanout if pages is None else min(start + fanout, pages + 1)
+        yield range(start, stop)
+        start = stop
+
+def merge_pages(items: list, seen: set, outcomes: list, limit: int | None) -> bool:
+    """
+    把一批页的 (条目, 是否有下一页) 按页序并入 items，同一番号只保留第一次出现
+    返回是否应停止翻页：遇到最后一页（空页或没有下一页）或已满足 limit
+    """
+    for found, has_next in outcomes:
+        for item in found:
+            key = item['code'].upper()
+            if key not in seen:
+                seen.add(key)
+                items.append(item)
+        if not found or not has_next:
+            return True
+    return limit is not None and len(items) >= limit
+
+def remember(items: list):
+    """搜索结果写入番号目录"""
+    catalog = get_catalog()
+    if catalog is not None and items:
+        catalog.add_many(items)
+
+def search_javdb(keyword: str, limit: int | None = 10, pages: int | None = 1) -> list:
+    """
+    搜索javdb并返回结果列表（按番号去重）
+    pages 为读取的结果页数，None 表示读到最后一页；第2页起每批并发请求 SEARCH_FANOUT 页
+    limit 为None时不限条数，满足 limit 后不再请求后面的页
+    返回: [{'code': 'ABC-123', 'title': '...', 'url': '...', 'date': '...'}, ...]
+    """
+    with tracing.span('javdb.search', keyword=keyword, pages=pages):
+        if use_daemon():
+            import daemon
+            
+            return daemon.call('javdb', 'search_javdb', keyword, limit, pages)
+        items, seen = [], set()
+        stop = merge_pages(items, seen, [search_page(keyword, 1, limit)], limit)
+        if not stop and pages != 1:
+            from concurrent.futures import ThreadPoolExecutor
+            from functools import partial
+            
+            with ThreadPoolExecutor(max_workers=SEARCH_FANOUT) as pool:
+                for window in page_windows(pages, SEARCH_FANOUT):
+                    if merge_pages(items, seen, list(pool.map(partial(search_page, keyword), window)), limit):
+                        break
+        remember(items)
+        return items[:limit]
+
+def get_magnets(detail_url: str, limit: int | None = None) -> list:
+    """
+    从详情页获取magnet链接
+    返回: [{'name': '...', 'size': '...', 'bytes': 字节数或None, 'magnet': 'magnet:?...'}, ...]
+    """
+    with tracing.span('javdb.magnets', url=detail_url):
+        if use_daemon():
+            import daemon
+            
+            return daemon.call('javdb', 'get_magnets', detail_url, limit)
+        return parse_page(detail_url, 'detail', MagnetParser(limit))
+
+def rank_magnets(magnets: list, chosen: int = 0) -> list:
+    """
+    下载候选顺序：选中的磁链（默认为详情页上的第一个）在前，其余按大小降序，大小未知的排在最后
+    前一个下载失败或停滞时依次换用后面的
+    """
+    if not magnets:
+        return []
+    rest = magnets[:chosen] + magnets[chosen + 1:]
+    return [magnets[chosen]] + sorted(rest, key=lambda m: -(m.get('bytes') or -1))
+
+def lookup_code(code: str) -> dict | None:
+    """
+    番号 → 详情页 → 磁力链接，番号目录中已有的番号不再搜索
+    返回: {'code': ..., 'title': ..., 'url': ..., 'date': ..., 'magnets': [...]}，未找到返回None
+    """
+    item = catalog_lookup(code)
+    if item is None:
+        results = search_javdb(code, 1)
+        if not results:
+            return None
+        item = dict(results[0])
     
-    return magnets
+    item['magnets'] = get_magnets(item['url'])
+    return item
+
+def catalog_lookup(code: str) -> dict | None:
+    """从番号目录查询，返回与搜索结果相同的结构 {'code', 'title', 'url', 'date'}"""
+    catalog = get_catalog()
+    if catalog is None:
+        return None
+    with tracing.span('javdb.catalog', code=code) as lookup:
+        entry = catalog.get(code)
+        lookup.set(hit=entry is not None)
+    if entry is None:
+        return None
+    return {'code': entry['code'], 'title': entry['title'], 'url': f"{BASE_URL}{entry['path']}", 'date': entry['date']}
 
 @click.group()
-def cli():
+@click.option('--no-cache', is_flag=True, help='不使用本地缓存')
+@tracing.options
+def cli(no_cache):
     """javdb.com 搜索工具"""
-    pass
+    if no_cache:
+        disable_cache()
 
 @cli.command()
-@click.argument('keyword')
-@click.option('--limit', '-n', default=10, help='结果数量')
+@click.argument('keywords', nargs=-1, required=True)
+@click.option('--limit', '-n', type=int, help='每个关键词的结果数量（默认10，翻页时不限；0为不限）')
+@click.option('--pages', '-p', default=1, help='读取的结果页数')
+@click.option('--all', 'all_pages', is_flag=True, help='读取所有结果页')
+@click.option('--concurrency', '-c', default=8, help='多个关键词/结果页时的最大并发请求数')
+@click.option('--timeout', '-t', default=30.0, help='单个请求的超时（秒）')
 @click.option('--json-output', '-j', is_flag=True, help='JSON输出')
-def search(keyword, limit, json_output):
-    """搜索影片"""
+def search(keywords, limit, pages, all_pages, concurrency, timeout, json_output):
+    """搜索影片（多个关键词、多个结果页并发请求，结果按顺序合并去重）"""
     if not json_output:
-        console.print(f"[cyan]搜索: {keyword}[/cyan]")
+        console.print(f"[cyan]搜索: {', '.join(keywords)}[/cyan]")
     
-    try:
-        results = search_javdb(keyword, limit)
-        
-        if not results:
-            if not json_output:
-                console.print("[yellow]未找到结果[/yellow]")
-            else:
-                print("[]")
-            return
-        
-        if json_output:
-            print(json.dumps(results, indent=2, ensure_ascii=False))
+    import aioengine
+    
+    pages = None if all_pages else max(1, pages)
+    if limit is None:
+        limit = 10 if pages == 1 else None
+    groups = aioengine.run(aioengine.search_many(list(keywords), limit or None, concurrency, timeout, pages))
+    for group in groups:
+        if group['error']:
+            report_error(f"搜索失败: {group['keyword']}: {group['error']}", json_output)
+    if all(group['error'] for group in groups):
+        return
+    
+    multiple = len(keywords) > 1
+    results = aioengine.merge_results(groups) if multiple else groups[0]['results']
+    if not results:
+        if not json_output:
+            console.print("[yellow]未找到结果[/yellow]")
         else:
-            table = Table(title=f"搜索结果: {keyword}")
-            table.add_column("#", style="dim", width=3)
-            table.add_column("番号", style="cyan")
-            table.add_column("标题", max_width=40)
-            table.add_column("日期", style="blue")
-            
-            for i, item in enumerate(results, 1):
-                table.add_row(
-                    str(i),
-                    item['code'],
-                    item['title'][:40],
-                    item['date']
-                )
-            
-            console.print(table)
-            console.print(f"\n使用 [cyan]javdb magnet <番号>[/cyan] 获取磁力链接")
-    except Exception as e:
-        console.print(f"[red]搜索失败: {e}[/red]")
+            print("[]")
+        return
+    
+    if json_output:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    
+    from rich.table import Table
+    
+    table = Table(title=f"搜索结果: {', '.join(keywords)}")
+    table.add_column("#", style="dim", width=3)
+    if multiple:
+        table.add_column("关键词", style="magenta")
+    table.add_column("番号", style="cyan")
+    table.add_column("标题", max_width=40)
+    table.add_column("日期", style="blue")
+    
+    for i, item in enumerate(results, 1):
+        table.add_row(
+            str(i),
+            *([item['keyword']] if multiple else []),
+            item['code'],
+            item['title'][:40],
+            item['date']
+        )
+    
+    console.print(table)
+    console.print(f"\n使用 [cyan]javdb magnet <番号>[/cyan] 获取磁力链接")
+
+def report_error(message: str, json_output: bool):
+    """JSON模式下错误写到stderr，避免混入输出"""
+    if json_output:
+        click.echo(message, err=True)
+    else:
+        from rich.markup import escape
+        
+        console.print(f"[red]{escape(message)}[/red]")
 
 @cli.command()
-@click.argument('code')
+@click.argument('codes', nargs=-1, required=True)
 @click.option('--json-output', '-j', is_flag=True, help='JSON输出')
-@click.option('--first', '-1', is_flag=True, help='只返回第一个磁力链接')
-def magnet(code, json_output, first):
-    """获取指定番号的磁力链接"""
-    if not json_output and not first:
-        console.print(f"[cyan]获取磁力链接: {code}[/cyan]")
+@click.option('--first', '-1', is_flag=True, help='每个番号只输出第一个磁力链接')
+@click.option('--concurrency', '-c', default=8, help='多个番号时的最大并发请求数')
+@click.option('--timeout', '-t', default=30.0, help='单个请求的超时（秒）')
+def magnet(codes, json_output, first, concurrency, timeout):
+    """获取指定番号的磁力链接（多个番号并发查询）"""
+    quiet = json_output or first
+    if not quiet:
+        console.print(f"[cyan]获取磁力链接: {', '.join(codes)}[/cyan]")
     
-    try:
-        # 先搜索获取详情页URL
-        results = search_javdb(code, 1)
-        
-        if not results:
-            if not json_output and not first:
-                console.print("[yellow]未找到该番号[/yellow]")
-            return
+    import aioengine
+    
+    outcomes = aioengine.run(aioengine.lookup_many(list(codes), concurrency, timeout))
+    if json_output and len(codes) > 1:
+        print(json.dumps([
+            {
+                'code': o['code'],
+                'url': o['item']['url'] if o['item'] else None,
+                'magnets': o['item']['magnets'] if o['item'] else [],
+                'error': o['error'] or (None if o['item'] else '未找到该番号'),
+            }
+            for o in outcomes
+        ], indent=2, ensure_ascii=False))
+        return
+    
+    for outcome in outcomes:
+        code, item = outcome['code'], outcome['item']
+        if outcome['error']:
+            report_error(f"获取失败: {code}: {outcome['error']}", quiet)
+            continue
+        if not item:
+            if not quiet:
+                console.print(f"[yellow]未找到该番号: {code}[/yellow]")
+            continue
         
-        detail_url = results[0]['url']
-        if not json_output and not first:
-            console.print(f"[dim]详情页: {detail_url}[/dim]")
+        if not quiet:
+            console.print(f"[dim]详情页: {item['url']}[/dim]")
         
-        magnets_list = get_magnets(detail_url)
+        magnets_list = item['magnets']
         
         if not magnets_list:
-            if not json_output and not first:
+            if not quiet:
                 console.print("[yellow]未找到磁力链接（可能需要登录）[/yellow]")
-            return
+            continue
         
         if first:
             # 只输出第一个magnet链接（方便管道使用）
             print(magnets_list[0]['magnet'])
-            return
+            continue
         
         if json_output:
             print(json.dumps(magnets_list, indent=2, ensure_ascii=False))
-        else:
-            table = Table(title=f"磁力链接: {code}")
-            table.add_column("#", style="dim", width=3)
-            table.add_column("大小", style="green", width=12)
-            table.add_column("磁力链接", max_width=60)
-            
-            for i, m in enumerate(magnets_list, 1):
-                table.add_row(
-                    str(i),
-                    m['size'],
-                    m['magnet'][:60] + '...' if len(m['magnet']) > 60 else m['magnet']
-                )
-            
-            console.print(table)
-    except Exception as e:
-        console.print(f"[red]获取失败: {e}[/red]")
+            continue
+        
+        from rich.table import Table
+        
+        table = Table(title=f"磁力链接: {code}")
+        table.add_column("#", style="dim", width=3)
+        table.add_column("大小", style="green", width=12)
+        table.add_column("磁力链接", max_width=60)
+        
+        for i, m in enumerate(magnets_list, 1):
+            table.add_row(
+                str(i),
+                m['size'],
+                m['magnet'][:60] + '...' if len(m['magnet']) > 60 else m['magnet']
+            )
+        
+        console.print(table)
+
+@cli.group()
+def cache():
+    """本地页面缓存管理"""
+    pass
+
+@cache.command()
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出')
+def stats(json_output):
+    """查看缓存统计"""
+    from httpcache import ResponseCache
+    
+    info = ResponseCache().stats()
+    
+    if json_output:
+        print(json.dumps(info, indent=2, ensure_ascii=False))
+        return
+    
+    lookups = info['hits'] + info['misses']
+    hit_rate = f"{info['hits'] / lookups * 100:.1f}%" if lookups else '-'
+    console.print(f"缓存文件: {info['path']}")
+    console.print(f"条目: {info['entries']}  大小: {info['size'] / 1024 / 1024:.1f}MB / {info['max_size'] / 1024 / 1024:.0f}MB")
+    for kind, k in sorted(info['kinds'].items()):
+        console.print(f"  {kind}: {k['entries']} 条, {k['size'] / 1024:.0f}KB")
+    console.print(f"命中: {info['hits']}  未命中: {info['misses']}  命中率: {hit_rate}")
+    console.print(f"重新验证: {info['revalidated']}  淘汰: {info['evicted']}")
+
+@cache.command()
+@click.option('--kind', type=click.Choice(['search', 'detail']), help='只清除某类页面')
+@click.option('--expired', is_flag=True, help='只清除已过期的条目')
+def clear(kind, expired):
+    """清空缓存"""
+    from httpcache import ResponseCache
+    
+    response_cache = ResponseCache()
+    if expired:
+        kinds = [kind] if kind else list(CACHE_TTL)
+        deleted = sum(response_cache.clear(k, older_than=CACHE_TTL[k]) for k in kinds)
+    else:
+        deleted = response_cache.clear(kind)
+    console.print(f"[green]已清除 {deleted} 条缓存[/green]")
+
+@cli.group()
+def catalog():
+    """番号目录（番号 → 详情页，来自搜索结果，永不过期）"""
+    pass
+
+@catalog.command('stats')
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出')
+def catalog_stats(json_output):
+    """查看番号目录统计"""
+    from catalog import Catalog
+    
+    info = Catalog().stats()
+    if json_output:
+        print(json.dumps(info, indent=2, ensure_ascii=False))
+        return
+    console.print(f"目录文件: {info['path']}")
+    console.print(f"番号: {info['entries']}")
+
+@catalog.command('clear')
+def catalog_clear():
+    """清空番号目录"""
+    from catalog import Catalog
+    
+    deleted = Catalog().clear()
+    console.print(f"[green]已清除 {deleted} 个番号[/green]")
+
+@cli.command('mirrors')
+@click.option('--json-output', '-j', is_flag=True, help='JSON输出')
+def mirrors_status(json_output):
+    """查看镜像站点的耗时、失败和对冲统计（镜像由 JAVDB_MIRRORS 或 ~/.115cli/javdb_mirrors.txt 配置）"""
+    bases = mirrors.configured() or [BASE_URL]
+    report = mirrors.get_tracker().status(bases)
+    if json_output:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+    
+    from rich.table import Table
+    
+    table = Table(title="javdb站点")
+    table.add_column("站点", style="cyan")
+    table.add_column("样本", justify="right")
+    table.add_column("p50", justify="right")
+    table.add_column("p90", justify="right")
+    table.add_column("连续失败", justify="right")
+    table.add_column("状态")
+    table.add_column("请求数", justify="right")
+    table.add_column("对冲", justify="right")
+    for info in report:
+        state = f"[red]冷却 {info['cooldown']:.0f}s[/red]" if info['cooldown'] else '[green]正常[/green]'
+        table.add_row(
+            info['base'], str(info['samples']),
+            f"{info['p50']:.2f}s" if info['p50'] is not None else '-',
+            f"{info['p90']:.2f}s" if info['p90'] is not None else '-',
+            str(info['failures']), state, str(info['requests']), str(info['hedges'])
+        )
+    console.print(table)
+    if len(bases) == 1:
+        console.print("[dim]未配置镜像，只使用默认站点[/dim]")
 
 if __name__ == '__main__':
     cli()
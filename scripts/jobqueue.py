@@ -0,0 +1,507 @@
+"""
+jobqueue - 持久化的 番号 → 云下载 作业队列
+保存在 ~/.115cli/jobs.db（SQLite WAL），每个番号一条作业，按阶段推进：
+  resolve（解析磁链）→ submit（查重并分块提交）→ downloading（等待下载）→ postprocess（后续操作）→ done / failed
+`jav115 queue run` 每个阶段有独立的并发上限；作业被领取时记下进程ID，进程退出（包括被杀）后由下一次运行释放。
+每个阶段都可以重复执行：提交过的作业再次提交前先在任务列表中查找（提交后崩溃时115中已有任务），
+115 返回“任务已存在”时也直接接管该任务，不会因重复提交而失败
+解析时保留排好序的备选磁链；下载失败或停滞时删除任务，下一个备选回到 submit 阶段（见 failover）
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import failover
+import tracing
+
+JOBS_FILE = Path.home() / ".115cli" / "jobs.db"
+
+# 未结束的阶段（按顺序）和结束状态
+STAGES = ['resolve', 'submit', 'downloading', 'postprocess']
+FINAL_STAGES = ['done', 'failed']
+# 临时错误（网络、限速）在同一阶段自动重试的次数和首次等待秒数（之后翻倍）
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class JobQueue:
+    """线程安全、可多进程共用的作业队列"""
+
+    COLUMNS = ('id', 'code', 'stage', 'save_cid', 'actions', 'force', 'magnet', 'size', 'info_hash', 'candidates',
+               'submitted', 'task', 'results', 'error', 'failed_stage', 'attempts', 'not_before', 'owner',
+               'created', 'updated')
+
+    def __init__(self, path: Path = JOBS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                code TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                stage TEXT NOT NULL DEFAULT 'resolve',
+                save_cid INTEGER NOT NULL DEFAULT 0,
+                actions TEXT NOT NULL DEFAULT '{}',
+                force INTEGER NOT NULL DEFAULT 0,
+                magnet TEXT,
+                size TEXT,
+                info_hash TEXT,
+                candidates TEXT,
+                submitted REAL,
+                task TEXT,
+                results TEXT,
+                error TEXT,
+                failed_stage TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                not_before REAL NOT NULL DEFAULT 0,
+                owner INTEGER,
+                lease TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_stage ON jobs(stage, owner, not_before);
+            CREATE INDEX IF NOT EXISTS jobs_lease ON jobs(lease);
+        ''')
+        # 旧版本创建的队列没有备选磁链和提交时间
+        columns = {row[1] for row in self.db.execute('PRAGMA table_info(jobs)')}
+        if 'candidates' not in columns:
+            self.db.execute('ALTER TABLE jobs ADD COLUMN candidates TEXT')
+        if 'submitted' not in columns:
+            self.db.execute('ALTER TABLE jobs ADD COLUMN submitted REAL')
+        self.db.commit()
+
+    def _rows(self, sql: str, params=()) -> list:
+        rows = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs {sql}", params).fetchall()
+        jobs = []
+        for row in rows:
+            job = dict(zip(self.COLUMNS, row))
+            job['actions'] = json.loads(job['actions'])
+            job['force'] = bool(job['force'])
+            job['task'] = json.loads(job['task']) if job['task'] else None
+            job['results'] = json.loads(job['results']) if job['results'] else []
+            job['candidates'] = json.loads(job['candidates']) if job['candidates'] else []
+            jobs.append(job)
+        return jobs
+
+    def add(self, codes: list, save_cid: int = 0, actions: dict | None = None, force: bool = False) -> list:
+        """加入作业，已在队列中的番号跳过，返回新加入的番号"""
+        now = time.time()
+        added = []
+        with self._lock, self.db:
+            for code in codes:
+                cursor = self.db.execute(
+                    'INSERT OR IGNORE INTO jobs (code, save_cid, actions, force, created, updated) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (code, save_cid, json.dumps(actions or {}), int(force), now, now)
+                )
+                if cursor.rowcount:
+                    added.append(code)
+        return added
+
+    def claim(self, stage: str, limit: int | None = None) -> list:
+        """领取某阶段中可执行的作业（未被占用、已过重试等待时间），按加入顺序"""
+        lease = os.urandom(8).hex()
+        with self._lock, self.db:
+            # 单条UPDATE完成领取，多个进程同时运行也不会领到同一条
+            self.db.execute(
+                'UPDATE jobs SET owner = ?, lease = ? WHERE id IN ('
+                '  SELECT id FROM jobs WHERE stage = ? AND owner IS NULL AND not_before <= ? ORDER BY id LIMIT ?'
+                ')',
+                (os.getpid(), lease, stage, time.time(), -1 if limit is None else limit)
+            )
+            return self._rows('WHERE lease = ? ORDER BY id', (lease,))
+
+    def advance(self, job_id: int, stage: str, **fields):
+        """进入下一阶段并释放作业；fields 为要更新的列（task/results/candidates 自动转为JSON）"""
+        for key in ('task', 'results', 'candidates'):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        fields.update(stage=stage, owner=None, lease=None, attempts=0, not_before=0, updated=time.time())
+        fields.setdefault('error', None)
+        with self._lock, self.db:
+            self.db.execute(
+                f"UPDATE jobs SET {', '.join(f'{key} = ?' for key in fields)} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def fail(self, job: dict, error: str, transient: bool = False, failed_stage: str | None = None,
+             results: list | None = None) -> bool:
+        """
+        作业出错：临时错误且未超过重试次数时留在原阶段稍后重试（返回True），否则标记为失败
+        failed_stage 为 retry 时重新开始的阶段，默认是出错的阶段
+        """
+        now = time.time()
+        attempts = job['attempts'] + 1
+        with self._lock, self.db:
+            if transient and attempts < MAX_ATTEMPTS:
+                self.db.execute(
+                    'UPDATE jobs SET owner = NULL, lease = NULL, attempts = ?, not_before = ?, error = ?, updated = ? '
+                    'WHERE id = ?',
+                    (attempts, now + RETRY_DELAY * 2 ** (attempts - 1), error, now, job['id'])
+                )
+                return True
+            self.db.execute(
+                "UPDATE jobs SET stage = 'failed', failed_stage = ?, owner = NULL, lease = NULL, attempts = ?, "
+                'error = ?, results = ?, updated = ? WHERE id = ?',
+                (failed_stage or job['stage'], attempts, error,
+                 json.dumps(results or [], ensure_ascii=False), now, job['id'])
+            )
+        return False
+
+    def mark_submitted(self, job_ids: list):
+        """记下提交时间：之后作业若仍停在 submit 阶段（提交后崩溃），115 中可能已有它的任务"""
+        now = time.time()
+        with self._lock, self.db:
+            self.db.executemany('UPDATE jobs SET submitted = ? WHERE id = ?', [(now, job_id) for job_id in job_ids])
+
+    def owned(self, job_id: int) -> bool:
+        """作业是否仍被本进程占用（advance/fail 之后即释放）"""
+        with self._lock:
+            row = self.db.execute('SELECT owner FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return row is not None and row[0] == os.getpid()
+
+    def release(self, pid: int | None = None) -> int:
+        """释放某进程占用的作业（默认本进程），阶段不变"""
+        with self._lock, self.db:
+            return self.db.execute(
+                'UPDATE jobs SET owner = NULL, lease = NULL WHERE owner = ?', (pid or os.getpid(),)
+            ).rowcount
+
+    def release_orphans(self) -> int:
+        """释放已退出的进程占用的作业（进程被杀或崩溃时留下的）"""
+        with self._lock:
+            owners = [row[0] for row in self.db.execute('SELECT DISTINCT owner FROM jobs WHERE owner IS NOT NULL')]
+        return sum(self.release(pid) for pid in owners if pid != os.getpid() and not pid_alive(pid))
+
+    def retry(self, code: str | None = None) -> int:
+        """失败的作业从出错的阶段重新开始，返回条数"""
+        sql = ("UPDATE jobs SET stage = COALESCE(failed_stage, 'resolve'), failed_stage = NULL, attempts = 0, "
+               "not_before = 0, error = NULL, updated = ? WHERE stage = 'failed'")
+        params = [time.time()]
+        if code:
+            sql += ' AND code = ?'
+            params.append(code)
+        with self._lock, self.db:
+            return self.db.execute(sql, params).rowcount
+
+    def waiting(self) -> int:
+        """未结束且未被占用的作业数（包括等待重试的）"""
+        with self._lock:
+            return self.db.execute(
+                f"SELECT COUNT(*) FROM jobs WHERE owner IS NULL AND stage IN ({', '.join('?' * len(STAGES))})",
+                STAGES
+            ).fetchone()[0]
+
+    def counts(self) -> dict:
+        """各阶段的作业数"""
+        with self._lock:
+            counts = dict(self.db.execute('SELECT stage, COUNT(*) FROM jobs GROUP BY stage'))
+        return {stage: counts.get(stage, 0) for stage in STAGES + FINAL_STAGES}
+
+    def list(self, stage: str | None = None, limit: int | None = 50) -> list:
+        sql = 'WHERE stage = ?' if stage else ''
+        params = [stage] if stage else []
+        sql += ' ORDER BY updated DESC LIMIT ?'
+        params.append(-1 if limit is None else limit)
+        with self._lock:
+            return self._rows(sql, params)
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+def resolve_job(queue: JobQueue, job: dict) -> tuple:
+    """番号 → 首选磁力链接和备选磁链，返回 (新阶段, 错误)"""
+    import javdb
+
+    try:
+        with tracing.span('queue.resolve', code=job['code']):
+            item = javdb.lookup_code(job['code'])
+    except Exception as e:
+        error = f'解析失败: {e}'
+        return ('resolve' if queue.fail(job, error, transient=True) else 'failed'), error
+    if not item or not item['magnets']:
+        error = '未找到该番号' if not item else '未找到磁力链接'
+        queue.fail(job, error)
+        return 'failed', error
+    first, *alternates = failover.candidates(item['magnets'])
+    queue.advance(
+        job['id'], 'submit', magnet=first['magnet'], size=first['size'],
+        info_hash=javdb.magnet_info_hash(first['magnet']), candidates=alternates
+    )
+    return 'submit', None
+
+def adopt_submitted(client, queue: JobQueue, jobs: list) -> tuple:
+    """
+    之前提交过的作业（提交后、记录结果前崩溃）先在任务列表中按 info_hash 查找，找到的直接接管进入 downloading
+    已知任务要隔一段时间才刷新，查重看不到刚提交的任务，所以这里直接翻任务列表（读到提交时间之前即停止）
+    返回 (接管的转换列表, 剩下的作业)
+    """
+    from cli import index_tasks, remember_submitted
+
+    resumed = [job for job in jobs if job['submitted'] and job['info_hash']]
+    if not resumed:
+        return [], jobs
+    wanted = {job['info_hash'].lower() for job in resumed}
+    # 留出本机与115服务器的时钟误差
+    since = min(job['submitted'] for job in resumed) - 600
+    with tracing.span('queue.adopt', count=len(resumed)):
+        tasks = index_tasks(client, wanted, since)
+    transitions, rest, adopted = [], [], {}
+    for job in jobs:
+        info_hash = (job['info_hash'] or '').lower()
+        if job['submitted'] and info_hash in tasks:
+            queue.advance(job['id'], 'downloading', info_hash=info_hash)
+            adopted[info_hash] = job['code']
+            transitions.append((job, 'downloading', None))
+        else:
+            rest.append(job)
+    if adopted:
+        remember_submitted(client, adopted)
+    return transitions, rest
+
+def submit_jobs(client, queue: JobQueue, jobs: list) -> list:
+    """
+    查重后按保存目录分块提交，返回 [(作业, 新阶段, 错误), ...]
+    已存在同一磁链的任务（包括本作业崩溃前提交的）直接接管进入 downloading；网盘中已有文件的直接完成
+    """
+    from cli import find_duplicate, describe_duplicate, index_ready, offline_add_magnets, remember_submitted
+
+    transitions, jobs = adopt_submitted(client, queue, jobs)
+    use_index = index_ready()
+    pending = []
+    for job in jobs:
+        if job['force']:
+            pending.append(job)
+            continue
+        try:
+            duplicate = find_duplicate(client, job['magnet'], job['code'], job['size'], use_index)
+        except Exception as e:
+            error = f'查重失败: {e}'
+            transitions.append((job, 'submit' if queue.fail(job, error, transient=True) else 'failed', error))
+            continue
+        if duplicate and duplicate['reason'] == 'task':
+            queue.advance(job['id'], 'downloading', info_hash=duplicate['info_hash'] or job['info_hash'])
+            transitions.append((job, 'downloading', None))
+        elif duplicate:
+            queue.advance(job['id'], 'done', results=[{'action': None, 'message': describe_duplicate(duplicate)}])
+            transitions.append((job, 'done', None))
+        else:
+            pending.append(job)
+
+    by_cid = {}
+    for job in pending:
+        by_cid.setdefault(job['save_cid'], []).append(job)
+    for save_cid, group in by_cid.items():
+        queue.mark_submitted([job['id'] for job in group])
+        try:
+            with tracing.span('queue.submit', count=len(group)):
+                outcomes = offline_add_magnets(client, [job['magnet'] for job in group], save_cid)
+        except Exception as e:
+            error = f'提交失败: {e}'
+            for job in group:
+                transitions.append((job, 'submit' if queue.fail(job, error, transient=True) else 'failed', error))
+            continue
+        submitted = {}
+        for job, outcome in zip(group, outcomes):
+            if outcome['state'] or outcome['exists']:
+                # 任务已存在（如崩溃前已提交）：接管已有的任务
+                info_hash = outcome['info_hash'] or job['info_hash']
+                queue.advance(job['id'], 'downloading', info_hash=info_hash)
+                submitted[info_hash] = job['code']
+                transitions.append((job, 'downloading', None))
+            else:
+                error = f"提交失败: {outcome['error']}"
+                queue.fail(job, error)
+                transitions.append((job, 'failed', error))
+        remember_submitted(client, submitted)
+    return transitions
+
+def failover_job(client, queue: JobQueue, job: dict, event: str) -> tuple:
+    """下载失败或停滞：删除任务，下一个备选磁链回到 submit 阶段，返回 (新阶段, 说明)"""
+    from dedupe import magnet_info_hash
+
+    reason = failover.describe(event)
+    try:
+        failover.drop_task(client, job['info_hash'], job['code'])
+    except Exception as e:
+        error = f'{reason}，{e}'
+        return ('downloading' if queue.fail(job, error, transient=True) else 'failed'), error
+    candidate, *rest = job['candidates']
+    queue.advance(
+        job['id'], 'submit', magnet=candidate['magnet'], size=candidate['size'],
+        info_hash=magnet_info_hash(candidate['magnet']), candidates=rest, submitted=None
+    )
+    return 'submit', f"{reason}，换用备选磁链 {candidate['size']}（还剩 {len(rest)} 个）"
+
+def postprocess_job(client, queue: JobQueue, job: dict) -> tuple:
+    """执行登记的后续操作，返回 (新阶段, 错误)"""
+    import pipeline
+
+    entry = {'code': job['code'], 'actions': job['actions']}
+    status, results = pipeline.process_task(client, job['info_hash'], entry, job['task'])
+    if status == 'done':
+        queue.advance(job['id'], 'done', results=results)
+        return 'done', None
+    error = next((r['error'] for r in results if r.get('error')), '后续操作失败')
+    queue.fail(job, error, results=results)
+    return 'failed', error
+
+def run(client, queue: JobQueue, resolve_workers: int = 4, chunk_size: int = 15, post_workers: int = 2,
+        follow: bool = False, timeout: float | None = None, min_interval: float = 3, max_interval: float = 60,
+        stall_after: float | None = failover.STALL_AFTER, on_event=None) -> dict:
+    """
+    处理队列直到没有未结束的作业（follow=True 时持续运行，接收之后加入的作业），或超过 timeout 秒
+    - resolve:     resolve_workers 个线程并发解析
+    - submit:      一个线程，每次最多 chunk_size 个磁链一次请求提交
+    - downloading: 一个 TaskWatcher 同时监视所有下载中的作业，每轮一次 offline_list；
+                   失败或进度 stall_after 秒没有变化、且还有备选磁链的作业换用下一个磁链
+    - postprocess: post_workers 个线程并发执行
+    on_event(job, stage, error) 在作业进入新阶段时调用
+    返回本次运行中完成和失败的作业数: {'done': n, 'failed': n}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from cli import TaskWatcher
+
+    counts = {'done': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+
+    def emit(job, stage, error=None):
+        if stage in counts:
+            with counts_lock:
+                counts[stage] += 1
+        if on_event:
+            on_event(job, stage, error)
+
+    def crashed(job, e):
+        # 阶段函数中未处理的意外错误：记下错误并释放作业稍后重试，不让作业一直被占用；已推进的作业不受影响
+        if not queue.owned(job['id']):
+            return
+        error = f'{type(e).__name__}: {e}'
+        emit(job, job['stage'] if queue.fail(job, error, transient=True) else 'failed', error)
+
+    def do_resolve(job):
+        try:
+            emit(job, *resolve_job(queue, job))
+        except Exception as e:
+            crashed(job, e)
+
+    def do_submit(jobs):
+        try:
+            transitions = submit_jobs(client, queue, jobs)
+        except Exception as e:
+            for job in jobs:
+                crashed(job, e)
+            return
+        for transition in transitions:
+            emit(*transition)
+
+    def do_postprocess(job):
+        try:
+            emit(job, *postprocess_job(client, queue, job))
+        except Exception as e:
+            crashed(job, e)
+
+    queue.release_orphans()
+    pools = {
+        'resolve': ThreadPoolExecutor(max_workers=max(1, resolve_workers), thread_name_prefix='resolve'),
+        'submit': ThreadPoolExecutor(max_workers=1, thread_name_prefix='submit'),
+        'postprocess': ThreadPoolExecutor(max_workers=max(1, post_workers), thread_name_prefix='postprocess'),
+    }
+    limits = {'resolve': max(1, resolve_workers), 'submit': 1, 'postprocess': max(1, post_workers)}
+    inflight = {stage: set() for stage in pools}
+    watcher = TaskWatcher(client, [], min_interval, max_interval, stall_after)
+    watching = {}
+    next_poll = 0.0
+    start = time.time()
+    try:
+        while True:
+            for futures in inflight.values():
+                futures.difference_update([f for f in futures if f.done()])
+
+            for stage, pool in pools.items():
+                free = limits[stage] - len(inflight[stage])
+                if free <= 0:
+                    continue
+                if stage == 'submit':
+                    jobs = queue.claim(stage, max(1, chunk_size))
+                    if jobs:
+                        inflight[stage].add(pool.submit(do_submit, jobs))
+                    continue
+                handler = do_resolve if stage == 'resolve' else do_postprocess
+                for job in queue.claim(stage, free):
+                    inflight[stage].add(pool.submit(handler, job))
+
+            for job in queue.claim('downloading'):
+                if not job['info_hash']:
+                    queue.fail(job, '没有 info_hash', failed_stage='submit')
+                    emit(job, 'failed', '没有 info_hash')
+                    continue
+                watching[job['info_hash'].lower()] = job
+                watcher.add([job['info_hash']])
+
+            now = time.time()
+            if watching and now >= next_poll:
+                try:
+                    with tracing.span('queue.poll', count=len(watching)):
+                        events = watcher.poll()
+                except Exception as e:
+                    # 查询任务列表失败不影响作业，下一轮再查
+                    events = []
+                    if on_event:
+                        on_event(None, 'downloading', f'查询任务失败: {e}')
+                for event in events:
+                    job = watching.get(event['info_hash'])
+                    if job is None or event['event'] == 'progress':
+                        continue
+                    if event['event'] == 'stalled' and not job['candidates']:
+                        # 没有备选时继续等待
+                        continue
+                    del watching[event['info_hash']]
+                    if event['event'] == 'completed':
+                        stage = 'postprocess' if job['actions'] else 'done'
+                        queue.advance(job['id'], stage, task=event['task'])
+                        emit(job, stage)
+                    elif event['event'] != 'missing' and job['candidates']:
+                        watcher.discard(event['info_hash'])
+                        emit(job, *failover_job(client, queue, job, event['event']))
+                    else:
+                        # 下载失败或任务被删除：retry 时重新提交
+                        error = '任务不存在' if event['event'] == 'missing' else '下载失败'
+                        queue.fail(job, error, failed_stage='submit')
+                        emit(job, 'failed', error)
+                next_poll = time.time() + watcher.interval
+
+            busy = any(inflight.values())
+            if not follow and not busy and not watching and not queue.waiting():
+                break
+            elapsed = time.time() - start
+            if timeout is not None and elapsed >= timeout:
+                break
+            # 有作业在执行时频繁检查新阶段的作业，否则按轮询间隔等待（最长1秒，以便发现新加入的作业）
+            delay = 0.1 if busy else 1.0
+            if watching:
+                delay = min(delay, max(0.1, next_poll - time.time()))
+            if timeout is not None:
+                delay = min(delay, max(0.0, timeout - elapsed))
+            time.sleep(delay)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+        # 未完成的作业（等待中的下载、被取消的）留在原阶段，下次运行继续
+        queue.release()
+    return counts
@@ -0,0 +1,60 @@
+"""
+lazy - 延迟加载工具，缩短命令行启动时间
+rich 的 Console 在第一次输出时才导入；子命令所在模块在真正调用时才导入
+"""
+
+import importlib
+
+import click
+
+class LazyConsole:
+    """第一次使用时才创建的 rich Console"""
+
+    def __init__(self, **kwargs):
+        self._kwargs = kwargs
+        self._console = None
+
+    @property
+    def instance(self):
+        """真正的 Console 对象（传给 rich 的 Progress 等组件时使用）"""
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console(**self._kwargs)
+        return self._console
+
+    def __getattr__(self, name):
+        return getattr(self.instance, name)
+
+class LazyGroup(click.Group):
+    """
+    子命令按需导入的 click 命令组
+    lazy_commands: {命令名: ('模块名', '属性名', '简短帮助')}，--help 只显示简短帮助，不导入模块
+    """
+
+    def __init__(self, *args, lazy_commands: dict | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module, attr, _ = self.lazy_commands[cmd_name]
+            command = getattr(importlib.import_module(module), attr)
+            self.add_command(command, cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def format_commands(self, ctx, formatter):
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                command = self.commands[name]
+                if command.hidden:
+                    continue
+                rows.append((name, command.get_short_help_str(formatter.width - 6 - len(name))))
+            else:
+                rows.append((name, self.lazy_commands[name][2]))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
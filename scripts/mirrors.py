@@ -0,0 +1,192 @@
+"""
+mirrors - javdb镜像站点的选择与对冲请求
+镜像列表来自环境变量 JAVDB_MIRRORS（逗号分隔）或 ~/.115cli/javdb_mirrors.txt（每行一个），未配置时只用 javdb.BASE_URL
+每个站点记录最近的响应耗时（收到响应头为止），按中位数排序；
+请求先发往最快的站点，超过该站点 p90 耗时仍未响应时向下一个站点发出对冲请求，先返回正常响应的获胜，另一个被取消/丢弃；
+连续失败（网络错误、超时、429/5xx/403）的站点冷却一段时间，期间不再选择（所有站点都在冷却时仍会使用）
+页面URL和缓存键始终使用 javdb.BASE_URL，只在发出请求时替换为实际站点
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit
+
+MIRRORS_FILE = Path.home() / ".115cli" / "javdb_mirrors.txt"
+HOSTS_FILE = Path.home() / ".115cli" / "javdb_hosts.json"
+
+MAX_SAMPLES = 50
+MIN_SAMPLES = 5
+# 样本不足时的对冲等待；有样本时取 p90，夹在上下限之间
+DEFAULT_HEDGE_DELAY = 1.5
+MIN_HEDGE_DELAY = 0.1
+MAX_HEDGE_DELAY = 10.0
+FAILURE_THRESHOLD = 2
+HOST_COOLDOWN = 300.0
+
+def configured() -> list:
+    """配置的镜像列表（去掉末尾的 /），未配置时返回空列表"""
+    value = os.environ.get('JAVDB_MIRRORS')
+    if value is None and MIRRORS_FILE.exists():
+        value = ','.join(
+            line.split('#', 1)[0].strip() for line in MIRRORS_FILE.read_text(encoding='utf-8').splitlines()
+        )
+    return [base.strip().rstrip('/') for base in (value or '').split(',') if base.strip()]
+
+def base_of(url) -> str:
+    """URL 的站点部分: https://host"""
+    parts = urlsplit(str(url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class HostTracker:
+    """各站点的耗时样本、连续失败次数和冷却时间，退出时写回 ~/.115cli/javdb_hosts.json"""
+
+    def __init__(self, path: Path = HOSTS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.hosts = {}
+        try:
+            saved = json.loads(path.read_text())
+        except (OSError, ValueError):
+            saved = {}
+        for base, state in saved.items():
+            self._host(base).update(
+                samples=deque(state.get('samples', []), maxlen=MAX_SAMPLES),
+                failures=state.get('failures', 0),
+                cooldown_until=state.get('cooldown_until', 0),
+                requests=state.get('requests', 0),
+                hedges=state.get('hedges', 0),
+            )
+
+    def _host(self, base: str) -> dict:
+        return self.hosts.setdefault(base, {
+            'samples': deque(maxlen=MAX_SAMPLES), 'failures': 0, 'cooldown_until': 0, 'requests': 0, 'hedges': 0,
+        })
+
+    def plan(self, bases: list) -> list:
+        """
+        请求顺序：未冷却的站点按耗时中位数升序（没有样本的排在最前，便于采样），配置顺序决定并列时的先后；
+        全部在冷却时按冷却结束时间排序
+        """
+        now = time.time()
+        with self._lock:
+            states = [(base, self._host(base)) for base in bases]
+            healthy = [(i, base, s) for i, (base, s) in enumerate(states) if s['cooldown_until'] <= now]
+            if not healthy:
+                return [base for base, s in sorted(states, key=lambda item: item[1]['cooldown_until'])]
+            healthy.sort(key=lambda item: (percentile(item[2]['samples'], 0.5) if item[2]['samples'] else 0.0, item[0]))
+            return [base for _, base, _ in healthy]
+
+    def hedge_delay(self, base: str) -> float:
+        """等待多久后发出对冲请求：该站点的 p90 耗时"""
+        with self._lock:
+            samples = list(self._host(base)['samples'])
+        if len(samples) < MIN_SAMPLES:
+            return DEFAULT_HEDGE_DELAY
+        return min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, percentile(samples, 0.9)))
+
+    def success(self, base: str, seconds: float):
+        with self._lock:
+            host = self._host(base)
+            host['samples'].append(round(seconds, 4))
+            host['failures'] = 0
+            host['cooldown_until'] = 0
+            host['requests'] += 1
+            self._dirty = True
+
+    def failure(self, base: str):
+        """失败一次；连续失败达到阈值时冷却"""
+        with self._lock:
+            host = self._host(base)
+            host['failures'] += 1
+            host['requests'] += 1
+            if host['failures'] >= FAILURE_THRESHOLD:
+                host['cooldown_until'] = time.time() + HOST_COOLDOWN
+            self._dirty = True
+
+    def abandoned(self, base: str, seconds: float):
+        """请求在对冲中落败被取消：已等待的时间作为耗时样本（实际耗时的下限），不影响失败计数"""
+        with self._lock:
+            host = self._host(base)
+            host['samples'].append(round(seconds, 4))
+            host['requests'] += 1
+            self._dirty = True
+
+    def hedged(self, base: str):
+        """记录一次向该站点发出的对冲请求"""
+        with self._lock:
+            self._host(base)['hedges'] += 1
+            self._dirty = True
+
+    def status(self, bases: list) -> list:
+        now = time.time()
+        with self._lock:
+            report = []
+            for base in bases:
+                host = self._host(base)
+                samples = list(host['samples'])
+                report.append({
+                    'base': base,
+                    'samples': len(samples),
+                    'p50': percentile(samples, 0.5) if samples else None,
+                    'p90': percentile(samples, 0.9) if samples else None,
+                    'failures': host['failures'],
+                    'cooldown': round(max(0.0, host['cooldown_until'] - now), 1),
+                    'requests': host['requests'],
+                    'hedges': host['hedges'],
+                })
+        return report
+
+    def save(self):
+        """有变化时原子写回"""
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                base: dict(host, samples=list(host['samples']))
+                for base, host in self.hosts.items()
+            }
+            self._dirty = False
+        self.path.parent.mkdir(exist_ok=True)
+        tmp = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(state))
+        os.replace(tmp, self.path)
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_tracker() -> HostTracker:
+    """进程内共享的站点统计"""
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            import atexit
+
+            _tracker = HostTracker()
+            atexit.register(_tracker.save)
+        return _tracker
+
+def is_bad_status(status: int) -> bool:
+    """说明站点有问题的状态码：限速、服务器错误、封禁"""
+    import ratelimit
+
+    return status in ratelimit.RETRY_STATUS or status == 403
+
+def candidates(url: str, canonical: str) -> list:
+    """
+    url 在各站点上的地址，按请求顺序排列: [(站点, 实际URL), ...]
+    url 不属于 canonical 站点或未配置镜像时只有它本身
+    """
+    bases = configured()
+    if not bases or not url.startswith(canonical + '/'):
+        return [(base_of(url), url)]
+    path = url[len(canonical):]
+    return [(base, base + path) for base in get_tracker().plan(bases)]
@@ -0,0 +1,105 @@
+"""
+output - 命令的机器可读输出
+--format table 为默认的 rich 表格/彩色文本；ndjson / json / tsv 不构建表格，
+每批数据（如一页API结果）拿到后立即写到 stdout 并刷新，内存占用与总行数无关，下游管道可以马上开始处理
+"""
+
+import json
+import os
+import sys
+
+import click
+
+FORMATS = ['table', 'ndjson', 'json', 'tsv']
+
+def format_option(default: str = 'table'):
+    """命令的 --format 选项"""
+    return click.option(
+        '--format', 'fmt', type=click.Choice(FORMATS), default=default, show_default=True,
+        help='输出格式：table 为表格，ndjson/json/tsv 逐批写出，便于管道处理'
+    )
+
+def tsv_value(value) -> str:
+    """TSV单元格：None为空，嵌套结构写成JSON，转义制表符和换行"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (dict, list, tuple)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+class RecordWriter:
+    """
+    流式写出记录（dict）
+    - ndjson: 每条一行JSON
+    - json:   一个JSON数组，边写边输出（结束时补上 ]）
+    - tsv:    首行为字段名（fields，未给出时取第一条记录的键），之后每条一行
+    """
+
+    def __init__(self, fmt: str, fields: list | None = None, stream=None):
+        if fmt not in FORMATS or fmt == 'table':
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.fmt = fmt
+        self.fields = fields
+        self.stream = stream or sys.stdout
+        self.count = 0
+        self._closed = False
+
+    def write(self, record: dict):
+        if self.fmt == 'ndjson':
+            self.stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        elif self.fmt == 'json':
+            self.stream.write(('[\n  ' if self.count == 0 else ',\n  ') + json.dumps(record, ensure_ascii=False))
+        else:
+            if self.count == 0:
+                self.fields = self.fields or list(record)
+                self.stream.write('\t'.join(self.fields) + '\n')
+            self.stream.write('\t'.join(tsv_value(record.get(f)) for f in self.fields) + '\n')
+        self.count += 1
+
+    def write_many(self, records):
+        """写出一批记录并刷新"""
+        try:
+            for record in records:
+                self.write(record)
+        except BrokenPipeError:
+            self._broken_pipe()
+        self.flush()
+
+    def flush(self):
+        try:
+            self.stream.flush()
+        except BrokenPipeError:
+            self._broken_pipe()
+
+    def _broken_pipe(self):
+        """下游（如 head）已关闭：静默退出，避免解释器退出时再次刷新stdout报错"""
+        if self.stream is sys.stdout:
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+        raise SystemExit(0)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self.fmt == 'json':
+            self.stream.write('\n]\n' if self.count else '[]\n')
+        elif self.fmt == 'tsv' and self.count == 0 and self.fields:
+            self.stream.write('\t'.join(self.fields) + '\n')
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        return False
+
+def write_records(fmt: str, records, fields: list | None = None) -> int:
+    """把一组记录按格式写出，返回条数"""
+    with RecordWriter(fmt, fields) as writer:
+        writer.write_many(records)
+    return writer.count
@@ -0,0 +1,315 @@
+"""
+pipeline - 云下载完成后的自动处理
+提交任务时登记后续操作（清理小文件、按番号重命名、移动到目录），保存在 ~/.115cli/pipeline.db；
+`jav115 pipeline run` 用一个 TaskWatcher 同时监视所有待处理任务，完成后在线程池中按任务的 file_id 执行操作；
+登记时带上备选磁链的任务下载失败或停滞时换用下一个备选（见 failover），后续操作转到新任务上
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import tracing
+
+PIPELINE_FILE = Path.home() / ".115cli" / "pipeline.db"
+PAGE_SIZE = 1150
+
+# 操作执行顺序：先清理，再重命名，最后移动
+ACTION_ORDER = ['clean', 'rename', 'move']
+
+class PostActions:
+    """线程安全的后续操作登记表"""
+
+    def __init__(self, path: Path = PIPELINE_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        path.parent.mkdir(exist_ok=True)
+        self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS actions (
+                info_hash TEXT PRIMARY KEY,
+                code TEXT,
+                actions TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                results TEXT,
+                alternates TEXT,
+                save_cid INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS actions_status ON actions(status);
+        ''')
+        # 旧版本创建的登记表没有备选磁链
+        columns = {row[1] for row in self.db.execute('PRAGMA table_info(actions)')}
+        if 'alternates' not in columns:
+            self.db.execute('ALTER TABLE actions ADD COLUMN alternates TEXT')
+            self.db.execute('ALTER TABLE actions ADD COLUMN save_cid INTEGER NOT NULL DEFAULT 0')
+        self.db.commit()
+
+    def register(self, info_hash: str, code: str | None, actions: dict, alternates: list | None = None,
+                 save_cid: int = 0):
+        """
+        登记（或覆盖）任务的后续操作: actions = {'move': cid, 'rename': True, 'clean': 最小MB}
+        alternates 为排好序的备选磁链（failover.candidates 去掉首选），save_cid 为换用备选时的保存目录
+        """
+        now = time.time()
+        with self._lock, self.db:
+            self.db.execute(
+                'INSERT OR REPLACE INTO actions '
+                '(info_hash, code, actions, status, results, alternates, save_cid, created, updated) '
+                "VALUES (?, ?, ?, 'pending', NULL, ?, ?, ?, ?)",
+                (info_hash.lower(), code, json.dumps(actions), json.dumps(alternates or [], ensure_ascii=False),
+                 save_cid, now, now)
+            )
+
+    def pending(self) -> dict:
+        """待处理任务: {info_hash: {'code': ..., 'actions': {...}, 'alternates': [...], 'save_cid': ...}}"""
+        with self._lock:
+            rows = self.db.execute(
+                "SELECT info_hash, code, actions, alternates, save_cid FROM actions WHERE status = 'pending'"
+            ).fetchall()
+        return {
+            h: {'code': code, 'actions': json.loads(actions), 'alternates': json.loads(alternates or '[]'),
+                'save_cid': save_cid}
+            for h, code, actions, alternates, save_cid in rows
+        }
+
+    def finish(self, info_hash: str, status: str, results: list):
+        with self._lock, self.db:
+            self.db.execute(
+                'UPDATE actions SET status = ?, results = ?, updated = ? WHERE info_hash = ?',
+                (status, json.dumps(results, ensure_ascii=False), time.time(), info_hash.lower())
+            )
+
+    def retry(self, info_hash: str | None = None) -> int:
+        """把失败的条目重新标记为待处理，返回条数"""
+        sql = "UPDATE actions SET status = 'pending', updated = ? WHERE status = 'failed'"
+        params = [time.time()]
+        if info_hash:
+            sql += ' AND info_hash = ?'
+            params.append(info_hash.lower())
+        with self._lock, self.db:
+            return self.db.execute(sql, params).rowcount
+
+    def list(self, status: str | None = None, limit: int = 50) -> list:
+        sql = 'SELECT info_hash, code, actions, status, results, updated FROM actions'
+        params = []
+        if status:
+            sql += ' WHERE status = ?'
+            params.append(status)
+        sql += ' ORDER BY updated DESC LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self.db.execute(sql, params).fetchall()
+        return [
+            {
+                'info_hash': h, 'code': code, 'actions': json.loads(actions), 'status': st,
+                'results': json.loads(results) if results else [], 'updated': updated,
+            }
+            for h, code, actions, st, results, updated in rows
+        ]
+
+    def close(self):
+        with self._lock:
+            self.db.close()
+
+def inspect_target(client, file_id) -> dict:
+    """
+    任务的 file_id 对应的条目：多文件任务是目录（返回其中的文件），单文件任务是文件本身
+    返回: {'id': ..., 'is_dir': bool, 'files': [fs_files条目, ...]}
+    """
+    file_id = int(file_id)
+    result = client.fs_files({'cid': file_id, 'show_dir': 1, 'limit': PAGE_SIZE, 'offset': 0})
+    # 不是目录的ID会被当作根目录返回
+    if int(result.get('cid', -1)) != file_id:
+        return {'id': file_id, 'is_dir': False, 'files': []}
+
+    entries = list(result.get('data') or [])
+    while entries and len(entries) < int(result.get('count') or 0):
+        result = client.fs_files({'cid': file_id, 'show_dir': 1, 'limit': PAGE_SIZE, 'offset': len(entries)})
+        if not result.get('data'):
+            break
+        entries.extend(result['data'])
+    return {'id': file_id, 'is_dir': True, 'files': [e for e in entries if e.get('fid') is not None]}
+
+def clean_junk(client, target: dict, task: dict, min_mb: float) -> str:
+    """删除目录中小于 min_mb 的文件（广告、种子说明等）"""
+    if not target['is_dir']:
+        return '单文件任务，无需清理'
+    junk = [f for f in target['files'] if int(f.get('s') or 0) < min_mb * 1024 * 1024]
+    if junk and len(junk) == len(target['files']):
+        # 全部都小于阈值时不删，避免误删整个任务
+        return f'所有文件都小于 {min_mb:g}MB，跳过清理'
+    if junk:
+        client.fs_delete([int(f['fid']) for f in junk])
+        ids = {f['fid'] for f in junk}
+        target['files'] = [f for f in target['files'] if f['fid'] not in ids]
+    return f'删除 {len(junk)} 个小于 {min_mb:g}MB 的文件'
+
+def rename_by_code(client, target: dict, task: dict, code: str | None) -> str:
+    """目录重命名为番号，其中最大的文件重命名为 番号.扩展名；单文件任务直接重命名文件"""
+    if not code:
+        return '没有番号，跳过重命名'
+    names = {}
+    if target['is_dir']:
+        names[target['id']] = code
+        files = target['files']
+    else:
+        files = [{'fid': target['id'], 'n': task.get('name', '')}]
+    if files:
+        largest = max(files, key=lambda f: int(f.get('s') or 0))
+        name = largest.get('n', '')
+        ext = name.rsplit('.', 1)[-1] if '.' in name else ''
+        names[int(largest['fid'])] = f'{code}.{ext}' if ext else code
+    client.fs_rename({f'files_new_name[{fid}]': name for fid, name in names.items()})
+    return '重命名为 ' + ', '.join(names.values())
+
+def move_to(client, target: dict, task: dict, cid: int) -> str:
+    result = client.fs_move([target['id']], int(cid))
+    if not result.get('state'):
+        raise RuntimeError(result.get('error') or result.get('error_msg') or str(result))
+    return f'移动到目录 {cid}'
+
+# 操作名 → 处理函数(client, target, task, 参数) -> 说明
+ACTIONS = {
+    'clean': clean_junk,
+    'rename': rename_by_code,
+    'move': move_to,
+}
+
+def process_task(client, info_hash: str, entry: dict, task: dict) -> tuple:
+    """对一个已完成任务依次执行登记的操作，返回 (status, results)"""
+    file_id = task.get('file_id')
+    if not file_id:
+        return 'failed', [{'action': None, 'error': '任务没有 file_id'}]
+
+    results = []
+    name = 'inspect'
+    try:
+        target = inspect_target(client, file_id)
+        for name in ACTION_ORDER:
+            if name not in entry['actions']:
+                continue
+            param = entry['code'] if name == 'rename' else entry['actions'][name]
+            with tracing.span(f'pipeline.{name}'):
+                message = ACTIONS[name](client, target, task, param)
+            results.append({'action': name, 'message': message})
+    except Exception as e:
+        results.append({'action': name, 'error': str(e)})
+        return 'failed', results
+    return 'done', results
+
+def switch_alternate(client, registry: PostActions, info_hash: str, entry: dict, event: str) -> tuple:
+    """
+    下载失败或停滞：删除任务，提交下一个备选磁链，后续操作登记到新任务上
+    返回 (新的 info_hash, 新的登记条目, 说明)；备选都提交失败时新的 info_hash 为 None，删除任务失败时抛出异常
+    """
+    import failover
+
+    reason = failover.describe(event)
+    failover.drop_task(client, info_hash, entry['code'] or '')
+    alternates = list(entry['alternates'])
+    new_hash, candidate, reason = failover.submit_alternate(
+        client, alternates, entry['save_cid'], entry['code'] or '', reason
+    )
+    if new_hash is None:
+        return None, None, reason
+    new_entry = dict(entry, alternates=alternates)
+    registry.register(new_hash, entry['code'], entry['actions'], alternates, entry['save_cid'])
+    return new_hash, new_entry, f"{reason}，换用备选磁链 {candidate['size']}: {new_hash}"
+
+def run(client, registry: PostActions, timeout: float = 3600, follow: bool = False, workers: int = 4,
+        min_interval: float = 3, max_interval: float = 60, stall_after: float | None = None,
+        on_result=None) -> dict:
+    """
+    用一个 TaskWatcher 监视所有待处理任务，完成的任务交给线程池执行后续操作
+    follow=True 时持续运行并接收新登记的任务，直到超时
+    有备选磁链的任务失败、或进度 stall_after 秒没有变化时换用下一个备选
+    on_result(info_hash, entry, status, results) 在每个任务处理完（或换用备选）后调用
+    返回: {'done': n, 'failed': n, 'pending': n}
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from cli import TaskWatcher
+    
+    counts = {'done': 0, 'failed': 0}
+    counts_lock = threading.Lock()
+    # 已交给线程池、还没写回结果的任务：登记表中仍是 pending，follow 时不能再次加入
+    in_flight = set()
+    entries = registry.pending()
+    watcher = TaskWatcher(client, list(entries), min_interval, max_interval, stall_after)
+    
+    def finish(info_hash, entry, status, results):
+        registry.finish(info_hash, status, results)
+        with counts_lock:
+            counts[status] += 1
+        if on_result:
+            on_result(info_hash, entry, status, results)
+    
+    def handle(info_hash, entry, task):
+        try:
+            status, results = process_task(client, info_hash, entry, task)
+            finish(info_hash, entry, status, results)
+        finally:
+            with counts_lock:
+                in_flight.discard(info_hash)
+    
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            if follow:
+                with counts_lock:
+                    busy = set(in_flight)
+                fresh = {h: e for h, e in registry.pending().items() if h not in entries and h not in busy}
+                entries.update(fresh)
+                watcher.add(fresh)
+            
+            for event in watcher.poll() if watcher.pending else []:
+                info_hash = event['info_hash']
+                entry = entries.pop(info_hash)
+                if event['event'] == 'completed':
+                    with counts_lock:
+                        in_flight.add(info_hash)
+                    pool.submit(handle, info_hash, entry, event['task'])
+                elif event['event'] in ('failed', 'stalled') and entry.get('alternates'):
+                    try:
+                        new_hash, new_entry, reason = switch_alternate(
+                            client, registry, info_hash, entry, event['event']
+                        )
+                    except Exception as e:
+                        # 删除任务失败：失败的任务结束登记，停滞的任务原样继续等待
+                        if event['event'] == 'failed':
+                            finish(info_hash, entry, 'failed', [{'action': None, 'error': f'下载失败，{e}'}])
+                        else:
+                            entries[info_hash] = entry
+                        continue
+                    watcher.discard(info_hash)
+                    if new_hash is None:
+                        finish(info_hash, entry, 'failed', [{'action': None, 'error': reason}])
+                        continue
+                    # 原任务的登记结束，但不计入失败数：后续操作转到新任务上
+                    registry.finish(info_hash, 'failed', [{'action': None, 'error': reason}])
+                    if on_result:
+                        on_result(info_hash, entry, 'failed', [{'action': None, 'error': reason}])
+                    entries[new_hash] = new_entry
+                    watcher.add([new_hash])
+                elif event['event'] == 'stalled':
+                    # 没有备选：继续等待
+                    entries[info_hash] = entry
+                elif event['event'] != 'progress':
+                    reason = '任务不存在' if event['event'] == 'missing' else '下载失败'
+                    finish(info_hash, entry, 'failed', [{'action': None, 'error': reason}])
+                else:
+                    entries[info_hash] = entry
+            
+            if not watcher.pending and not follow:
+                break
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
+                break
+            time.sleep(min(watcher.interval if watcher.pending else max_interval, remaining))
+    
+    counts['pending'] = len(watcher.pending)
+    return counts
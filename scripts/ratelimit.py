@@ -0,0 +1,296 @@
+"""
+ratelimit - 跨进程共享的令牌桶限速和熔断器
+状态保存在 ~/.115cli/ratelimit.json，读写时持有文件锁，同一台机器上的所有会话共用一份配额
+每个限速器（javdb / 115）有 rate（每秒请求数）和 burst（突发容量）；
+429/5xx/网络错误按抖动退避重试，连续失败达到阈值时熔断，冷却后只放行一个试探请求
+"""
+
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import tracing
+
+try:
+    import fcntl
+except ImportError:  # Windows：退化为进程内共享
+    fcntl = None
+
+STATE_FILE = Path.home() / ".115cli" / "ratelimit.json"
+LOCK_FILE = Path.home() / ".115cli" / "ratelimit.lock"
+
+DEFAULT_LIMITS = {
+    'javdb': {'rate': 1.0, 'burst': 5},
+    '115': {'rate': 2.0, 'burst': 8},
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# 重复执行没有副作用的只读接口：超时、网络错误、5xx 都可以重试；
+# 其余（提交任务、移动、删除、重命名……）只在明确未被执行时重试：429，或请求发出前的连接错误
+IDEMPOTENT_METHODS = {'user_info', 'offline_list', 'fs_files', 'fs_search'}
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+FAILURE_THRESHOLD = 5
+COOLDOWN = 60.0
+MAX_COOLDOWN = 600.0
+PROBE_TIMEOUT = 30.0
+
+class CircuitOpenError(Exception):
+    """熔断期间的请求直接失败"""
+
+_thread_lock = threading.Lock()
+# 本进程最近一次看到的连续失败次数，为0时成功请求不必再写状态文件
+_observed_failures = {}
+
+@contextmanager
+def _locked_state():
+    """持锁读写状态文件"""
+    STATE_FILE.parent.mkdir(exist_ok=True)
+    with _thread_lock, open(LOCK_FILE, 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            try:
+                state = json.loads(STATE_FILE.read_text())
+            except (OSError, ValueError):
+                state = {}
+            yield state
+            tmp = STATE_FILE.with_suffix(f'.{os.getpid()}.tmp')
+            tmp.write_text(json.dumps(state))
+            os.replace(tmp, STATE_FILE)
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+def _limiter(state: dict, name: str) -> dict:
+    defaults = DEFAULT_LIMITS.get(name, DEFAULT_LIMITS['115'])
+    limiter = state.setdefault(name, {})
+    limiter.setdefault('rate', defaults['rate'])
+    limiter.setdefault('burst', defaults['burst'])
+    limiter.setdefault('tokens', float(limiter['burst']))
+    limiter.setdefault('updated', time.time())
+    for key in ('failures', 'open_until', 'probing_until', 'requests', 'waited', 'trips'):
+        limiter.setdefault(key, 0)
+    limiter.setdefault('cooldown', COOLDOWN)
+    return limiter
+
+def acquire(name: str) -> float:
+    """
+    取一个令牌，令牌不足时预支并睡眠到可用为止，返回等待秒数
+    熔断中抛出 CircuitOpenError
+    """
+    with _locked_state() as state:
+        limiter = _limiter(state, name)
+        now = time.time()
+        if limiter['failures'] >= FAILURE_THRESHOLD:
+            if limiter['open_until'] > now:
+                raise CircuitOpenError(f"{name} 请求连续失败，已熔断，{limiter['open_until'] - now:.0f}秒后重试")
+            if limiter['probing_until'] > now:
+                raise CircuitOpenError(f"{name} 正在试探恢复，请稍后重试")
+            limiter['probing_until'] = now + PROBE_TIMEOUT
+
+        limiter['tokens'] = min(limiter['burst'], limiter['tokens'] + (now - limiter['updated']) * limiter['rate'])
+        limiter['updated'] = now
+        limiter['tokens'] -= 1
+        wait = max(0.0, -limiter['tokens'] / limiter['rate'])
+        limiter['requests'] += 1
+        limiter['waited'] += wait
+        _observed_failures[name] = limiter['failures']
+
+    if wait:
+        with tracing.span(f'ratelimit.{name}', waited=round(wait, 3)):
+            time.sleep(wait)
+    return wait
+
+def success(name: str):
+    """请求成功：清零连续失败次数并关闭熔断"""
+    if not _observed_failures.get(name):
+        return
+    with _locked_state() as state:
+        limiter = _limiter(state, name)
+        limiter.update(failures=0, open_until=0, probing_until=0, cooldown=COOLDOWN)
+    _observed_failures[name] = 0
+
+def failure(name: str):
+    """请求失败（429/5xx/403/网络错误）：达到阈值时熔断，每次熔断冷却时间翻倍"""
+    with _locked_state() as state:
+        limiter = _limiter(state, name)
+        limiter['failures'] += 1
+        limiter['probing_until'] = 0
+        if limiter['failures'] >= FAILURE_THRESHOLD:
+            limiter['open_until'] = time.time() + limiter['cooldown']
+            limiter['cooldown'] = min(limiter['cooldown'] * 2, MAX_COOLDOWN)
+            limiter['trips'] += 1
+        _observed_failures[name] = limiter['failures']
+
+def backoff(attempt: int, retry_after=None) -> float:
+    """重试等待时间：服务器给出 Retry-After 时遵守，否则使用全抖动指数退避"""
+    try:
+        if retry_after is not None:
+            return min(BACKOFF_CAP, max(0.0, float(retry_after)))
+    except (TypeError, ValueError):
+        pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+def error_status(exc: Exception) -> int | None:
+    """异常携带的HTTP状态码"""
+    response = getattr(exc, 'response', None)
+    for status in (getattr(response, 'status_code', None), getattr(response, 'status', None),
+                   getattr(exc, 'status_code', None)):
+        if isinstance(status, int):
+            return status
+    return None
+
+def is_transient(exc: Exception) -> bool:
+    """值得重试的错误：429/5xx、连接失败、超时"""
+    status = error_status(exc)
+    if status is not None:
+        return status in RETRY_STATUS
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    return any(cls.__name__ in ('TransportError', 'TimeoutException') for cls in type(exc).__mro__)
+
+def is_unsent(exc: Exception) -> bool:
+    """请求还没有发出就失败了（连接不上、连接池等待超时），服务器不可能执行过"""
+    if isinstance(exc, ConnectionRefusedError):
+        return True
+    return any(cls.__name__ in ('ConnectError', 'ConnectTimeout', 'PoolTimeout') for cls in type(exc).__mro__)
+
+def is_retryable(exc: Exception, idempotent: bool) -> bool:
+    """只读请求的临时错误都重试；写请求只重试服务器明确拒绝（429）或根本没发出的"""
+    if idempotent:
+        return is_transient(exc)
+    return error_status(exc) == 429 or is_unsent(exc)
+
+def call(name: str, func, *args, idempotent: bool | None = None, **kwargs):
+    """
+    限速执行 func；可重试的错误退避重试，403（封禁/验证码）不重试，结果计入熔断器
+    idempotent 默认按方法名判断（IDEMPOTENT_METHODS），写操作超时后不会再发一次
+    """
+    if idempotent is None:
+        idempotent = getattr(func, '__name__', None) in IDEMPOTENT_METHODS
+    for attempt in range(MAX_RETRIES + 1):
+        acquire(name)
+        try:
+            with tracing.span(f"{name}.{getattr(func, '__name__', 'call')}", attempt=attempt):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            transient = is_transient(e)
+            if transient or error_status(e) == 403:
+                failure(name)
+            if not is_retryable(e, idempotent) or attempt == MAX_RETRIES:
+                raise
+            response = getattr(e, 'response', None)
+            headers = getattr(response, 'headers', None) or {}
+            time.sleep(backoff(attempt, headers.get('Retry-After')))
+            continue
+        success(name)
+        return result
+
+async def call_async(name: str, func, *args, idempotent: bool | None = None, timeout: float | None = None, **kwargs):
+    """
+    call 的 asyncio 版本：func(*args, **kwargs) 返回可等待对象
+    令牌不足时的等待放到线程中，不阻塞事件循环；每次尝试单独计算超时，重试规则与 call 相同
+    """
+    import asyncio
+
+    if idempotent is None:
+        idempotent = getattr(func, '__name__', None) in IDEMPOTENT_METHODS
+    for attempt in range(MAX_RETRIES + 1):
+        await asyncio.to_thread(acquire, name)
+        try:
+            with tracing.span(f"{name}.{getattr(func, '__name__', 'call')}", attempt=attempt):
+                async with asyncio.timeout(timeout):
+                    result = await func(*args, **kwargs)
+        except Exception as e:
+            transient = is_transient(e)
+            if transient or error_status(e) == 403:
+                failure(name)
+            if not is_retryable(e, idempotent) or attempt == MAX_RETRIES:
+                raise
+            response = getattr(e, 'response', None)
+            headers = getattr(response, 'headers', None) or {}
+            await asyncio.sleep(backoff(attempt, headers.get('Retry-After')))
+            continue
+        success(name)
+        return result
+
+class LimitedClient:
+    """给115客户端的每次API调用加上限速、重试和熔断，其余属性原样透传"""
+
+    def __init__(self, client, name: str = '115'):
+        self._client = client
+        self._name = name
+
+    def __getattr__(self, attr):
+        value = getattr(self._client, attr)
+        if attr.startswith('_') or not callable(value):
+            return value
+        return functools.partial(call, self._name, value)
+
+    async def acall(self, method: str, *args, timeout: float | None = None, **kwargs):
+        """异步调用：p115client 使用原生异步接口（async_=True），其他客户端放到线程中执行"""
+        import asyncio
+
+        func = getattr(self._client, method)
+        native = type(self._client).__module__.split('.')[0] == 'p115client'
+
+        async def invoke(*args, **kwargs):
+            if native:
+                return await func(*args, async_=True, **kwargs)
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+        invoke.__name__ = method
+        return await call_async(self._name, invoke, *args, timeout=timeout, **kwargs)
+
+def status() -> dict:
+    """所有限速器的当前状态（令牌数按当前时间补足）"""
+    with _locked_state() as state:
+        for name in DEFAULT_LIMITS:
+            _limiter(state, name)
+        now = time.time()
+        report = {}
+        for name, limiter in state.items():
+            tokens = min(limiter['burst'], limiter['tokens'] + (now - limiter['updated']) * limiter['rate'])
+            if limiter['failures'] < FAILURE_THRESHOLD:
+                circuit = 'closed'
+            elif limiter['open_until'] > now:
+                circuit = 'open'
+            else:
+                circuit = 'half-open'
+            report[name] = {
+                'rate': limiter['rate'],
+                'burst': limiter['burst'],
+                'tokens': round(tokens, 2),
+                'circuit': circuit,
+                'retry_in': round(max(0.0, limiter['open_until'] - now), 1),
+                'failures': limiter['failures'],
+                'requests': limiter['requests'],
+                'waited': round(limiter['waited'], 1),
+                'trips': limiter['trips'],
+            }
+    return report
+
+def configure(name: str, rate: float | None = None, burst: int | None = None):
+    """修改限速参数（对所有进程生效）"""
+    with _locked_state() as state:
+        limiter = _limiter(state, name)
+        if rate is not None:
+            limiter['rate'] = rate
+        if burst is not None:
+            limiter['burst'] = burst
+            limiter['tokens'] = min(limiter['tokens'], burst)
+
+def reset(name: str | None = None):
+    """关闭熔断并清空统计（保留限速参数）"""
+    with _locked_state() as state:
+        for key in [name] if name else list(state):
+            if key in state:
+                state[key] = {k: v for k, v in state[key].items() if k in ('rate', 'burst')}
+                _limiter(state, key)
+    _observed_failures.clear()
@@ -0,0 +1,203 @@
+"""
+tracing - 分阶段计时
+各阶段用 span(name) 包裹：javdb 请求/年龄验证/解析、115 API 调用、限速等待、jav115 的各个步骤
+未启用时 span() 返回空操作对象，几乎没有开销；
+--profile 在命令结束后按阶段汇总耗时（输出到stderr），
+--trace-file（或环境变量 CLI115_TRACE_FILE）把每个span按OTel风格逐行写入NDJSON文件
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+import click
+
+_enabled = False
+_trace_file = None
+_trace_id = os.urandom(16).hex()
+_lock = threading.Lock()
+# 当前所在的span：用contextvars而不是线程局部变量，asyncio 中交错执行的任务各自维护父子关系
+_current = contextvars.ContextVar('tracing_span', default=None)
+# 阶段名 → [次数, 总耗时, 最大耗时]
+_stats = {}
+_enabled_at = None
+
+class Span:
+    """一个计时阶段，可以用 set() 追加属性（如状态码、是否命中缓存）"""
+
+    __slots__ = ('name', 'attrs', 'span_id', 'parent_id', 'start_ns', '_start', '_token')
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent else None
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # 在另一个上下文中结束（如生成器被其他任务关闭），父span保持不变
+            pass
+        if exc_type is not None and not issubclass(exc_type, GeneratorExit):
+            self.attrs['error'] = exc_type.__name__
+        _finish(self, duration)
+        return False
+
+class _NullSpan:
+    """未启用时使用的空操作span"""
+
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+def _finish(span: Span, duration: float):
+    with _lock:
+        stats = _stats.setdefault(span.name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += duration
+        stats[2] = max(stats[2], duration)
+        if _trace_file:
+            record = {
+                'name': span.name,
+                'trace_id': _trace_id,
+                'span_id': span.span_id,
+                'parent_span_id': span.parent_id,
+                'start_time_unix_nano': span.start_ns,
+                'end_time_unix_nano': span.start_ns + int(duration * 1e9),
+                'attributes': dict(span.attrs, pid=os.getpid(), thread=threading.current_thread().name),
+            }
+            _trace_file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+
+def enabled() -> bool:
+    return _enabled
+
+def span(name: str, **attrs):
+    """计时上下文: with span('javdb.request', url=url) as s: ... s.set(status=200)"""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attrs)
+
+def record(name: str, seconds: float, **attrs):
+    """记录一个已经结束的阶段（如分散在多次调用中的解析耗时）"""
+    if not _enabled:
+        return
+    item = Span(name, attrs)
+    parent = _current.get()
+    item.parent_id = parent.span_id if parent else None
+    item.start_ns = time.time_ns() - int(seconds * 1e9)
+    _finish(item, seconds)
+
+def enable(trace_file: str | None = None):
+    """开始计时；给出 trace_file 时同时追加写入NDJSON"""
+    global _enabled, _trace_file, _enabled_at
+    with _lock:
+        if trace_file and _trace_file is None:
+            _trace_file = open(trace_file, 'a', encoding='utf-8', buffering=1)
+        if not _enabled:
+            _enabled = True
+            _enabled_at = time.time()
+            started = process_start_time()
+            if started is not None:
+                # 解释器启动 + 导入模块，到命令行解析完成为止
+                _stats['startup'] = [1, _enabled_at - started, _enabled_at - started]
+
+def process_start_time() -> float | None:
+    """本进程的启动时刻（Unix时间），从 /proc 读取，其他平台返回None"""
+    try:
+        stat = Path('/proc/self/stat').read_text()
+        ticks = int(stat.rsplit(')', 1)[1].split()[19])
+        uptime = float(Path('/proc/uptime').read_text().split()[0])
+        return time.time() - uptime + ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def summary() -> dict:
+    """{'wall': 秒, 'stages': [{'name', 'count', 'total', 'mean', 'max'}, ...]}，按总耗时降序"""
+    with _lock:
+        items = [(name, list(values)) for name, values in _stats.items()]
+    started = process_start_time() or _enabled_at or time.time()
+    stages = [
+        {'name': name, 'count': count, 'total': total, 'mean': total / count, 'max': longest}
+        for name, (count, total, longest) in items
+    ]
+    stages.sort(key=lambda s: s['total'], reverse=True)
+    return {'wall': time.time() - started, 'stages': stages}
+
+def print_report():
+    """按阶段输出耗时汇总到stderr"""
+    from rich.console import Console
+    from rich.table import Table
+
+    report = summary()
+    table = Table(title=f"耗时分布（总计 {report['wall'] * 1000:.0f}ms）")
+    table.add_column("阶段", style="cyan")
+    table.add_column("次数", justify="right")
+    table.add_column("总计", justify="right")
+    table.add_column("平均", justify="right")
+    table.add_column("最大", justify="right")
+    table.add_column("占比", justify="right")
+    for stage in report['stages']:
+        table.add_row(
+            stage['name'],
+            str(stage['count']),
+            f"{stage['total'] * 1000:.1f}ms",
+            f"{stage['mean'] * 1000:.1f}ms",
+            f"{stage['max'] * 1000:.1f}ms",
+            f"{stage['total'] / report['wall'] * 100:.0f}%" if report['wall'] else '-',
+        )
+    console = Console(stderr=True)
+    console.print(table)
+    console.print("[dim]阶段可以嵌套，并发执行的阶段会重复计算，占比之和可能超过100%[/dim]")
+
+def close():
+    global _trace_file
+    with _lock:
+        if _trace_file:
+            _trace_file.close()
+            _trace_file = None
+
+def _profile_callback(ctx, param, value):
+    if value:
+        enable()
+        ctx.call_on_close(print_report)
+
+def _trace_file_callback(ctx, param, value):
+    if value:
+        enable(value)
+        ctx.call_on_close(close)
+
+def options(func):
+    """给命令组加上 --profile 和 --trace-file 选项"""
+    func = click.option(
+        '--trace-file', envvar='CLI115_TRACE_FILE', type=click.Path(dir_okay=False), expose_value=False,
+        callback=_trace_file_callback, help='把各阶段的span以NDJSON追加写入文件（环境变量 CLI115_TRACE_FILE）'
+    )(func)
+    return click.option(
+        '--profile', is_flag=True, expose_value=False, callback=_profile_callback,
+        help='结束后输出各阶段耗时'
+    )(func)
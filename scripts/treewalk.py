@@ -0,0 +1,104 @@
+"""
+treewalk - 115目录树的并发广度优先遍历
+请求的单位是"一个目录的一页"：目录的第一页返回总数后，其余各页立即全部排队，与其他目录的页一起并发请求，
+大目录不会按顺序一页页翻；同时在途的请求数不超过 workers。结果按到达顺序逐页产出
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+import tracing
+
+PAGE_SIZE = 1150
+
+def is_dir(entry: dict) -> bool:
+    return entry.get('fid') is None
+
+def walk(client, root: int, workers: int = 4, max_depth: int | None = None, page_size: int = PAGE_SIZE):
+    """
+    生成器：从 root 开始遍历，每收到一页产出 (cid, depth, entries, listed)
+    depth 为目录相对 root 的深度（root 为0，其中条目的深度为1），listed 为True表示这是该目录的最后一页
+    max_depth 限制产出条目的深度：只进入深度小于 max_depth 的目录（1 只列 root 本身）
+    """
+    queue = deque([(root, 0, 0)])
+    # 目录 → 尚未返回的页数
+    pages_left = {}
+    running = {}
+
+    def fetch(cid, offset):
+        with tracing.span('treewalk.page', cid=cid, offset=offset):
+            return client.fs_files({'cid': cid, 'show_dir': 1, 'limit': page_size, 'offset': offset})
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        try:
+            while queue or running:
+                while queue and len(running) < workers:
+                    cid, depth, offset = queue.popleft()
+                    running[pool.submit(fetch, cid, offset)] = (cid, depth, offset)
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    cid, depth, offset = running.pop(future)
+                    result = future.result()
+                    entries = result.get('data') or []
+                    if offset == 0:
+                        if int(result.get('cid', cid)) != cid:
+                            # 不是目录的ID会被当作根目录返回
+                            raise ValueError(f"{cid} 不是目录")
+                        step = len(entries) or page_size
+                        rest = range(step, int(result.get('count') or 0), step) if entries else range(0)
+                        pages_left[cid] = len(rest)
+                        # 同一目录的其余页排在队首，目录尽早列完
+                        queue.extendleft((cid, depth, o) for o in reversed(rest))
+                    else:
+                        pages_left[cid] -= 1
+
+                    if max_depth is None or depth + 1 < max_depth:
+                        queue.extend((int(e['cid']), depth + 1, 0) for e in entries if is_dir(e))
+                    listed = pages_left[cid] == 0
+                    if listed:
+                        del pages_left[cid]
+                    yield cid, depth, entries, listed
+        finally:
+            # 提前关闭生成器（如下游管道关闭）时不再发起新的请求
+            for future in running:
+                future.cancel()
+
+def disk_usage(client, root: int, root_path: str = '/', workers: int = 4, on_page=None):
+    """
+    生成器：统计每个目录（含所有子目录）的文件数、子目录数和总大小
+    某个目录及其所有子目录都列完时立即产出该目录，root 最后产出:
+    {'id', 'parent', 'path', 'depth', 'files', 'dirs', 'size'}
+    on_page(cid, entries) 在每页到达时调用
+    """
+    nodes = {root: {'id': root, 'parent': None, 'path': root_path, 'depth': 0,
+                    'files': 0, 'dirs': 0, 'size': 0, 'pending': 0, 'listed': False}}
+
+    for cid, depth, entries, listed in walk(client, root, workers):
+        node = nodes[cid]
+        if on_page:
+            on_page(cid, entries)
+        for entry in entries:
+            if is_dir(entry):
+                child = int(entry['cid'])
+                nodes[child] = {
+                    'id': child, 'parent': cid, 'path': f"{node['path'].rstrip('/')}/{entry.get('n', '')}",
+                    'depth': depth + 1, 'files': 0, 'dirs': 0, 'size': 0, 'pending': 0, 'listed': False,
+                }
+                node['dirs'] += 1
+                node['pending'] += 1
+            else:
+                node['files'] += 1
+                node['size'] += int(entry.get('s') or 0)
+        node['listed'] = listed
+
+        # 向上汇总：当前目录完成后，父目录可能也随之完成
+        while node is not None and node['listed'] and node['pending'] == 0:
+            del nodes[node['id']]
+            yield {key: node[key] for key in ('id', 'parent', 'path', 'depth', 'files', 'dirs', 'size')}
+            parent = nodes.get(node['parent'])
+            if parent is not None:
+                parent['files'] += node['files']
+                parent['dirs'] += node['dirs']
+                parent['size'] += node['size']
+                parent['pending'] -= 1
+            node = parent